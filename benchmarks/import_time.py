@@ -0,0 +1,41 @@
+"""
+Time a cold ``import flyingpandas`` in a fresh interpreter, on top of the
+pandas import it cannot avoid, and check that it does not load xlwings
+
+    python benchmarks/import_time.py
+
+With PYTHONDONTWRITEBYTECODE set every run also compiles the package, so
+byte compile it first (python -m compileall flyingpandas).
+"""
+import subprocess
+import sys
+
+REPEAT = 10
+
+TIMER = """
+import sys, time
+start = time.time()
+import pandas
+after_pandas = time.time()
+import flyingpandas
+end = time.time()
+print('{} {} {}'.format(after_pandas - start, end - after_pandas,
+                        int('xlwings' in sys.modules)))
+"""
+
+
+def _cold_import():
+    output = subprocess.check_output([sys.executable, '-c', TIMER])
+    pandas_seconds, seconds, xlwings = output.split()
+    return float(pandas_seconds), float(seconds), bool(int(xlwings))
+
+
+# the first run may compile the package to bytecode
+_cold_import()
+runs = [_cold_import() for i in range(REPEAT)]
+
+print('import pandas        {:6.1f} ms'.format(
+    1000 * min(run[0] for run in runs)))
+print('import flyingpandas  {:6.1f} ms on top of pandas'.format(
+    1000 * min(run[1] for run in runs)))
+print('xlwings imported     {}'.format(any(run[2] for run in runs)))
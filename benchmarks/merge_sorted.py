@@ -0,0 +1,40 @@
+"""
+Time flyingpandas.merge on keys that are already sorted, with the merge-join
+(presorted=None, the default) against the hashed join (presorted=False)
+
+    python benchmarks/merge_sorted.py
+"""
+import timeit
+
+import numpy as np
+import pandas
+
+import flyingpandas
+
+N_ROWS = 1000000
+REPEAT = 5
+
+rng = np.random.RandomState(0)
+accounts = pandas.DataFrame({'account_id': np.arange(N_ROWS // 10),
+                             'balance': rng.rand(N_ROWS // 10)})
+transactions = pandas.DataFrame({
+    'account_id': np.sort(rng.randint(0, N_ROWS // 10, N_ROWS)),
+    'amount': rng.rand(N_ROWS)})
+dates = pandas.DataFrame({'date': pandas.date_range('2000-01-01',
+                                                    periods=N_ROWS, freq='T'),
+                          'rate': rng.rand(N_ROWS)})
+prices = dates.rename(columns={'rate': 'price'})
+
+cases = [
+    ('m:1 int keys', transactions, accounts, 'account_id', 'left'),
+    ('1:1 datetime keys', dates, prices, 'date', 'inner'),
+]
+
+for name, left, right, on, how in cases:
+    print(name)
+    for presorted in [False, None]:
+        seconds = min(timeit.repeat(
+            lambda: flyingpandas.merge(name[:3], left, right, how=how, on=on,
+                                       noprint=True, presorted=presorted),
+            repeat=REPEAT, number=1))
+        print('    presorted={!s:<6} {:6.3f} s'.format(presorted, seconds))
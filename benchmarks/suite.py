@@ -0,0 +1,282 @@
+"""
+Benchmark suite for flyingpandas.merge and ExcelWriter.to_excel
+
+Every case is timed against the same work done with plain pandas, so the
+overhead of flyingpandas' checks and formatting is measured directly. Each
+case runs in a fresh process on synthetic data (see synthetic.py), and its
+peak memory is the growth of the process' peak resident memory while it
+runs, on top of its input data.
+
+    python benchmarks/suite.py
+    python benchmarks/suite.py --suite merge --sizes 1000,1000000 --kinds str
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --compare baseline.json
+
+With --compare, cases slower or bigger than the baseline by more than
+--tolerance are reported as regressions and the exit status is 1.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+import pandas
+
+import flyingpandas
+import synthetic
+
+MERGETYPES = ['1:1', '1:m', 'm:1', 'm:m']
+HOWS = ['left', 'right', 'inner', 'outer']
+ALL_SETS = ['left_only', 'right_only', 'both']
+EXCEL_CONFIGS = ['plain', 'banding', 'column_formats', 'row_formats',
+                 'autofit', 'all', 'multi_table']
+
+COLUMN_FORMATS = {'units': '#,##0', 'price': '$#,##0.00', 'growth': '0.0%'}
+ROW_FORMATS = {'ratio': '0.0%', 'margin': '$#,##0'}
+
+# differences below these are noise, never regressions
+MIN_SECONDS = 0.005
+MIN_BYTES = 2 ** 20
+
+
+def _peak_memory():
+    """Peak resident memory of this process in bytes, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
+def merge_cases(sizes, mergetypes, hows, kinds):
+    for n, mergetype, how, sets, kind in itertools.product(
+            sizes, mergetypes, hows, [False, True], kinds):
+        yield {'suite': 'merge', 'n': n, 'mergetype': mergetype, 'how': how,
+               'sets': sets, 'kind': kind}
+
+
+def excel_cases(sizes, configs):
+    for n, config in itertools.product(sizes, configs):
+        yield {'suite': 'excel', 'n': n, 'config': config}
+
+
+def case_name(case):
+    if case['suite'] == 'merge':
+        return 'merge {mergetype} {how:<5} sets={sets:d} {kind:<8} ' \
+               'n={n}'.format(**case)
+    return 'excel {config:<14} n={n}'.format(**case)
+
+
+def _merge_call(case, use_pandas):
+    left, right = synthetic.merge_frames(case['mergetype'], case['kind'],
+                                         case['n'])
+    on = synthetic.key_names(case['kind'])
+    if use_pandas:
+        return lambda: pandas.merge(left, right, how=case['how'], on=on)
+    sets = ALL_SETS if case['sets'] else None
+    return lambda: flyingpandas.merge(case['mergetype'], left, right,
+                                      how=case['how'], on=on, sets=sets,
+                                      noprint=True)
+
+
+def _excel_tables(case):
+    """(sheet_name, startrow, data) of each table of the layout"""
+    data = synthetic.report_table(case['n'])
+    if case['config'] != 'multi_table':
+        return [('Sheet1', 0, data)]
+    third = len(data) // 3
+    return [('Sheet1', 0, data.iloc[:third]),
+            ('Sheet1', third + 3, data.iloc[third:2 * third]),
+            ('Sheet2', 0, data.iloc[2 * third:])]
+
+
+def _excel_options(config):
+    options = {'add_color_rows': False, 'autofit': False}
+    if config in ['banding', 'all', 'multi_table']:
+        options['add_color_rows'] = True
+    if config in ['autofit', 'all', 'multi_table']:
+        options['autofit'] = True
+    if config in ['column_formats', 'all', 'multi_table']:
+        options['column_formats'] = COLUMN_FORMATS
+    if config in ['row_formats', 'all', 'multi_table']:
+        options['row_formats'] = ROW_FORMATS
+        options['row_format_col'] = 'label'
+    return options
+
+
+def _excel_call(case, use_pandas, engine, directory):
+    tables = _excel_tables(case)
+    path = os.path.join(directory, 'benchmark.xlsx')
+    options = _excel_options(case['config'])
+
+    def write_pandas():
+        writer = pandas.ExcelWriter(path, engine=engine)
+        for sheet_name, startrow, data in tables:
+            data.to_excel(writer, sheet_name=sheet_name, startrow=startrow,
+                          index=False)
+        writer.close()
+
+    def write_flyingpandas():
+        writer = flyingpandas.ExcelWriter(path, engine=engine)
+        for sheet_name, startrow, data in tables:
+            writer.to_excel(data, sheet_name=sheet_name, startrow=startrow,
+                            index=False, **options)
+        writer.close()
+
+    if use_pandas:
+        return write_pandas
+    return write_flyingpandas
+
+
+def _measure(case, use_pandas, repeat, engine, connection):
+    """Time one side of a case in this process and send back the fastest
+    run and the peak memory growth"""
+    directory = tempfile.mkdtemp(prefix='flyingpandas_benchmark_')
+    try:
+        if case['suite'] == 'merge':
+            call = _merge_call(case, use_pandas)
+        else:
+            call = _excel_call(case, use_pandas, engine, directory)
+        start_memory = _peak_memory()
+        times = []
+        for i in range(repeat):
+            start = time.time()
+            call()
+            times.append(time.time() - start)
+        growth = None
+        if start_memory is not None:
+            growth = _peak_memory() - start_memory
+        connection.send((min(times), growth))
+    except Exception as e:
+        connection.send(('error', repr(e)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        connection.close()
+
+
+def measure(case, use_pandas, repeat, engine):
+    """Run one side of a case in a fresh process"""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_measure, args=(case, use_pandas, repeat, engine, sender))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    if result[0] == 'error':
+        raise RuntimeError('{} failed: {}'.format(case_name(case), result[1]))
+    return result
+
+
+def _megabytes(n_bytes):
+    if n_bytes is None:
+        return '     -'
+    return '{:6.1f}'.format(n_bytes / 2.0 ** 20)
+
+
+def run(cases, repeat, engine, baseline, tolerance):
+    """Run every case, printing a line for each, and return the results and
+    the names of the cases that regressed from ``baseline``"""
+    print('{:<44} {:>9} {:>9} {:>8} {:>8} {:>8}'.format(
+        'case', 'seconds', 'pandas', 'overhead', 'peak MB', 'pandas'))
+    results = {}
+    regressions = []
+    for case in cases:
+        name = case_name(case)
+        seconds, growth = measure(case, False, repeat, engine)
+        pandas_seconds, pandas_growth = measure(case, True, repeat, engine)
+        result = dict(case, seconds=seconds, peak_bytes=growth,
+                      pandas_seconds=pandas_seconds,
+                      pandas_peak_bytes=pandas_growth,
+                      overhead=seconds / max(pandas_seconds, 1e-9))
+        results[name] = result
+
+        flag = ''
+        if baseline and name in baseline:
+            if _regressed(result, baseline[name], tolerance):
+                flag = '  REGRESSION'
+                regressions.append(name)
+        print('{:<44} {:9.4f} {:9.4f} {:7.2f}x {} {}{}'.format(
+            name, seconds, pandas_seconds, result['overhead'],
+            _megabytes(growth), _megabytes(pandas_growth), flag))
+        sys.stdout.flush()
+    return results, regressions
+
+
+def _regressed(result, base, tolerance):
+    slower = result['seconds'] > base['seconds'] * (1 + tolerance) and \
+        result['seconds'] - base['seconds'] > MIN_SECONDS
+    bigger = False
+    if result['peak_bytes'] is not None and \
+            base.get('peak_bytes') is not None:
+        bigger = result['peak_bytes'] > \
+            base['peak_bytes'] * (1 + tolerance) and \
+            result['peak_bytes'] - base['peak_bytes'] > MIN_BYTES
+    return slower or bigger
+
+
+def _as_list(text, convert=str):
+    return [convert(item) for item in text.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--suite', choices=['merge', 'excel', 'all'],
+                        default='all')
+    parser.add_argument('--sizes', help='comma separated row counts, '
+                        'default 1000,10000,100000 for merge and '
+                        '1000,10000 for excel')
+    parser.add_argument('--mergetypes', default=','.join(MERGETYPES))
+    parser.add_argument('--hows', default=','.join(HOWS))
+    parser.add_argument('--kinds', default=','.join(synthetic.KEY_KINDS),
+                        help='key types: int, str, multi, datetime')
+    parser.add_argument('--configs', default=','.join(EXCEL_CONFIGS))
+    parser.add_argument('--engine', default='xlsxwriter',
+                        help='pandas excel engine')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='baseline json file from --save')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown or memory growth over the '
+                        'baseline, default 0.25')
+    args = parser.parse_args()
+
+    to_int = lambda size: int(float(size))
+    cases = []
+    if args.suite in ['merge', 'all']:
+        sizes = _as_list(args.sizes or '1000,10000,100000', to_int)
+        cases.extend(merge_cases(sizes, _as_list(args.mergetypes),
+                                 _as_list(args.hows), _as_list(args.kinds)))
+    if args.suite in ['excel', 'all']:
+        sizes = _as_list(args.sizes or '1000,10000', to_int)
+        cases.extend(excel_cases(sizes, _as_list(args.configs)))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results, regressions = run(cases, args.repeat, args.engine, baseline,
+                               args.tolerance)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if regressions:
+        print('{} regressions against {}'.format(len(regressions),
+                                                 args.compare))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
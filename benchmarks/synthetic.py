@@ -0,0 +1,81 @@
+"""
+Synthetic data for the benchmarks, reproducible from a seed
+"""
+import numpy as np
+import pandas
+
+KEY_KINDS = ['int', 'str', 'multi', 'datetime']
+
+# rows per key on a side that is not unique, and the share of extra keys in
+# the key space, so that about 1 in 11 rows has no match
+ROWS_PER_KEY = 2
+KEY_SPACE = 1.1
+
+
+def key_ids(unique, n_rows, rng):
+    """Integer key ids for one side of a merge"""
+    n_keys = int(n_rows * KEY_SPACE)
+    if unique:
+        return rng.permutation(n_keys)[:n_rows]
+    return rng.randint(0, max(n_keys // ROWS_PER_KEY, 1), n_rows)
+
+
+def key_columns(ids, kind):
+    """Key columns of a given kind for integer key ids
+
+    Returns
+    -------
+    columns : dict
+        column name to values
+    """
+    if kind == 'int':
+        return {'key': ids}
+    if kind == 'str':
+        return {'key': np.char.add('K', ids.astype(str)).astype(object)}
+    if kind == 'multi':
+        return {'key': ids // 100, 'key2': ids % 100}
+    if kind == 'datetime':
+        return {'key': pandas.to_datetime(ids, unit='s')}
+    raise ValueError('unknown key kind {}'.format(kind))
+
+
+def key_names(kind):
+    if kind == 'multi':
+        return ['key', 'key2']
+    return ['key']
+
+
+def merge_frames(mergetype, kind, n_rows, seed=0):
+    """
+    Left and right frames of ``n_rows`` each to merge on ``key_names(kind)``
+
+    A side is unique on the key where ``mergetype`` has a '1', otherwise it
+    has about ``ROWS_PER_KEY`` rows per key. Every merge set is present, so
+    ``sets=['left_only', 'right_only', 'both']`` always passes.
+    """
+    rng = np.random.RandomState(seed)
+    frames = []
+    for side, unique in zip(['left', 'right'], mergetype.split(':')):
+        columns = key_columns(key_ids(unique == '1', n_rows, rng), kind)
+        columns['{}_value'.format(side)] = rng.rand(n_rows)
+        columns['{}_count'.format(side)] = rng.randint(0, 1000, n_rows)
+        frames.append(pandas.DataFrame(columns))
+    return frames
+
+
+def report_table(n_rows, seed=0):
+    """A table for the ExcelWriter benchmarks: a label column for row
+    formats, then text, integer, float, percentage and date columns"""
+    rng = np.random.RandomState(seed)
+    labels = np.array(['revenue', 'cost', 'margin', 'ratio'], dtype=object)
+    words = np.array(['north', 'south', 'east', 'west', 'central region'],
+                     dtype=object)
+    return pandas.DataFrame({
+        'label': labels[rng.randint(0, len(labels), n_rows)],
+        'region': words[rng.randint(0, len(words), n_rows)],
+        'units': rng.randint(0, 100000, n_rows),
+        'price': rng.rand(n_rows) * 1000,
+        'growth': rng.randn(n_rows) / 10,
+        'date': pandas.to_datetime(rng.randint(0, 10 ** 9, n_rows),
+                                   unit='s')},
+        columns=['label', 'region', 'units', 'price', 'growth', 'date'])
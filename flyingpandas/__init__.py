@@ -5,6 +5,19 @@ __version__ = "0.0.3"
 
 from _flyingpandas import ExcelWriter
 from _stata_merge import merge
+from _prepared_merge import PreparedMerge
+from _report_template import ReportTemplate
+
+# ----------------------------------------------------------------------
+# Functions
+
+from _reports import build_reports
+from _stata_merge import estimate_merge_size, compact_keys
+from _prepared_merge import prepare_merge, clear_merge_cache, merge_chunks
+from _partitioned_merge import merge_partitioned
+from _multi_merge import merge_many
+from _merge_report import add_merge_hook, remove_merge_hook
+from _writer_report import add_writer_hook, remove_writer_hook, profile
 
 # ----------------------------------------------------------------------
 # Sub Modules
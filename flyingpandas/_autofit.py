@@ -0,0 +1,199 @@
+__author__ = 'rwest'
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# pandas' default when the ExcelWriter is given no datetime format
+DEFAULT_DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+
+# widest column excel will accept
+MAX_COLUMN_WIDTH = 255
+
+# characters in an excel number format which are not printed literally
+_PLACEHOLDERS = set('0#?.,%')
+
+
+def excel_width(n_chars):
+    """Column width fitting ``n_chars`` characters, leaving a little room
+    either side of the text like excel's autofit"""
+    return min(n_chars + 2, MAX_COLUMN_WIDTH)
+
+
+def _number_format_lengths(values, format):
+    """Estimate the number of characters excel shows for each number in
+    ``values`` when displayed with the custom number format ``format``
+
+    Only the first (positive) section of the format is used and scientific
+    notation is not supported, which is close enough for column widths.
+
+    Parameters
+    ----------
+    values : np.ndarray of floats, without NaN
+    format : str
+
+    Returns
+    -------
+    lengths : np.ndarray of integers
+    """
+    section = format.split(';')[0]
+    section = re.sub(r'\[[^\]]*\]', '', section)  # colors and conditions
+
+    percent = '%' in section
+    thousands = ',' in section
+    match = re.search(r'\.([0#?]+)', section)
+    decimals = len(match.group(1)) if match else 0
+
+    # count text printed around the number e.g. the '$' in '$#,##0'
+    literal = 0
+    quoted = False
+    skip = False
+    for char in section:
+        if skip:
+            skip = False
+            literal += 1
+        elif char == '"':
+            quoted = not quoted
+        elif quoted:
+            literal += 1
+        elif char in '\\_':
+            skip = True
+        elif char == '*':
+            skip = True
+            literal -= 1
+        elif char not in _PLACEHOLDERS:
+            literal += 1
+
+    if percent:
+        values = values * 100
+    absolute = np.abs(np.round(values, decimals))
+    int_digits = np.floor(np.log10(np.where(absolute >= 1, absolute, 1))) + 1
+
+    lengths = int_digits + (values < 0) + literal + percent
+    if decimals:
+        lengths += decimals + 1
+    if thousands:
+        lengths += (int_digits - 1) // 3
+    return lengths.astype(int)
+
+
+def _value_lengths(series, na_rep, float_format, number_format,
+                   datetime_format):
+    """Number of characters displayed for each value of ``series``"""
+    if pd.api.types.is_categorical_dtype(series):
+        # excel is given the values, not the category codes
+        series = series.astype(object)
+
+    lengths = np.zeros(len(series), dtype=int)
+    isnull = series.isnull().values
+    lengths[isnull] = len(na_rep)
+    values = series[~isnull]
+    if not len(values):
+        return lengths
+
+    if pd.api.types.is_bool_dtype(series):
+        lengths[~isnull] = np.where(values.values, 4, 5)
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        lengths[~isnull] = len(number_format or datetime_format)
+    elif pd.api.types.is_numeric_dtype(series) or \
+            pd.api.types.is_timedelta64_dtype(series):
+        numbers = values.values.astype(float)
+        if float_format and pd.api.types.is_float_dtype(series):
+            # pandas rounds floats with float_format but still writes numbers
+            match = re.match(r'^%[-+ #0]*\d*\.(\d+)f$', float_format)
+            if match:
+                numbers = np.round(numbers, int(match.group(1)))
+            else:
+                numbers = values.map(lambda v: float(float_format % v)).values
+        if number_format:
+            lengths[~isnull] = _number_format_lengths(numbers, number_format)
+        else:
+            lengths[~isnull] = pd.Series(numbers).astype(unicode).str.len()
+            integral = np.mod(numbers, 1) == 0
+            # excel shows 1.0 as 1
+            lengths[~isnull] -= np.where(integral, 2, 0)
+    else:
+        lengths[~isnull] = values.astype(unicode).str.len().values
+    return lengths
+
+
+def column_widths(data, na_rep='', float_format=None, column_formats=None,
+                  header=True, index=True, index_label=None,
+                  datetime_format=None, sample=None, quantile=None):
+    """Compute the number of characters needed to show each column of a
+    table, as written by ``pandas.DataFrame.to_excel``
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+    na_rep : str
+    float_format : str
+    column_formats : dict of string number formats
+    header : boolean or list of str
+    index : boolean
+    index_label : str or sequence
+    datetime_format : str
+        format of datetime cells; pandas' default if None
+    sample : int, optional
+        measure at most this many evenly spaced rows of very large tables
+    quantile : float, optional
+        e.g. 0.99, size each column for this quantile of its value lengths
+        rather than the longest value. Headers always fit.
+
+    Returns
+    -------
+    widths : dict
+        column offset from ``startcol`` (indexed from 0) to number of
+        characters
+    """
+    if not column_formats:
+        column_formats = {}
+    if not datetime_format:
+        datetime_format = DEFAULT_DATETIME_FORMAT
+
+    body = data
+    if sample and len(data) > sample:
+        rows = np.unique(np.linspace(0, len(data) - 1, sample).astype(int))
+        body = data.iloc[rows]
+
+    def _fit(lengths):
+        if not len(lengths):
+            return 0
+        if quantile is not None:
+            return int(np.ceil(np.percentile(lengths, quantile * 100)))
+        return int(lengths.max())
+
+    widths = {}
+    offset = 0
+    if index:
+        if index_label is None:
+            labels = body.index.names
+        elif isinstance(index_label, (list, tuple)):
+            labels = index_label
+        else:
+            labels = [index_label]
+
+        for level in range(body.index.nlevels):
+            values = pd.Series(body.index.get_level_values(level))
+            n_chars = _fit(_value_lengths(values, na_rep, float_format,
+                                          None, datetime_format))
+            if header and level < len(labels) and labels[level] is not None:
+                n_chars = max(n_chars, len(u'{}'.format(labels[level])))
+            widths[offset] = n_chars
+            offset += 1
+
+    if isinstance(header, (list, tuple)):
+        headers = header
+    elif header:
+        headers = body.columns
+    else:
+        headers = [''] * len(body.columns)
+
+    for i, col_name in enumerate(body.columns):
+        n_chars = _fit(_value_lengths(body.iloc[:, i], na_rep, float_format,
+                                      column_formats.get(col_name),
+                                      datetime_format))
+        widths[offset + i] = max(n_chars, len(u'{}'.format(headers[i])))
+
+    return widths
@@ -0,0 +1,156 @@
+__author__ = 'rwest'
+
+import copy
+import functools
+import sys
+import threading
+import Queue
+
+import pandas as pd
+
+
+def _snapshot(value):
+    """Copy an argument so the caller may change it once it is queued.
+    Iterators of chunks are consumed by the worker as they are"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
+
+
+def in_background(method):
+    """Run a method of a writer opened with ``background=True`` on its
+    worker thread, with copies of its arguments, and return at once"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        worker = self._worker
+        if worker is None or worker.is_current():
+            return method(self, *args, **kwargs)
+        args = [_snapshot(arg) for arg in args]
+        kwargs = dict((name, _snapshot(arg))
+                      for name, arg in kwargs.iteritems())
+        worker.submit(method, self, *args, **kwargs)
+    return wrapper
+
+
+class Worker(object):
+    """A thread running queued calls in order
+
+    The queue holds at most ``queue_size`` calls, so a caller submitting
+    faster than the worker runs them waits rather than piling up copies of
+    its data. After the first error the remaining calls are skipped, and
+    the error is raised by the next ``submit`` or by ``join``.
+    """
+
+    def __init__(self, queue_size=4):
+        self.queue = Queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run,
+                                       name='flyingpandas-writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def is_current(self):
+        return threading.current_thread() is self.thread
+
+    def submit(self, func, *args, **kwargs):
+        self.raise_error()
+        self.queue.put((func, args, kwargs))
+
+    def join(self):
+        """Wait for every queued call, then stop the thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            exc_type, exc, traceback = self.error
+            raise exc_type, exc, traceback
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            func, args, kwargs = item
+            if self.error is None:
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    self.error = sys.exc_info()
+
+
+class Future(object):
+    """The outcome of a call running on another thread, e.g. from
+    ``ExcelWriter.aclose()``"""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, **kwargs):
+        """Call ``func`` and record its result or error"""
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception:
+            self._error = sys.exc_info()
+        with self._lock:
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def _wait(self, timeout):
+        if not self._done.wait(timeout):
+            raise RuntimeError('Call has not finished after {} seconds'
+                               ''.format(timeout))
+
+    def result(self, timeout=None):
+        """Wait for the call and return its result, or raise its error
+
+        Raises
+        ------
+        RuntimeError
+            if the call has not finished after ``timeout`` seconds
+        """
+        self._wait(timeout)
+        if self._error is not None:
+            exc_type, exc, traceback = self._error
+            raise exc_type, exc, traceback
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the call and return its error, or None"""
+        self._wait(timeout)
+        if self._error is not None:
+            return self._error[1]
+        return None
+
+    def add_done_callback(self, callback):
+        """Call ``callback(future)`` once the call has finished, on the
+        thread that ran it, or at once if it already has"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+
+def run_in_thread(func, *args, **kwargs):
+    """Start ``func`` on a new thread and return its ``Future``. The thread
+    is not a daemon, so the program waits for it before exiting"""
+    future = Future()
+    thread = threading.Thread(target=future.run, args=(func,) + args,
+                              kwargs=kwargs, name='flyingpandas-close')
+    thread.start()
+    return future
@@ -1,82 +1,111 @@
 __author__ = 'rwest'
 
+import numpy as np
 import pandas as pd
-import xlwings
+import time
 import warnings
 
-def _add_excel_formatting(sheet_name, spacing, column_formats, row_formats,
-                          add_color_rows, autofit, include_index,
-                          include_header):
+import _autofit
+import _background
+import _native
+import _update
+import _writer_report
+from _format_plan import FormatPlan
 
-    """Add number format and row colors to tables in excel report
+# excel colors
+LIGHT_BLUE = (220, 230, 241)
+WHITE = (255, 255, 255)
+
+
+# rows per chunk when streaming a single large DataFrame
+STREAM_CHUNKSIZE = 10000
+
+
+def _chunked(data, chunksize):
+    """Yield consecutive row slices of a DataFrame"""
+    for i in xrange(0, max(len(data), 1), chunksize):
+        yield data.iloc[i:i + chunksize]
+
+
+def _import_xlwings():
+    """Import xlwings when an ExcelWriter first needs it. It is slow to import
+    and platform specific, and only the xlwings format engine uses it"""
+    try:
+        import xlwings
+    except ImportError:
+        raise ImportError('format_engine="xlwings" requires xlwings')
+    return xlwings
+
+
+def _column_format_numbers(data_columns, column_formats, startcol):
+    """Convert column_formats keyed by column name to column numbers in the
+    workbook
 
     Parameters
     ----------
-    data : pd.DataFrame
-    sheetname : str
-    spacing : dict of integers
-        should contain 'start_row', 'start_col' and 'gap'
+    data_columns : sequence
+        columns of the dataframe being written
     column_formats : dict
+    startcol : int
+        first column of the table, indexed from 1
+
+    Returns
+    -------
+    new_column_formats : dict
+    """
+    # position of the first column of each name
+    positions = {}
+    for col_num, col_name in enumerate(data_columns):
+        positions.setdefault(col_name, col_num)
+
+    new_column_formats = {}
+    for col_name, format in column_formats.iteritems():
+        if col_name not in positions:
+            warning_msg =  '"{}" is not a column name in dataframe, ' \
+                        'no formatting will be applied for this colu' \
+                        'mn'.format(col_name)
+            warnings.warn(warning_msg)
+            continue
+
+        # convert to column number in workbook
+        new_column_formats[positions[col_name] + startcol] = format
+    return new_column_formats
+
+
+def _row_format_numbers(labels, row_formats, startrow):
+    """Convert row_formats keyed by row name to row numbers in the workbook,
+    for every row whose label is the row name, in one pass over the labels
+
+    Parameters
+    ----------
+    labels : pd.Series
+        the ``row_format_col`` column of the rows being written
     row_formats : dict
-    add_color_rows : boolean
-    autofit : boolean
-    include_index : boolean
-    include_header : boolean
+    startrow : int
+        row number of the first label, indexed from 1 and not counting the
+        header
+
+    Returns
+    -------
+    new_row_formats : dict
+    matched : set
+        the row names found in ``labels``
     """
-    startdatarow = spacing['startrow']
-    if include_header:
-        startdatarow += 1
-
-    startdatacol = spacing['startcol']
-    if include_index:
-        startdatacol += 1
-
-    # excel colors
-    light_blue = (220, 230, 241)
-    white = (255, 255, 255)
-
-    # apply number formatting to all specified columns
-    for col_num, format in column_formats.iteritems():
-        if include_index:
-            col_num += 1
-
-        xlwings.Range(sheet_name,
-                      (startdatarow, col_num),
-                      (spacing['endrow'], col_num)
-        ).number_format = format
-
-    # apply number formatting to all specified rows
-    for row_num, format in row_formats.iteritems():
-        if include_header:
-            row_num += 1
-
-        xlwings.Range(sheet_name,
-                      (row_num, startdatacol),
-                      (row_num, spacing['endcol'])
-        ).number_format = format
-
-    if add_color_rows:
-        # format color of rows in each table
-        for i, row_num in enumerate(xrange(startdatarow,
-                                           spacing['endrow'] + 1)):
-            if i % 2 == 0:
-                row_color = light_blue
-            else:
-                row_color = white
-
-            xlwings.Range(sheet_name,
-                          (row_num, startdatacol),
-                          (row_num, spacing['endcol'])
-            ).color = row_color
-
-    # autofit
-    if autofit:
-        xlwings.Range(sheet_name,
-                      (spacing['startrow'], spacing['startcol']),
-                      (spacing['endrow'], spacing['endcol'])
-        ).autofit()
+    formats = np.asarray(labels.map(row_formats), dtype=object)
+    found = pd.notnull(formats)
+    row_nums = np.flatnonzero(found) + startrow
+    new_row_formats = dict(zip(row_nums.tolist(), formats[found].tolist()))
+    matched = set(labels[found].unique())
+    return new_row_formats, matched
 
 
+def _warn_unused_row_names(row_names, row_format_col):
+    """Warn about each row name of row_formats not found in the data"""
+    for row_name in row_names:
+        warning_msg =  '"{}" is not a row name in the variable {} ' \
+                   'no formatting will be applied for this row'.format(
+            row_name, row_format_col)
+        warnings.warn(warning_msg)
 
 
 class ExcelWriter(object):
@@ -97,62 +126,206 @@ class ExcelWriter(object):
     datetime_format : string, default None
         Format string for datetime objects written into Excel files
         (e.g. 'YYYY-MM-DD HH:MM:SS')
+    format_engine : string, default None
+        'native' applies formatting while pandas writes each table, in a
+        single file write with no Excel process. Requires the openpyxl or
+        xlsxwriter engine. 'xlwings' reopens the saved file in Excel and
+        formats it there. If None, 'native' is used whenever the engine
+        supports it.
+    constant_memory : boolean, default False
+        Stream every table to disk row by row using xlsxwriter's
+        constant_memory mode, so memory use does not grow with the size of
+        the sheet. Tables on the same sheet must then be written from top to
+        bottom and must not sit side by side: a table starting at or above
+        the last row written raises a ValueError.
+    mode : {'w', 'a'}, default 'w'
+        'a' updates an existing xlsx file with openpyxl: only the sheets
+        written to are changed, see ``replace`` in ``to_excel``. openpyxl
+        saves the whole workbook again, keeping the values, styles and
+        merged cells of the other sheets, but dropping the charts, images
+        and pivot tables of every sheet. Do not use it on a workbook that
+        has them.
+    background : boolean, default False
+        Write the tables on a background thread (native format engine only).
+        ``to_excel`` queues a copy of the table and returns at once, so the
+        caller can compute the next table while this one is written, and
+        ``close()`` waits for the thread and saves the file. An error in the
+        background is raised by the next ``to_excel`` or by ``close()``.
+    queue_size : int, default 4
+        with ``background``, the number of tables that can wait to be
+        written before ``to_excel`` blocks
+    report : function, optional
+        called with ``writer.stats`` once the writer is closed, as well as
+        every hook added with ``add_writer_hook``
+    styles : dict, optional
+        cache of the cell styles built for each number format and fill,
+        shared with every other writer given the same dict so each style is
+        built once, e.g. by ``ReportTemplate``. Writers on different threads
+        can share it: a style built by two of them at once is the same
+
+    Attributes
+    ----------
+    stats : WriterStats
+        timings, cell and format counts of each table written, and of
+        closing the file, e.g. ``writer.stats.summary()``
     """
 
     def __init__(self, path, engine=None, date_format=None,
-                 datetime_format=None, **kwargs):
+                 datetime_format=None, format_engine=None,
+                 constant_memory=False, mode='w', background=False,
+                 queue_size=4, report=None, styles=None, **kwargs):
+
+        if mode not in ['w', 'a']:
+            raise ValueError('mode must be "w" or "a"')
+        if mode == 'a':
+            if engine not in [None, 'openpyxl']:
+                raise ValueError('mode="a" requires the openpyxl engine')
+            if constant_memory:
+                raise ValueError('constant_memory can not be used with '
+                                 'mode="a"')
+            engine = 'openpyxl'
+            kwargs['mode'] = mode
+
+        if constant_memory:
+            if engine not in [None, 'xlsxwriter']:
+                raise ValueError('constant_memory requires the xlsxwriter '
+                                 'engine')
+            if format_engine == 'xlwings':
+                raise ValueError('constant_memory requires the native format '
+                                 'engine')
+            engine = 'xlsxwriter'
+            options = dict(kwargs.pop('options', None) or {})
+            options['constant_memory'] = True
+            kwargs['options'] = options
 
         self.pdwriter = pd.ExcelWriter(path=path, engine=engine,
                                      date_format=date_format,
                                      datetime_format=datetime_format,
                                      **kwargs)
+        if mode == 'a':
+            _update.register_sheets(self.pdwriter)
+
+        native_ok = self.pdwriter.engine in _native.NATIVE_ENGINES
+        if format_engine is None:
+            format_engine = 'native' if native_ok else 'xlwings'
+        if format_engine not in ['native', 'xlwings']:
+            raise ValueError('format_engine must be "native" or "xlwings"')
+        if format_engine == 'native' and not native_ok:
+            err_msg = 'format_engine="native" requires one of the engines ' \
+                      '{}'.format(', '.join(_native.NATIVE_ENGINES))
+            raise ValueError(err_msg)
+        self._xlwings = None
+        if format_engine == 'xlwings':
+            if background:
+                raise ValueError('background requires the native format '
+                                 'engine')
+            self._xlwings = _import_xlwings()
+
+        self._format_engine = format_engine
+        self._constant_memory = constant_memory
+        self._mode = mode
+        self._written_sheets = set()
         self._path = path
-        self._sheet_name = []
-        self._spacing = []
-        self._column_formats = []
-        self._row_formats = []
-        self._add_color_rows = []
-        self._autofit = []
-        self._include_index = []
-        self._include_header = []
+        self._column_widths = {}
+        # with constant_memory, the last row written to each sheet, indexed
+        # from 0: every later table must start below it
+        self._last_rows = {}
+        self._plan = FormatPlan()
+        self._styles = {} if styles is None else styles
+        self._format_cache = _native.FormatCache()
+        self.stats = _writer_report.WriterStats(path, self.pdwriter.engine,
+                                                format_engine)
+        self._report = report
+        self._worker = None
+        if background:
+            self._worker = _background.Worker(queue_size)
+
+    @property
+    def format_calls(self):
+        """Number of formatting calls made into Excel by ``close()``. Always
+        zero with the native format engine"""
+        return self._plan.calls
 
     def close(self):
         """Save and close excel file and add specified formatting
         """
+        try:
+            try:
+                self._close()
+            finally:
+                if self._worker is not None:
+                    self._worker.join()
+        except Exception as e:
+            self.stats.finish(error=e.args)
+            self.stats.emit(self._report)
+            raise
+        self.stats.finish()
+        self.stats.emit(self._report)
+
+    def aclose(self):
+        """Start ``close()`` on another thread and return at once
+
+        Returns
+        -------
+        future : Future
+            ``future.result()`` waits for the file to be saved and raises any
+            error, and ``future.add_done_callback(fn)`` calls ``fn(future)``
+            once it is, e.g. to resume a coroutine of an event loop
+
+        >>> future = writer.aclose()
+        >>> ... # carry on computing
+        >>> future.result()
+
+        """
+        return _background.run_in_thread(self.close)
+
+    @_background.in_background
+    def _close(self):
+        phases = self.stats.close_phases
+        last = time.time()
+        if self._format_engine == 'native':
+            # formats were added as each table was written, only column
+            # widths remain before the one and only save
+            for sheet_name, widths in self._column_widths.iteritems():
+                _native.set_column_widths(self.pdwriter, sheet_name, widths)
+            phases['widths'], last = time.time() - last, time.time()
+            self.pdwriter.close()
+            phases['save'] = time.time() - last
+            return
+
         self.pdwriter.close()
 
+        for sheet_name, widths in self._column_widths.iteritems():
+            self._plan.add_column_widths(sheet_name, widths)
+        phases['save'], last = time.time() - last, time.time()
+
         # add excel formatting for each dataframe
-        wb = xlwings.Workbook(self._path)
-        for sheet_name, spacing, column_formats, row_formats, add_color_rows, \
-            autofit, include_index, include_header in zip(self._sheet_name,
-                                                          self._spacing,
-                                                          self._column_formats,
-                                                          self._row_formats,
-                                                          self._add_color_rows,
-                                                          self._autofit,
-                                                          self._include_index,
-                                                          self._include_header):
-
-            _add_excel_formatting(sheet_name, spacing, column_formats,
-                                  row_formats, add_color_rows, autofit,
-                                  include_index, include_header)
+        wb = self._xlwings.Workbook(self._path)
+        self._plan.apply(self._xlwings)
         wb.save()
         wb.close()
+        phases['format'] = time.time() - last
+        self.stats.format_calls = self._plan.calls
 
+    @_background.in_background
     def to_excel(self, data, column_formats=None, row_formats=None,
                  row_format_col=None, add_color_rows=True, autofit=True,
                  sheet_name='Sheet1', na_rep='', float_format=None,
                  columns=None, header=True, index=True, index_label=None,
                  startrow=0, startcol=0, engine=None, merge_cells=True,
-                 encoding=None, inf_rep='inf'):
+                 encoding=None, inf_rep='inf', autofit_sample=None,
+                 autofit_quantile=None, replace='sheet'):
         """
         Write DataFrame to a excel sheet using pandas.DataFrame.to_excel and
-        store formatting preferences. Formats will be added to excel file after
-        ``writer.close()``
+        store formatting preferences. Formats are added as the table is written
+        with the native format engine, or after ``writer.close()`` with xlwings
 
         Parameters
         ----------
-        data : pd.DataFrame
+        data : pd.DataFrame or iterator of pd.DataFrame
+            An iterator of chunks, e.g. from ``pd.read_csv(chunksize=...)``,
+            is streamed to the sheet one chunk at a time as a single table
+            (native format engine only).
         column_formats : dict of string number formats
             e.g. {'col1' : '0.0%'}. Each number format is a string equivalent
             to excels custom number format
@@ -165,12 +338,15 @@ class ExcelWriter(object):
               row_format_col='row_descriptions'
               row_formats = {'thisrow':  '0.0%'}
             row_formats takes priority over column_formats if both are specified
+            and is applied to every row whose row_format_col value is the row
+            name, so a name may label many rows
         row_format_col : str
             columns in data, used to specify row formatting
         add_color_rows : boolean (default True)
             color every other row of the dataframe being printed light blue
         autofit : boolean (default True)
-            expand columns in dataframe to show all data
+            expand columns in dataframe to show all data. Widths are computed
+            from the data and are the widest needed by any table on the sheet
         sheet_name : string, default 'Sheet1'
             Name of sheet which will contain DataFrame
         na_rep : string, default ''
@@ -197,7 +373,9 @@ class ExcelWriter(object):
             ``io.excel.xlsx.writer``, ``io.excel.xls.writer``, and
             ``io.excel.xlsm.writer``.
         merge_cells : boolean, default True
-            Write MultiIndex and Hierarchical Rows as merged cells.
+            Write MultiIndex and Hierarchical Rows as merged cells. With
+            constant_memory, cells can only be merged along a row: an index
+            value spanning several rows is written in its first row alone
         encoding: string, default None
             encoding of the resulting excel file. Only necessary for xlwt,
             other writers support unicode natively.
@@ -205,113 +383,408 @@ class ExcelWriter(object):
         inf_rep : string, default 'inf'
             Representation for infinity (there is no native representation for
             infinity in Excel)
+        autofit_sample : int, default None
+            if given, autofit measures at most this many evenly spaced rows
+        autofit_quantile : float, default None
+            if given (e.g. 0.99), autofit sizes each column for this quantile
+            of its value lengths rather than the longest value
+        replace : {'sheet', 'block', None}, default 'sheet'
+            what to remove from a sheet of an existing workbook (mode='a')
+            before the table is written. 'sheet' empties the whole sheet the
+            first time it is written to, keeping its name and position.
+            'block' removes only the table whose upper left cell is at
+            startrow and startcol, up to the first empty row and column.
+            None writes over the sheet, e.g. to add a table beside the
+            others. Ignored unless mode='a'
 
         >>> writer = ExcelWriter('output.xlsx')
         >>> writer.to_excel(df1,'Sheet1', column_formats={'Price': '$#,##0'})
         >>> writer.to_excel(df2,'Sheet2', column_formats={'Return': '0%'})
         >>> writer.close()
 
+        >>> writer = ExcelWriter('output.xlsx', mode='a')
+        >>> writer.to_excel(df3, 'Sheet2', startrow=10, replace='block')
+        >>> writer.close()
+
         """
         if not column_formats:
             column_formats = {}
-        if columns:
-            data = data.loc[:, columns]
+
+        recorder = _writer_report.TableRecorder(
+            sheet_name=sheet_name, startrow=startrow, startcol=startcol)
+        self._prepare_sheet(sheet_name, replace, startrow, startcol)
 
         if row_formats and not row_format_col:
             err_msg = 'If using row_formats, you must also specify a row' \
                       'format column'
             raise ValueError(err_msg)
 
+        if self._constant_memory or not isinstance(data, pd.DataFrame):
+            if self._format_engine != 'native':
+                raise ValueError('Writing DataFrame chunks requires the '
+                                 'native format engine')
+            if isinstance(data, pd.DataFrame):
+                data = _chunked(data, STREAM_CHUNKSIZE)
+
+            self._to_excel_stream(
+                data, column_formats=column_formats,
+                row_formats=row_formats or {}, row_format_col=row_format_col,
+                add_color_rows=add_color_rows, autofit=autofit,
+                sheet_name=sheet_name, na_rep=na_rep,
+                float_format=float_format, columns=columns, header=header,
+                index=index, index_label=index_label, startrow=startrow,
+                startcol=startcol, merge_cells=merge_cells, inf_rep=inf_rep,
+                autofit_sample=autofit_sample,
+                autofit_quantile=autofit_quantile, recorder=recorder)
+            return
+
+        if columns:
+            data = data.loc[:, columns]
+
+        # convert column names to column numbers in the workbook
+        new_column_formats = _column_format_numbers(data.columns,
+                                                    column_formats,
+                                                    startcol + 1)
+        recorder.phase('prepare')
+
+        self._write_table(
+            data, new_column_formats, column_formats=column_formats,
+            row_formats=row_formats, row_format_col=row_format_col,
+            add_color_rows=add_color_rows, autofit=autofit,
+            sheet_name=sheet_name, na_rep=na_rep, float_format=float_format,
+            columns=columns, header=header, index=index,
+            index_label=index_label, startrow=startrow, startcol=startcol,
+            engine=engine, merge_cells=merge_cells, encoding=encoding,
+            inf_rep=inf_rep, autofit_sample=autofit_sample,
+            autofit_quantile=autofit_quantile, recorder=recorder)
+
+    @_background.in_background
+    def _write_table(self, data, new_column_formats, column_formats=None,
+                     row_formats=None, row_format_col=None,
+                     add_color_rows=True, autofit=True, sheet_name='Sheet1',
+                     na_rep='', float_format=None, columns=None, header=True,
+                     index=True, index_label=None, startrow=0, startcol=0,
+                     engine=None, merge_cells=True, encoding=None,
+                     inf_rep='inf', autofit_sample=None,
+                     autofit_quantile=None, recorder=None):
+        """Write a DataFrame whose column formats are already converted to
+        column numbers in the workbook by ``_column_format_numbers``, adding
+        its ``TableReport`` to ``self.stats``. See ``to_excel`` for the other
+        parameters"""
+        if recorder is None:
+            recorder = _writer_report.TableRecorder(
+                sheet_name=sheet_name, startrow=startrow, startcol=startcol)
+        n_formats = len(self._format_cache.formats)
         if not row_formats:
             row_formats = {}
 
-        # standard pandas to_excel
-        data.to_excel(excel_writer=self.pdwriter, sheet_name=sheet_name,
-                      na_rep=na_rep, float_format=float_format, columns=columns,
-                      header=header, index=index, index_label=index_label,
-                      startrow=startrow, startcol=startcol, engine=engine,
-                      merge_cells=merge_cells, encoding=encoding, inf_rep=inf_rep)
-
         # convert row/col indexing from zero indexing to from one indexing for
         # excel
-        startcol += 1
-        startrow += 1
+        xl_startcol = startcol + 1
+        xl_startrow = startrow + 1
 
         # from here on out think indexing from 1!
-        endrow = startrow + len(data)
+        endrow = xl_startrow + len(data)
         if not header:
             endrow -= 1
 
-        endcol = startcol + len(data.columns)
+        endcol = xl_startcol + len(data.columns)
         if not index:
             endcol -= 1
 
-        spacing = {'startrow': startrow,
-                   'startcol': startcol,
+        spacing = {'startrow': xl_startrow,
+                   'startcol': xl_startcol,
                    'endrow': endrow,
                    'endcol': endcol}
 
-        # convert column names to column numbers in dataframe
-        data = data.reset_index(drop=True)
-        new_column_formats = {}
-        for col_name, format in column_formats.iteritems():
-            if col_name not in data.columns:
-                warning_msg =  '"{}" is not a column name in dataframe, ' \
-                            'no formatting will be applied for this colu' \
-                            'mn'.format(col_name)
-                warnings.warn(warning_msg)
-                continue
-
-            # get column number in dataframe
-            col_num = 1
-            for c in data.columns:
-                if c == col_name:
-                    break
-                else:
-                    col_num += 1
-
-            # convert to column number in workbook
-            col_num += spacing['startcol'] - 1
-            new_column_formats[col_num] = format
-
-
-        # convert row names to row numbers in dataframe
+        # convert row names to row numbers in the workbook
         if row_format_col:
             if row_format_col not in data.columns:
                 err_msg = '"{}" is not a column name in dataframe' \
                           ''.format(row_format_col)
                 raise KeyError(err_msg)
 
-            row_names = data[row_format_col].drop_duplicates().tolist()
-
         new_row_formats = {}
-        for row_name, format in row_formats.iteritems():
-            if row_name not in row_names:
-                warning_msg =  '"{}" is not a row name in the variable {} ' \
-                           'no formatting will be applied for this row'.format(
-                    row_name, row_format_col)
-                warnings.warn(warning_msg)
-                continue
-
-            # get column number in dataframe
-            row_num = 1
-            for r in row_names:
-                if r == row_name:
-                    break
+        if row_formats:
+            new_row_formats, matched = _row_format_numbers(
+                data[row_format_col], row_formats, spacing['startrow'])
+            _warn_unused_row_names(
+                [name for name in row_formats if name not in matched],
+                row_format_col)
+
+        recorder['rows'] = len(data)
+        recorder['columns'] = len(data.columns)
+        recorder.phase('prepare')
+
+        if self._format_engine == 'native':
+            get_style = _native._cell_style_lookup(
+                spacing, new_column_formats, new_row_formats, add_color_rows,
+                index, header, (LIGHT_BLUE, WHITE), styles=self._styles)
+            cells, styled_cells = _native.write_formatted(
+                self.pdwriter, data, get_style, sheet_name=sheet_name,
+                na_rep=na_rep, float_format=float_format, columns=columns,
+                header=header, index=index, index_label=index_label,
+                startrow=startrow, startcol=startcol, merge_cells=merge_cells,
+                inf_rep=inf_rep, cache=self._format_cache)
+            recorder['cells'] = cells
+            recorder['styled_cells'] = styled_cells
+            recorder['formats'] = len(self._format_cache.formats) - n_formats
+        else:
+            # standard pandas to_excel
+            data.to_excel(excel_writer=self.pdwriter, sheet_name=sheet_name,
+                          na_rep=na_rep, float_format=float_format,
+                          columns=columns, header=header, index=index,
+                          index_label=index_label, startrow=startrow,
+                          startcol=startcol, engine=engine,
+                          merge_cells=merge_cells, encoding=encoding,
+                          inf_rep=inf_rep)
+
+            # compile formatting into ranges applied using xlwings after close
+            self._plan.add_table(sheet_name, spacing, new_column_formats,
+                                 new_row_formats, add_color_rows, index,
+                                 header, (LIGHT_BLUE, WHITE))
+            # formatting happens in Excel after close, see stats.format_calls
+            recorder['cells'] = (spacing['endrow'] - xl_startrow + 1) * \
+                (spacing['endcol'] - xl_startcol + 1)
+        recorder.phase('write')
+
+        if autofit:
+            datetime_format = getattr(self.pdwriter, 'datetime_format', None)
+            widths = _autofit.column_widths(
+                data, na_rep=na_rep, float_format=float_format,
+                column_formats=column_formats, header=header, index=index,
+                index_label=index_label, datetime_format=datetime_format,
+                sample=autofit_sample, quantile=autofit_quantile)
+
+            self._fit_columns(sheet_name, spacing['startcol'], widths)
+            recorder.phase('autofit')
+
+        self.stats.tables.append(recorder.report())
+
+    def to_excel_grouped(self, data, by, gap=1, headings=False, drop_by=True,
+                         sort=True, sheet_name='Sheet1', header=True,
+                         startrow=0, startcol=0, **kwargs):
+        """
+        Write one table per group of ``data``, stacked vertically on a sheet.
+        The data is grouped in a single pass and each table's startrow is
+        worked out from the size of the tables above it.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+        by : str or list of str
+            columns in data to group by
+        gap : int, default 1
+            number of empty rows between tables
+        headings : boolean, str or function, default False
+            write a bold heading above each table. True writes the group key,
+            a string is formatted with the group key e.g. 'Category: {}' and a
+            function is called with the group key and returns the heading
+        drop_by : boolean, default True
+            leave the ``by`` columns out of each table
+        sort : boolean, default True
+            write the groups in sorted order of their keys, otherwise in order
+            of first appearance
+        sheet_name : string, default 'Sheet1'
+        header : boolean or list of string, default True
+        startrow : int
+            upper left cell row of the first table (or its heading)
+        startcol : int
+            upper left cell column of every table
+
+        For all other parameters (e.g. column_formats, add_color_rows) see
+        ``to_excel``; they are applied to every table
+
+        Returns
+        -------
+        nextrow : int
+            first row, indexed from 0, below the last table and its gap
+
+        >>> writer = ExcelWriter('output.xlsx')
+        >>> writer.to_excel_grouped(df, by='categorical', gap=2, index=False,
+        ...                         column_formats={'some cost': '$#,##0'},
+        ...                         headings='Category: {}')
+        >>> writer.close()
+
+        """
+        self._prepare_sheet(sheet_name, kwargs.pop('replace', 'sheet'),
+                            startrow, startcol)
+
+        nextrow = startrow
+        for key, group in data.groupby(by, sort=sort):
+            if drop_by:
+                group = group.drop(axis=1, labels=by)
+
+            if headings:
+                if callable(headings):
+                    heading = headings(key)
+                elif isinstance(headings, basestring):
+                    heading = headings.format(key)
+                else:
+                    heading = key
+                self._write_heading(heading, sheet_name, nextrow, startcol)
+                nextrow += 1
+
+            self.to_excel(group, sheet_name=sheet_name, header=header,
+                          startrow=nextrow, startcol=startcol, replace=None,
+                          **kwargs)
+
+            nextrow += len(group) + gap
+            if header:
+                nextrow += 1
+
+        return nextrow
+
+    @_background.in_background
+    def _write_heading(self, text, sheet_name, startrow, startcol):
+        self._check_rows_free(sheet_name, startrow)
+        _native.write_heading(self.pdwriter, text, sheet_name, startrow,
+                              startcol)
+        if self._constant_memory:
+            self._last_rows[sheet_name] = startrow
+
+    def _check_rows_free(self, sheet_name, startrow):
+        """With constant_memory, raise if a table starting at ``startrow``
+        would write to rows xlsxwriter has already written out, which it
+        drops without an error"""
+        last_row = self._last_rows.get(sheet_name)
+        if self._constant_memory and last_row is not None and \
+                startrow <= last_row:
+            err_msg = 'With constant_memory the tables of a sheet must be ' \
+                      'written from top to bottom: sheet "{}" is written ' \
+                      'down to row {}, so a table can not start at row {}' \
+                      ''.format(sheet_name, last_row, startrow)
+            raise ValueError(err_msg)
+
+    @_background.in_background
+    def _prepare_sheet(self, sheet_name, replace, startrow, startcol):
+        """Remove what a table replaces from an existing sheet, see
+        ``replace`` in ``to_excel``"""
+        if replace not in ['sheet', 'block', None]:
+            raise ValueError('replace must be "sheet", "block" or None')
+        if self._mode != 'a':
+            return
+        if sheet_name in self.pdwriter.sheets:
+            if replace == 'sheet' and sheet_name not in self._written_sheets:
+                _update.replace_sheet(self.pdwriter, sheet_name)
+            elif replace == 'block':
+                _update.clear_block(self.pdwriter, sheet_name, startrow,
+                                    startcol)
+        self._written_sheets.add(sheet_name)
+
+    def _fit_columns(self, sheet_name, startcol, widths):
+        """Keep the widest column needed by any table on the sheet
+
+        Parameters
+        ----------
+        sheet_name : str
+        startcol : int
+            first column of the table, indexed from 1
+        widths : dict
+            column offset from ``startcol`` to number of characters
+        """
+        sheet_widths = self._column_widths.setdefault(sheet_name, {})
+        for offset, n_chars in widths.iteritems():
+            col_num = startcol + offset
+            if n_chars > sheet_widths.get(col_num, 0):
+                sheet_widths[col_num] = n_chars
+
+    def _to_excel_stream(self, chunks, column_formats, row_formats,
+                         row_format_col, add_color_rows, autofit, sheet_name,
+                         na_rep, float_format, columns, header, index,
+                         index_label, startrow, startcol, merge_cells,
+                         inf_rep, autofit_sample, autofit_quantile, recorder):
+        """Write an iterator of DataFrame chunks as one table, row by row,
+        holding only one chunk in memory at a time, and add its
+        ``TableReport`` to ``self.stats``. See ``to_excel`` for the
+        parameters"""
+        self._check_rows_free(sheet_name, startrow)
+        n_formats = len(self._format_cache.formats)
+        tally = [0, 0, 0]
+        xl_startrow = startrow + 1
+        xl_startcol = startcol + 1
+        datetime_format = getattr(self.pdwriter, 'datetime_format', None)
+
+        spacing = None
+        new_column_formats = None
+        data_columns = []
+        unused_row_names = set(row_formats)
+        nextrow = startrow
+        first = True
+        for chunk in chunks:
+            if first:
+                if columns:
+                    data_columns = list(columns)
                 else:
-                    row_num += 1
-
-            # convert to column number in workbook
-            row_num += spacing['startrow'] - 1
-            new_row_formats[row_num] = format
-
-
-        # update formatting lists to apply formatting using xlwings after close
-        self._spacing.append(spacing)
-        self._column_formats.append(new_column_formats)
-        self._row_formats.append(new_row_formats)
-        self._add_color_rows.append(add_color_rows)
-        self._autofit.append(autofit)
-        self._sheet_name.append(sheet_name)
-        self._include_index.append(index)
-        self._include_header.append(header)
+                    data_columns = list(chunk.columns)
+                if row_format_col and row_format_col not in chunk.columns:
+                    err_msg = '"{}" is not a column name in dataframe' \
+                              ''.format(row_format_col)
+                    raise KeyError(err_msg)
+
+                endcol = xl_startcol + len(data_columns)
+                if not index:
+                    endcol -= 1
+                spacing = {'startrow': xl_startrow,
+                           'startcol': xl_startcol,
+                           'endrow': None,
+                           'endcol': endcol}
+                new_column_formats = _column_format_numbers(
+                    data_columns, column_formats, xl_startcol)
+
+            # number of rows already written, so banding carries on from the
+            # previous chunk
+            datarow = nextrow - startrow
+            if header and not first:
+                datarow -= 1
+
+            chunk_row_formats = {}
+            if row_formats:
+                chunk_row_formats, matched = _row_format_numbers(
+                    chunk[row_format_col], row_formats, xl_startrow + datarow)
+                unused_row_names.difference_update(matched)
+            recorder.phase('prepare')
+
+            get_style = _native._cell_style_lookup(
+                spacing, new_column_formats, chunk_row_formats,
+                add_color_rows, index, header, (LIGHT_BLUE, WHITE),
+                styles=self._styles)
+
+            chunk_header = header if first else False
+            cells, styled_cells = _native.write_formatted(
+                self.pdwriter, chunk, get_style, sheet_name=sheet_name,
+                na_rep=na_rep, float_format=float_format, columns=columns,
+                header=chunk_header, index=index, index_label=index_label,
+                startrow=nextrow, startcol=startcol, merge_cells=merge_cells,
+                inf_rep=inf_rep, cache=self._format_cache,
+                row_major=self._constant_memory)
+            tally[0] += len(chunk)
+            tally[1] += cells
+            tally[2] += styled_cells
+            recorder.phase('write')
+
+            if autofit:
+                if columns:
+                    chunk = chunk.loc[:, columns]
+                widths = _autofit.column_widths(
+                    chunk, na_rep=na_rep, float_format=float_format,
+                    column_formats=column_formats, header=header,
+                    index=index, index_label=index_label,
+                    datetime_format=datetime_format, sample=autofit_sample,
+                    quantile=autofit_quantile)
+                self._fit_columns(sheet_name, xl_startcol, widths)
+                recorder.phase('autofit')
+
+            nextrow += len(chunk)
+            if chunk_header:
+                nextrow += 1
+            first = False
+
+        if self._constant_memory and nextrow > startrow:
+            self._last_rows[sheet_name] = nextrow - 1
+        _warn_unused_row_names(unused_row_names, row_format_col)
+
+        recorder['rows'], recorder['cells'], recorder['styled_cells'] = tally
+        recorder['columns'] = len(data_columns)
+        recorder['formats'] = len(self._format_cache.formats) - n_formats
+        self.stats.tables.append(recorder.report())
@@ -0,0 +1,169 @@
+__author__ = 'rwest'
+
+from collections import namedtuple
+
+from _autofit import excel_width
+
+
+# One rectangular block of cells sharing a format. Rows and columns are
+# indexed from 1 and inclusive. ``kind`` is one of 'number_format' (``value``
+# is the format string), 'banding' (``value`` is a pair of (r, g, b) tuples
+# for the even and odd rows of the block) or 'column_width' (``value`` is the
+# width in excel's units).
+FormatRange = namedtuple('FormatRange', ['kind', 'sheet_name', 'first_row',
+                                         'first_col', 'last_row', 'last_col',
+                                         'value'])
+
+
+def _runs(positions):
+    """Group a {position: value} dict into (first, last, value) runs of
+    consecutive positions sharing the same value"""
+    runs = []
+    for pos in sorted(positions):
+        value = positions[pos]
+        if runs and runs[-1][1] == pos - 1 and runs[-1][2] == value:
+            runs[-1][1] = pos
+        else:
+            runs.append([pos, pos, value])
+    return [tuple(run) for run in runs]
+
+
+def _rgb_to_int(rgb):
+    """Convert an (r, g, b) tuple to the integer color used by Excel's COM
+    interface"""
+    r, g, b = rgb
+    return r + g * 256 + b * 256 * 256
+
+
+class FormatPlan(object):
+    """
+    Ordered list of ``FormatRange`` blocks to apply to a finished workbook.
+
+    ``ExcelWriter.to_excel`` compiles each table's formatting into the plan,
+    merging adjacent cells with the same format into a single range, so that
+    ``apply`` issues as few calls into Excel as possible. Later ranges take
+    priority over earlier ones.
+    """
+
+    def __init__(self):
+        self.ranges = []
+        self.calls = 0
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def add_table(self, sheet_name, spacing, column_formats, row_formats,
+                  add_color_rows, include_index, include_header, colors):
+        """Compile the formatting of one table into the plan
+
+        Parameters
+        ----------
+        sheet_name : str
+        spacing : dict of integers
+            should contain 'startrow', 'startcol', 'endrow' and 'endcol'
+        column_formats : dict
+        row_formats : dict
+        add_color_rows : boolean
+        include_index : boolean
+        include_header : boolean
+        colors : tuple of two (r, g, b) tuples
+            fill color of the even and odd data rows
+        """
+        startdatarow = spacing['startrow']
+        if include_header:
+            startdatarow += 1
+
+        startdatacol = spacing['startcol']
+        if include_index:
+            startdatacol += 1
+
+        endrow = spacing['endrow']
+        endcol = spacing['endcol']
+
+        shifted_columns = {}
+        for col_num, format in column_formats.iteritems():
+            if include_index:
+                col_num += 1
+            shifted_columns[col_num] = format
+
+        shifted_rows = {}
+        for row_num, format in row_formats.iteritems():
+            if include_header:
+                row_num += 1
+            shifted_rows[row_num] = format
+
+        # number formats: column blocks first so row blocks take priority
+        for first, last, format in _runs(shifted_columns):
+            self.ranges.append(FormatRange('number_format', sheet_name,
+                                           startdatarow, first, endrow, last,
+                                           format))
+
+        for first, last, format in _runs(shifted_rows):
+            self.ranges.append(FormatRange('number_format', sheet_name,
+                                           first, startdatacol, last, endcol,
+                                           format))
+
+        if add_color_rows and startdatarow <= endrow:
+            self.ranges.append(FormatRange('banding', sheet_name,
+                                           startdatarow, startdatacol,
+                                           endrow, endcol, tuple(colors)))
+
+    def add_column_widths(self, sheet_name, widths):
+        """Add column widths to the plan, one range per run of adjacent
+        columns with the same width
+
+        Parameters
+        ----------
+        sheet_name : str
+        widths : dict
+            column number (from 1) to number of characters to fit
+        """
+        excel_widths = dict((col_num, excel_width(n_chars))
+                            for col_num, n_chars in widths.iteritems())
+        for first, last, width in _runs(excel_widths):
+            self.ranges.append(FormatRange('column_width', sheet_name,
+                                           1, first, 1, last, width))
+
+    def apply(self, xlwings):
+        """Apply every range to the active workbook through xlwings,
+        counting each call into Excel in ``self.calls``
+
+        Parameters
+        ----------
+        xlwings : module
+        """
+        self.calls = 0
+        for fr in self.ranges:
+            rng = xlwings.Range(fr.sheet_name, (fr.first_row, fr.first_col),
+                                (fr.last_row, fr.last_col))
+
+            if fr.kind == 'number_format':
+                rng.number_format = fr.value
+                self.calls += 1
+            elif fr.kind == 'column_width':
+                rng.column_width = fr.value
+                self.calls += 1
+            elif fr.kind == 'banding':
+                self._apply_banding(xlwings, fr, rng)
+            else:
+                raise ValueError('Unknown format kind "{}"'.format(fr.kind))
+
+    def _apply_banding(self, xlwings, fr, rng):
+        """Color the whole block with the odd row color, then add one
+        conditional format rule coloring the even rows"""
+        even_color, odd_color = fr.value
+        rng.color = odd_color
+        self.calls += 1
+
+        formula = '=MOD(ROW()-{},2)=0'.format(fr.first_row)
+        try:
+            condition = rng.api.FormatConditions.Add(Type=2, Formula1=formula)
+            condition.Interior.Color = _rgb_to_int(even_color)
+            self.calls += 1
+        except AttributeError:
+            # no COM access to conditional formats (e.g. Mac), fall back to
+            # one call per even row
+            for row_num in xrange(fr.first_row, fr.last_row + 1, 2):
+                xlwings.Range(fr.sheet_name, (row_num, fr.first_col),
+                              (row_num, fr.last_col)).color = even_color
+                self.calls += 1
@@ -0,0 +1,881 @@
+__author__ = 'rwest'
+
+from collections import namedtuple
+
+import numbers
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.core.reshape.merge import _get_join_indexers
+except ImportError:  # pandas >= 2.0
+    from pandas.core.reshape.merge import \
+        get_join_indexers as _get_join_indexers
+
+# categories of the merge indicator, in the order pandas uses
+MERGE_SETS = ['left_only', 'right_only', 'both']
+
+# a join computed without factorized codes, with just what the checks of
+# ``flyingpandas.merge`` need. ``left_indexer`` and ``right_indexer`` are None
+# if the join was skipped for having too many rows, ``counts`` and
+# ``outer_counts`` are the merge set counts of the ``how`` and outer joins,
+# ``distinct`` the number of distinct keys in the left frame, the right frame
+# and both
+KeyJoin = namedtuple('KeyJoin', ['left_indexer', 'right_indexer', 'counts',
+                                 'outer_counts', 'left_unique',
+                                 'right_unique', 'distinct'])
+
+
+def _shared_categories(left_values, right_values):
+    """Whether two key columns are categoricals with the same categories,
+    e.g. from ``compact_columns``"""
+    if not (pd.api.types.is_categorical_dtype(left_values) and
+            pd.api.types.is_categorical_dtype(right_values)):
+        return False
+    left_categories = left_values.cat.categories
+    right_categories = right_values.cat.categories
+    return left_categories is right_categories or \
+        left_categories.equals(right_categories)
+
+
+def _datetimelike(values):
+    types = pd.api.types
+    return types.is_datetime64_any_dtype(values) or \
+        types.is_timedelta64_dtype(values) or types.is_period_dtype(values)
+
+
+def _missing_first(left_values, right_values):
+    """Whether pandas.merge sorts the missing values of a key column first.
+    It joins datetimes and timedeltas on their int64 values, where NaT is the
+    smallest, and shared categoricals on their codes, where NaN is -1. Other
+    missing values sort last"""
+    if _shared_categories(left_values, right_values):
+        return True
+    return _datetimelike(left_values) and _datetimelike(right_values)
+
+
+def _int_and_float(left_values, right_values):
+    """Whether one key column is integer and the other float"""
+    types = pd.api.types
+    return (types.is_integer_dtype(left_values) and
+            types.is_float_dtype(right_values)) or \
+        (types.is_float_dtype(left_values) and
+         types.is_integer_dtype(right_values))
+
+
+def _factorize_column(left_values, right_values, sort):
+    """Codes of one key column over the left then right values, -1 where
+    missing, and the number of distinct values"""
+    if _int_and_float(left_values, right_values):
+        # pandas.merge compares integer with float keys as python numbers,
+        # so an integer above 2**53 does not match the float it rounds to
+        left_values = left_values.astype(object)
+        right_values = right_values.astype(object)
+    if _shared_categories(left_values, right_values):
+        # only the integer category codes need hashing
+        values = np.concatenate([left_values.cat.codes.values,
+                                 right_values.cat.codes.values])
+        codes, uniques = pd.factorize(values, sort=sort)
+        codes = codes.astype(np.int64)
+        missing = np.flatnonzero(uniques == -1)
+        if len(missing):
+            codes[codes == missing[0]] = -1
+            codes[codes > missing[0]] -= 1
+        return codes, len(uniques) - len(missing)
+
+    both = pd.concat([left_values, right_values], ignore_index=True)
+    codes, uniques = pd.factorize(both, sort=sort)
+    return codes.astype(np.int64), len(uniques)
+
+
+def factorize_keys(left_keys, right_keys, sort=False):
+    """Map the join keys of both frames into one dense integer code space
+
+    Each key column is hashed once, over the left and right values together.
+    Codes follow the order pandas.merge uses to lay out its result: order of
+    first appearance (left before right) or, with ``sort``, sorted order.
+    Missing values match each other, and sort where pandas.merge sorts them,
+    see ``_missing_first``.
+
+    Parameters
+    ----------
+    left_keys : list of pd.Series
+    right_keys : list of pd.Series
+    sort : boolean
+
+    Returns
+    -------
+    left_codes : np.ndarray of int64
+    right_codes : np.ndarray of int64
+    n_keys : int
+        number of distinct keys across both frames
+    """
+    n_left = len(left_keys[0])
+
+    combined = None
+    size = 1
+    for lk, rk in zip(left_keys, right_keys):
+        codes, n = _factorize_column(lk, rk, sort)
+        missing = codes == -1
+        if missing.any():
+            # pandas.merge sorts missing keys first or last, otherwise they
+            # keep their order of first appearance like any other key
+            if sort and _missing_first(lk, rk):
+                nan_code = 0
+                codes[~missing] += 1
+            elif sort:
+                nan_code = n
+            else:
+                first = missing.argmax()
+                nan_code = codes[:first].max() + 1 if first else 0
+                codes[codes >= nan_code] += 1
+            codes[missing] = nan_code
+            n += 1
+
+        if combined is None:
+            combined, size = codes, n
+            continue
+
+        if size * n >= 2 ** 62:
+            # keep the mixed radix codes within int64
+            combined = pd.factorize(combined, sort=sort)[0].astype(np.int64)
+            size = combined.max() + 1
+        combined = combined * n + codes
+        size *= n
+
+    if len(left_keys) > 1:
+        combined, uniques = pd.factorize(combined, sort=sort)
+        combined = combined.astype(np.int64)
+        size = len(uniques)
+
+    return combined[:n_left], combined[n_left:], int(size)
+
+
+def compact_columns(columns, sort=True):
+    """The same key column of several frames in its most compact form
+
+    Object columns become categoricals sharing one sorted dictionary, so that
+    joining them only compares integer codes, and integer columns are
+    downcast to the smallest integer dtype holding every frame's values.
+    Other columns are returned as they are, as are object columns with
+    missing values when ``sort`` is given, since pandas.merge sorts missing
+    categorical keys first but missing objects last.
+
+    Parameters
+    ----------
+    columns : list of pd.Series
+        one per frame
+    sort : boolean
+        order the categories by value, so that categorical keys sort like
+        the original ones
+
+    Returns
+    -------
+    columns : list of pd.Series
+    """
+    dtypes = [values.dtype for values in columns]
+    if all(pd.api.types.is_integer_dtype(dtype) for dtype in dtypes):
+        filled = [values for values in columns if len(values)]
+        if not filled:
+            return columns
+        low = min(int(values.min()) for values in filled)
+        high = max(int(values.max()) for values in filled)
+        for dtype in [np.int8, np.int16, np.int32, np.int64]:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return [values.astype(dtype) for values in columns]
+        return columns
+
+    categorical = [pd.api.types.is_categorical_dtype(dtype)
+                   for dtype in dtypes]
+    if all(categorical) and all(dtype == dtypes[0] for dtype in dtypes):
+        return columns
+    if not all(d == object or c for d, c in zip(dtypes, categorical)):
+        return columns
+    if sort and any(values.isnull().any()
+                    for values, c in zip(columns, categorical) if not c):
+        return columns
+
+    codes, categories = pd.factorize(
+        pd.concat([values.astype(object) if c else values
+                   for values, c in zip(columns, categorical)],
+                  ignore_index=True))
+    if sort:
+        # sort the distinct values only, then renumber the codes
+        order = pd.Index(categories).argsort()
+        categories = categories[order]
+        rank = np.empty(len(order) + 1, dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        rank[-1] = -1
+        codes = rank[codes]
+    ends = np.cumsum([len(values) for values in columns])
+    return [pd.Series(pd.Categorical.from_codes(frame_codes, categories),
+                      index=values.index, name=values.name)
+            for frame_codes, values in zip(np.split(codes, ends[:-1]),
+                                           columns)]
+
+
+# bits standing for a missing key of any dtype in ``_number_bits``
+_MISSING_BITS = np.array([np.nan]).view(np.uint64)[0]
+
+# scalars of an object key column that merge compares as numbers
+_NUMBER_TYPES = (numbers.Real, np.bool_)
+
+
+def _number_bits(values):
+    """64 bits of each number, equal for numbers merge matches
+
+    Integers and floats holding an integer give the bits of the int64, so
+    that 1, 1.0 and True agree and int64 keys stay exact. Other floats give
+    their own bits, and missing values ``_MISSING_BITS``.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'biu':
+        return values.astype(np.int64).view(np.uint64)
+    floats = values.astype(np.float64) + 0.0  # -0.0 matches 0.0
+    missing = np.isnan(floats)
+    with np.errstate(invalid='ignore'):
+        integral = (np.floor(floats) == floats) & \
+            (np.abs(floats) < 2.0 ** 63)
+    bits = floats.view(np.uint64)
+    bits[integral] = floats[integral].astype(np.int64).view(np.uint64)
+    bits[missing] = _MISSING_BITS
+    return bits
+
+
+def _object_hashes(values):
+    """Hashes of an object key column, numbers and missing values hashing
+    as in a numeric column"""
+    values = np.asarray(values, dtype=object)
+    missing = pd.isnull(values)
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred in ('string', 'unicode', 'bytes', 'empty'):
+        numeric = missing
+    elif inferred in ('integer', 'boolean', 'floating',
+                      'mixed-integer-float'):
+        numeric = np.ones(len(values), dtype=bool)
+    else:
+        numeric = missing | np.fromiter(
+            (isinstance(value, _NUMBER_TYPES) for value in values),
+            dtype=bool, count=len(values))
+
+    if numeric.all():
+        hashes = np.empty(len(values), dtype=np.uint64)
+    else:
+        hashes = pd.util.hash_array(values, categorize=False)
+    if numeric.any():
+        scalars = values[numeric]
+        scalars[missing[numeric]] = np.nan
+        if inferred in ('integer', 'boolean') and not missing.any():
+            is_int = np.ones(len(scalars), dtype=bool)
+        elif inferred == 'floating':
+            is_int = np.zeros(len(scalars), dtype=bool)
+        else:
+            is_int = np.fromiter(
+                (isinstance(value, (numbers.Integral, np.bool_))
+                 for value in scalars), dtype=bool, count=len(scalars))
+        bits = np.empty(len(scalars), dtype=np.uint64)
+        bits[is_int] = _number_bits(scalars[is_int].astype(np.int64))
+        bits[~is_int] = _number_bits(scalars[~is_int].astype(np.float64))
+        hashes[numeric] = pd.util.hash_array(bits)
+    return hashes
+
+
+def _column_hashes(values):
+    """Hashes of one key column, equal for values merge matches whatever
+    the column's dtype"""
+    types = pd.api.types
+    if types.is_categorical_dtype(values):
+        categories = pd.Series(values.cat.categories)
+        hashes = np.append(_column_hashes(categories),
+                           pd.util.hash_array(np.array([_MISSING_BITS])))
+        return hashes[values.cat.codes.values]
+    if types.is_datetime64_any_dtype(values) or \
+            types.is_timedelta64_dtype(values):
+        return pd.util.hash_array(values.values.view(np.int64))
+    if types.is_numeric_dtype(values):
+        return pd.util.hash_array(_number_bits(values.values))
+    return _object_hashes(values.values)
+
+
+def key_hashes(keys):
+    """64 bit hash of each row's key, equal for keys that merge would match
+
+    Keys are normalised as merge compares them: integer keys hash exactly,
+    floats and object scalars holding an integer hash as that integer, and
+    missing values alike, so a frame's hashes do not depend on the dtypes of
+    the frame it is merged with. Distinct keys can still share a hash.
+
+    Parameters
+    ----------
+    keys : list of pd.Series
+
+    Returns
+    -------
+    hashes : np.ndarray of uint64
+    """
+    # join keys are mostly distinct, so hash them directly rather than
+    # factorizing first
+    hashes = np.zeros(len(keys[0]), dtype=np.uint64)
+    for values in keys:
+        hashes = hashes * np.uint64(1000003) ^ _column_hashes(values)
+    return hashes
+
+
+def key_partitions(keys, n_partitions):
+    """Assign each row to one of ``n_partitions`` by hashing its key, so that
+    rows sharing a key land in the same partition in either frame
+
+    Parameters
+    ----------
+    keys : list of pd.Series
+    n_partitions : int
+
+    Returns
+    -------
+    partitions : np.ndarray of int64
+    """
+    return (key_hashes(keys) % n_partitions).astype(np.int64)
+
+
+def key_counts(left_codes, right_codes, n_keys):
+    """Number of rows with each key code in the left and right frames"""
+    left_counts = np.bincount(left_codes, minlength=n_keys)
+    right_counts = np.bincount(right_codes, minlength=n_keys)
+    return left_counts, right_counts
+
+
+def key_groups(codes, n_keys):
+    """Rows of a frame grouped by key code
+
+    Returns
+    -------
+    counts : np.ndarray
+        number of rows with each code
+    order : np.ndarray
+        row positions, stably sorted by code
+    start : np.ndarray
+        position in ``order`` of the first row with each code
+    """
+    counts = np.bincount(codes, minlength=n_keys)
+    order = np.argsort(codes, kind='mergesort')
+    start = np.cumsum(counts) - counts
+    return counts, order, start
+
+
+def _expand(driver_codes, other_codes, n_keys, keep_unmatched,
+            other_groups=None):
+    """Pair every row of the driving frame with each row of the other frame
+    sharing its key, driving rows in order and matches in order
+
+    ``other_groups`` can be given in place of ``other_codes``, see
+    ``key_groups``
+
+    Returns
+    -------
+    driver_indexer, other_indexer : np.ndarray of int64
+        -1 in ``other_indexer`` marks an unmatched driving row
+    """
+    if other_groups is None:
+        other_groups = key_groups(other_codes, n_keys)
+    other_counts, other_order, other_start = other_groups
+
+    n_matches = other_counts[driver_codes]
+    if keep_unmatched:
+        n_rows = np.maximum(n_matches, 1)
+    else:
+        n_rows = n_matches
+
+    driver_indexer = np.repeat(np.arange(len(driver_codes)), n_rows)
+    row_end = np.cumsum(n_rows)
+    within = np.arange(row_end[-1] if len(row_end) else 0) - \
+        np.repeat(row_end - n_rows, n_rows)
+
+    matched = np.repeat(n_matches > 0, n_rows)
+    position = np.repeat(other_start[driver_codes], n_rows) + within
+    other_indexer = np.full(len(driver_indexer), -1, dtype=np.int64)
+    other_indexer[matched] = other_order[position[matched]]
+    return driver_indexer.astype(np.int64), other_indexer
+
+
+def join_indexers(left_codes, right_codes, n_keys, how, sort=False):
+    """Row indexers of a join on factorized keys, matching the row order of
+    pandas.merge
+
+    The codes are joined by pandas' own join, which is faster than pairing
+    the rows with ``_expand``. As codes follow the order of the keys, and
+    sort as the keys do, the indexers equal those of pandas.merge on the keys
+
+    Parameters
+    ----------
+    left_codes, right_codes, n_keys :
+        see ``factorize_keys``
+    how : str
+        'left', 'right', 'inner' or 'outer'
+    sort : boolean
+
+    Returns
+    -------
+    left_indexer, right_indexer : np.ndarray of int64
+        row positions in each frame, -1 where the row has no partner
+    """
+    left_indexer, right_indexer = _get_join_indexers(
+        [left_codes], [right_codes], sort=sort, how=how)
+    return (left_indexer.astype(np.int64, copy=False),
+            right_indexer.astype(np.int64, copy=False))
+
+
+def sorted_keys(keys):
+    """Whether a frame is joined on a single key column, sorted ascending and
+    without missing values, so that ``sorted_join`` applies"""
+    if len(keys) != 1:
+        return False
+    if pd.api.types.is_categorical_dtype(keys[0]):
+        return False
+    index = pd.Index(keys[0])
+    return index.is_monotonic_increasing and not index.hasnans
+
+
+def _expand_sorted(n_matches, first_match, keep_unmatched):
+    """``_expand`` for sorted keys, where the matches of each driving row are
+    the ``n_matches`` rows from ``first_match`` of the other frame"""
+    if not (n_matches > 1).any():
+        # at most one match per row, as in a 1:1 or m:1 merge
+        other_indexer = np.where(n_matches > 0, first_match, -1)
+        if keep_unmatched:
+            driver_indexer = np.arange(len(n_matches))
+        else:
+            driver_indexer = np.flatnonzero(n_matches)
+            other_indexer = other_indexer[driver_indexer]
+        return driver_indexer.astype(np.int64), other_indexer.astype(np.int64)
+
+    if keep_unmatched:
+        n_rows = np.maximum(n_matches, 1)
+    else:
+        n_rows = n_matches
+
+    driver_indexer = np.repeat(np.arange(len(n_matches)), n_rows)
+    row_end = np.cumsum(n_rows)
+    within = np.arange(row_end[-1] if len(row_end) else 0) - \
+        np.repeat(row_end - n_rows, n_rows)
+
+    other_indexer = np.repeat(first_match, n_rows) + within
+    other_indexer[np.repeat(n_matches == 0, n_rows)] = -1
+    return driver_indexer.astype(np.int64), other_indexer.astype(np.int64)
+
+
+def _sorted_runs(values):
+    """Distinct values of a sorted array, with the position of the first row
+    and the number of rows of each"""
+    starts = np.flatnonzero(np.concatenate([[True],
+                                            values[1:] != values[:-1]]))
+    starts = starts[:len(values)]
+    lengths = np.diff(np.append(starts, len(values)))
+    return values[starts], starts, lengths
+
+
+def _run_matches(runs, other_runs):
+    """Number of rows of the other frame matching each run of keys, and the
+    first of them"""
+    values = runs[0]
+    other_values, other_starts, other_lengths = other_runs
+    position = other_values.searchsorted(values)
+    found = position < len(other_values)
+    found[found] = other_values[position[found]] == values[found]
+    position = position[found]
+
+    n_matches = np.zeros(len(values), dtype=np.int64)
+    first_match = np.zeros(len(values), dtype=np.int64)
+    n_matches[found] = other_lengths[position]
+    first_match[found] = other_starts[position]
+    return np.repeat(n_matches, runs[2]), np.repeat(first_match, runs[2])
+
+
+def sorted_join(left_values, right_values, how, sort=False, row_limit=None):
+    """
+    Check and join two key arrays that are both sorted ascending
+
+    A merge-join: each sorted array is split into runs of equal keys, found
+    by comparing neighbouring keys, and the runs of one frame are matched to
+    those of the other by binary search. The keys are never hashed or
+    sorted. The indexers are identical to those of ``join_indexers`` on the
+    factorized keys.
+
+    Parameters
+    ----------
+    left_values, right_values : np.ndarray
+        the key column of each frame, see ``sorted_keys``
+    how : str
+    sort : boolean
+    row_limit : int, optional
+        skip the join if it has more rows than this
+
+    Returns
+    -------
+    joined : KeyJoin
+    """
+    left_runs = _sorted_runs(left_values)
+    right_runs = _sorted_runs(right_values)
+    left_matches, left_first = _run_matches(left_runs, right_runs)
+    right_matches, right_first = _run_matches(right_runs, left_runs)
+
+    both = int(left_matches.sum())
+    outer_counts = pd.Series([int((left_matches == 0).sum()),
+                              int((right_matches == 0).sum()), both],
+                             index=MERGE_SETS)
+    counts = outer_counts.copy()
+    if how in ['right', 'inner']:
+        counts['left_only'] = 0
+    if how in ['left', 'inner']:
+        counts['right_only'] = 0
+
+    distinct = (len(left_runs[0]), len(right_runs[0]),
+                int((left_matches[left_runs[1]] > 0).sum()))
+    joined = KeyJoin(None, None, counts, outer_counts,
+                     len(left_runs[0]) == len(left_values),
+                     len(right_runs[0]) == len(right_values), distinct)
+    if row_limit is not None and counts.sum() > row_limit:
+        return joined
+
+    if how == 'right':
+        right_indexer, left_indexer = _expand_sorted(
+            right_matches, right_first, keep_unmatched=True)
+        if not sort:
+            # pandas puts the keys found in the left frame first
+            on_left = left_indexer >= 0
+            order = np.concatenate([np.flatnonzero(on_left),
+                                    np.flatnonzero(~on_left)])
+            left_indexer = left_indexer[order]
+            right_indexer = right_indexer[order]
+    else:
+        left_indexer, right_indexer = _expand_sorted(
+            left_matches, left_first, keep_unmatched=how != 'inner')
+
+    if how == 'outer':
+        right_only = np.flatnonzero(right_matches == 0)
+        n_rows = len(left_indexer) + len(right_only)
+        if sort:
+            # interleave the right only rows by key, both parts being sorted
+            row_keys = left_values[left_indexer]
+            right_only_keys = right_values[right_only]
+            right_only_rows = row_keys.searchsorted(right_only_keys) + \
+                np.arange(len(right_only))
+            left_rows = np.arange(len(left_indexer)) + \
+                right_only_keys.searchsorted(row_keys)
+        else:
+            left_rows = np.arange(len(left_indexer))
+            right_only_rows = np.arange(len(left_indexer), n_rows)
+
+        outer_left = np.full(n_rows, -1, dtype=np.int64)
+        outer_right = np.empty(n_rows, dtype=np.int64)
+        outer_left[left_rows] = left_indexer
+        outer_right[left_rows] = right_indexer
+        outer_right[right_only_rows] = right_only
+        left_indexer, right_indexer = outer_left, outer_right
+
+    return joined._replace(left_indexer=left_indexer,
+                           right_indexer=right_indexer)
+
+
+def merge_indicator(left_indexer, right_indexer):
+    """Categorical '_merge' column for a join described by its indexers"""
+    codes = np.where(left_indexer == -1, 1,
+                     np.where(right_indexer == -1, 0, 2))
+    return pd.Categorical.from_codes(codes, categories=MERGE_SETS)
+
+
+def distinct_keys(left_counts, right_counts):
+    """Number of distinct keys in the left frame, the right frame and both"""
+    in_left = left_counts > 0
+    in_right = right_counts > 0
+    return (int(in_left.sum()), int(in_right.sum()),
+            int((in_left & in_right).sum()))
+
+
+def merge_counts(left_counts, right_counts, how):
+    """Number of rows of each merge set in the result of a join, computed
+    from the key counts alone
+
+    Returns
+    -------
+    counts : pd.Series
+        indexed by 'left_only', 'right_only' and 'both'
+    """
+    in_left = left_counts > 0
+    in_right = right_counts > 0
+
+    both = int((left_counts * right_counts).sum())
+    left_only = int(left_counts[~in_right].sum())
+    right_only = int(right_counts[~in_left].sum())
+    if how in ['right', 'inner']:
+        left_only = 0
+    if how in ['left', 'inner']:
+        right_only = 0
+    return pd.Series([left_only, right_only, both], index=MERGE_SETS)
+
+
+def audit_counts(left_counts, right_counts):
+    """Number of left rows with a matching key ('both') and without one
+    ('left_only'), and of right rows without one ('right_only'), as kept by
+    a semi or anti join
+
+    Returns
+    -------
+    counts : pd.Series
+        indexed by 'left_only', 'right_only' and 'both'
+    """
+    in_left = left_counts > 0
+    in_right = right_counts > 0
+    return pd.Series([int(left_counts[~in_right].sum()),
+                      int(right_counts[~in_left].sum()),
+                      int(left_counts[in_right].sum())], index=MERGE_SETS)
+
+
+def key_rows(left_counts, right_counts, how):
+    """Number of rows each key contributes to the result of a join"""
+    rows = left_counts * right_counts
+    if how in ['left', 'outer']:
+        rows = np.where(right_counts == 0, left_counts, rows)
+    if how in ['right', 'outer']:
+        rows = np.where(left_counts == 0, right_counts, rows)
+    return rows
+
+
+def merged_row_bytes(left_frame, right_frame, left_on, right_on):
+    """Approximate bytes per row of the merged frame, from the column dtypes.
+    Python objects count as one pointer"""
+    shared_keys = [rk for lk, rk in zip(left_on, right_on) if lk == rk]
+    right_dtypes = right_frame.dtypes.drop(shared_keys)
+    return int(sum(dt.itemsize for dt in left_frame.dtypes) +
+               sum(dt.itemsize for dt in right_dtypes))
+
+
+def worst_keys(left_keys, right_keys, left_codes, right_codes, left_counts,
+               right_counts, how, n_worst=10):
+    """The keys contributing the most rows to the result of a join
+
+    Parameters
+    ----------
+    left_keys, right_keys : pd.DataFrame
+        key columns of each frame
+    left_codes, right_codes, left_counts, right_counts :
+        see ``factorize_keys`` and ``key_counts``
+    how : str
+    n_worst : int
+
+    Returns
+    -------
+    worst : pd.DataFrame
+        key values, named as in the left frame, with the number of rows in
+        the left frame, right frame and merged frame
+    """
+    rows = key_rows(left_counts, right_counts, how)
+    worst = np.argsort(-rows, kind='mergesort')[:n_worst]
+    worst = worst[rows[worst] > 0]
+
+    # first row holding each key, on whichever side it appears
+    first_left = np.full(len(rows), -1, dtype=np.int64)
+    first_left[left_codes[::-1]] = np.arange(len(left_codes))[::-1]
+    first_right = np.full(len(rows), -1, dtype=np.int64)
+    first_right[right_codes[::-1]] = np.arange(len(right_codes))[::-1]
+
+    in_left = first_left[worst] >= 0
+    right_examples = right_keys.iloc[first_right[worst[~in_left]]].copy()
+    right_examples.columns = left_keys.columns
+    examples = pd.concat([left_keys.iloc[first_left[worst[in_left]]],
+                          right_examples])
+    examples = examples.iloc[np.argsort(np.concatenate(
+        [np.flatnonzero(in_left), np.flatnonzero(~in_left)]))]
+
+    examples = examples.reset_index(drop=True)
+    examples['left_rows'] = left_counts[worst]
+    examples['right_rows'] = right_counts[worst]
+    examples['merged_rows'] = rows[worst]
+    return examples
+
+
+def set_violations(left_keys, right_keys, left_codes, right_codes,
+                   left_counts, right_counts, sets, indicator='_merge',
+                   n_examples=10):
+    """Example keys of an outer join falling outside the expected ``sets``,
+    found from the key columns alone
+
+    Parameters
+    ----------
+    left_keys, right_keys : pd.DataFrame
+        key columns of each frame
+    left_codes, right_codes, left_counts, right_counts :
+        see ``factorize_keys`` and ``key_counts``
+    sets : list of str
+        expected merge sets
+    indicator : str
+        name of the column holding the merge set of each example
+    n_examples : int
+        maximum number of examples from each frame
+
+    Returns
+    -------
+    examples : pd.DataFrame
+        keys of offending rows, named as in the left frame
+    """
+    examples = []
+
+    matched = right_counts[left_codes] > 0
+    bad = np.zeros(len(left_codes), dtype=bool)
+    if 'both' not in sets:
+        bad |= matched
+    if 'left_only' not in sets:
+        bad |= ~matched
+    rows = np.flatnonzero(bad)[:n_examples]
+    left_examples = left_keys.iloc[rows].copy()
+    left_examples[indicator] = np.where(matched[rows], 'both', 'left_only')
+    examples.append(left_examples)
+
+    if 'right_only' not in sets:
+        rows = np.flatnonzero(left_counts[right_codes] == 0)[:n_examples]
+        right_examples = right_keys.iloc[rows].copy()
+        right_examples.columns = left_keys.columns
+        right_examples[indicator] = 'right_only'
+        examples.append(right_examples)
+
+    return pd.concat(examples, ignore_index=True)
+
+
+def merge_key_dtypes(left_values, right_values):
+    """The dtypes pandas.merge casts a pair of key columns to before joining
+    them, None for a column it leaves as it is
+
+    Keys of the same dtype, numeric keys (e.g. int and float) and object keys
+    are joined as they are. Otherwise, e.g. categoricals with different
+    categories or a categorical and an object column, each categorical is
+    cast to the dtype of its categories and any other column to object.
+    """
+    types = pd.api.types
+    if not len(left_values) or not len(right_values):
+        return None, None
+    left_cat = types.is_categorical_dtype(left_values)
+    right_cat = types.is_categorical_dtype(right_values)
+    if left_cat and right_cat:
+        if left_values.dtype == right_values.dtype:
+            return None, None
+    elif not left_cat and not right_cat:
+        if types.is_dtype_equal(left_values.dtype, right_values.dtype):
+            return None, None
+        if types.is_numeric_dtype(left_values) and \
+                types.is_numeric_dtype(right_values):
+            kinds = set([left_values.dtype.kind, right_values.dtype.kind])
+            if len(kinds) == 1 or kinds <= set('iuf') or \
+                    types.infer_dtype(left_values, skipna=False) == \
+                    types.infer_dtype(right_values, skipna=False):
+                return None, None
+        elif types.is_object_dtype(left_values) and \
+                types.is_object_dtype(right_values):
+            return None, None
+
+    def _cast_to(values, categorical):
+        if categorical:
+            return values.cat.categories.dtype
+        if types.is_object_dtype(values):
+            return None
+        return np.dtype(object)
+
+    return _cast_to(left_values, left_cat), _cast_to(right_values, right_cat)
+
+
+def _take_rows(frame, indexer):
+    """Rows of ``frame`` at ``indexer``, all missing where it is -1"""
+    # as pandas.merge does, take the rows by position and upcast the columns
+    # that get missing values, without looking up the labels of ``frame``
+    return frame._reindex_with_indexers(
+        {0: [pd.RangeIndex(len(indexer)), indexer]}, copy=True,
+        allow_dups=True)
+
+
+def _key_values(values, dtype, rows):
+    """Values of a key column at ``rows``, cast to ``dtype`` unless None.
+    Extension values such as tz-aware datetimes keep their dtype"""
+    values = values.take(rows)
+    if dtype is not None:
+        values = values.astype(dtype)
+    return values._values
+
+
+def build_merged(left_frame, right_frame, left_on, right_on, left_indexer,
+                 right_indexer, suffixes):
+    """Assemble the merged DataFrame the way pandas.merge does for a join
+    on columns
+
+    Key columns named the same on both sides are kept once, filled from the
+    right frame where the left row is missing. Other overlapping columns are
+    given ``suffixes``. Key columns of different dtypes are cast as
+    pandas.merge casts them, see ``merge_key_dtypes``.
+    """
+    shared_keys = [rk for lk, rk in zip(left_on, right_on) if lk == rk]
+
+    # like pandas, cast the key column named by the join, which is the left
+    # one where the names differ
+    left_casts = {}
+    right_casts = {}
+    for lk, rk in zip(left_on, right_on):
+        left_dtype, right_dtype = merge_key_dtypes(left_frame[lk],
+                                                   right_frame[rk])
+        if left_dtype is not None:
+            left_casts[lk] = left_dtype
+        if right_dtype is not None and lk == rk:
+            right_casts[rk] = right_dtype
+    if len(left_frame):
+        right_drop = shared_keys
+        left_drop = []
+    else:
+        # like pandas, an empty left frame gives up its keys instead
+        right_drop = []
+        left_drop = shared_keys
+
+    overlap = left_frame.columns.drop(left_drop).intersection(
+        right_frame.columns.drop(right_drop))
+    lsuffix, rsuffix = suffixes
+    if len(overlap) and not lsuffix and not rsuffix:
+        raise ValueError('columns overlap but no suffix specified: '
+                         '{}'.format(overlap))
+
+    # take the rows before dropping columns, so a large frame is never
+    # copied whole
+    left_part = _take_rows(left_frame, left_indexer)
+    right_part = _take_rows(right_frame, right_indexer)
+    if left_drop:
+        left_part = left_part.drop(axis=1, labels=left_drop)
+    if right_drop:
+        right_part = right_part.drop(axis=1, labels=right_drop)
+    for frame, part, indexer, casts in [
+            (left_frame, left_part, left_indexer, left_casts),
+            (right_frame, right_part, right_indexer, right_casts)]:
+        for name, dtype in casts.iteritems():
+            if name in part:
+                part[name] = _take_rows(frame[[name]].astype(dtype),
+                                        indexer)[name]
+
+    left_missing = left_indexer == -1
+    if left_missing.any():
+        # every position taken from one side has a partner on the other, so
+        # clipping the indexers keeps each key column's own dtype
+        left_rows = np.maximum(left_indexer, 0)
+        right_rows = np.maximum(right_indexer, 0)
+        for name in right_drop:
+            rvals = _key_values(right_frame[name], right_casts.get(name),
+                                right_rows)
+            if left_missing.all():
+                key_col = rvals
+            else:
+                lvals = _key_values(left_frame[name], left_casts.get(name),
+                                    left_rows)
+                key_col = pd.Index(lvals).where(~left_missing, rvals)
+            left_part[name] = key_col
+
+    if len(overlap):
+        left_part.columns = ['{}{}'.format(c, lsuffix) if c in overlap else c
+                             for c in left_part.columns]
+        right_part.columns = ['{}{}'.format(c, rsuffix) if c in overlap else c
+                              for c in right_part.columns]
+
+    return pd.concat([left_part, right_part], axis=1)
@@ -0,0 +1,195 @@
+__author__ = 'rwest'
+
+import sys
+import time
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+MergeReport = namedtuple('MergeReport', [
+    'mergetype', 'how', 'left_on', 'right_on', 'msg', 'path', 'left_rows',
+    'right_rows', 'merged_rows', 'counts', 'left_keys', 'right_keys',
+    'shared_keys', 'merged_bytes', 'seconds', 'phases', 'memory', 'error'])
+
+# functions called with the MergeReport of every merge
+_HOOKS = []
+
+
+def add_merge_hook(hook):
+    """
+    Call ``hook`` with the ``MergeReport`` of every merge, e.g. to send merge
+    statistics to a metrics system. Pass ``noprint=True`` to merge as well to
+    skip the printed statistics
+
+    Reports come from ``flyingpandas.merge``, ``PreparedMerge.merge``,
+    ``merge_chunks`` and ``merge_partitioned`` once their last chunk is read,
+    and ``merge_many``, which reports each frame merged onto the base frame
+
+    ``MergeReport`` fields
+    ----------------------
+    mergetype, how, left_on, right_on, msg :
+        the arguments of the merge
+    path : str
+        how the keys were joined: 'hash', 'sorted' or 'parallel' by
+        ``flyingpandas.merge``, otherwise 'prepared', 'chunks',
+        'partitioned' or 'many' after the function merging
+    left_rows, right_rows, merged_rows : int
+    counts : pd.Series
+        rows of each merge set in the merged frame, or for semi and anti
+        joins the rows of each frame with and without a match
+    left_keys, right_keys, shared_keys : int
+        distinct keys in the left frame, the right frame and both. The left
+        keys of ``merge_chunks`` are only counted for '1:1' and '1:m' merges
+    merged_bytes : int
+        memory of the merged frame, counting each python object as a
+        pointer. None for the frames of ``merge_many`` but the last, whose
+        merged frame is the one returned
+    seconds : float
+        time of the whole merge, leaving out the time the caller holds each
+        chunk of ``merge_chunks`` and ``merge_partitioned``
+    phases : OrderedDict
+        seconds spent in each phase of the merge: 'validate', 'partition'
+        (``merge_partitioned`` only), 'keys', 'checks', 'join', 'stats',
+        'build' and 'sanity'
+    memory : OrderedDict
+        growth in bytes of the peak memory of the process during each phase,
+        empty where this is unknown
+    error : tuple
+        if the merge failed, the arguments of a failed check, e.g.
+        ``('mer_4', 'Left key is not unique')``, or the type name and
+        message of any other exception, otherwise None. 'mer_7' adds a
+        DataFrame of example keys outside the expected sets, and 'mer_11' one
+        of the keys contributing the most rows. Fields not reached
+        before the failure are None. The chunks of ``merge_chunks`` and
+        ``merge_partitioned`` left unread fail with 'GeneratorExit'
+
+    >>> reports = []
+    >>> add_merge_hook(reports.append)
+
+    """
+    _HOOKS.append(hook)
+
+
+def remove_merge_hook(hook):
+    """Stop calling a hook added by ``add_merge_hook``"""
+    _HOOKS.remove(hook)
+
+
+def _error_args(error):
+    """``MergeReport.error`` for an exception"""
+    if isinstance(error, AssertionError) and error.args:
+        return error.args
+    return type(error).__name__, str(error)
+
+
+def _peak_memory():
+    """Peak resident memory of this process in bytes, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak
+    return peak * 1024
+
+
+class Recorder(object):
+    """Collects the statistics of one operation as it runs
+
+    Fields of the report are set by item, and ``phase`` closes each phase of
+    the operation in turn.
+    """
+
+    # namedtuple of the report, with 'seconds', 'phases' and 'memory' fields
+    report_type = None
+
+    def __init__(self, **fields):
+        self.fields = dict.fromkeys(self.report_type._fields)
+        self.fields.update(fields)
+        self.phases = OrderedDict()
+        self.memory = OrderedDict()
+        self.start = self.last = time.time()
+        self.skipped = 0
+        self.last_memory = _peak_memory()
+
+    def __setitem__(self, name, value):
+        self.fields[name] = value
+
+    def phase(self, name):
+        """End the phase ``name``, which started when the last one ended"""
+        now = time.time()
+        self.phases[name] = self.phases.get(name, 0) + now - self.last
+        self.last = now
+        if self.last_memory is not None:
+            peak = _peak_memory()
+            self.memory[name] = self.memory.get(name, 0) + \
+                peak - self.last_memory
+            self.last_memory = peak
+
+    def skip(self):
+        """Start the next phase now, leaving the time since the last phase
+        out of the report, e.g. while the caller holds a yielded chunk"""
+        now = time.time()
+        self.skipped += now - self.last
+        self.last = now
+
+    def report(self, **fields):
+        seconds = time.time() - self.start - self.skipped
+        return self.report_type(**dict(self.fields, phases=self.phases,
+                                       memory=self.memory, seconds=seconds,
+                                       **fields))
+
+
+class MergeRecorder(Recorder):
+    """Collects the statistics of one merge as it runs"""
+
+    report_type = MergeReport
+
+    def emit(self, hook=None, error=None):
+        """Send the report to ``hook`` and every hook added with
+        ``add_merge_hook``, with the exception ``error`` if the merge
+        failed"""
+        hooks = list(_HOOKS)
+        if hook is not None:
+            hooks.append(hook)
+        if not hooks:
+            return
+        if error is not None:
+            error = _error_args(error)
+        report = self.report(error=error)
+        for hook in hooks:
+            hook(report)
+
+    @contextmanager
+    def recording(self, hook=None):
+        """Emit the report once the block ends, however it ends"""
+        error = None
+        try:
+            yield self
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.emit(hook, error=error)
+
+    @contextmanager
+    def recording_failures(self, hook=None):
+        """Emit the report if the block fails, for a merge that goes on in
+        ``recorded_chunks``"""
+        try:
+            yield self
+        except BaseException as e:
+            self.emit(hook, error=e)
+            raise
+
+    def recorded_chunks(self, chunks, hook=None):
+        """Yield the merged ``chunks``, emitting the report once they are all
+        read or the merge fails, and leaving out the time the caller holds
+        each chunk"""
+        with self.recording(hook):
+            for chunk in chunks:
+                yield chunk
+                self.skip()
@@ -0,0 +1,194 @@
+__author__ = 'rwest'
+
+import time
+
+import numpy as np
+import pandas as pd
+
+import _join
+import _merge_report
+from _stata_merge import (print_merge_stats, _validate_args, _check_columns,
+                          _check_unique, _check_sets)
+
+
+def merge_many(base, frames, mergetypes='m:1', how='left', on=None,
+               sets=None, sort=False, matches_required=True, noprint=False,
+               msg='', report=None):
+    """
+    Merge many frames onto one base frame on a shared key, in one pass
+
+    Gives the same result as chaining ``flyingpandas.merge`` onto ``base``
+    one frame at a time, with the same checks and merge statistics for each
+    frame. The keys of every frame are factorized together once, and each
+    frame's columns are taken straight into the merged frame, so the growing
+    result is never copied.
+
+    Parameters
+    ----------
+    base : DataFrame
+        the left frame of every merge
+    frames : list of DataFrames
+        frames to merge onto ``base``, in order. Each must be unique on the
+        key
+    mergetypes : str or list of str, default 'm:1'
+        '1:1' or 'm:1', for every frame or one per frame, see
+        ``flyingpandas.merge``
+    how : str, default 'left'
+        'left' or 'inner'
+    on : str or list of str
+        key columns, named the same in every frame
+    sets : Optional[str or list of str]
+        expected sets of every merge, see ``flyingpandas.merge``
+    report : Optional [callable]
+        called with a ``MergeReport`` for each frame once it is merged, see
+        ``add_merge_hook``. The report of the last frame also covers building
+        the merged frame
+
+    For all other parameters see ``flyingpandas.merge``. Columns other than
+    the keys must not appear in more than one frame.
+
+    Returns
+    -------
+    merged : DataFrame
+
+    >>> panel = merge_many(people, [income, health, education],
+    ...                    mergetypes='1:1', how='left', on='person_id')
+
+    """
+    # one recorder per frame, the last of which is reported on return
+    recorders = [_merge_report.MergeRecorder(how=how, msg=msg, path='many',
+                                             left_rows=len(base))]
+    try:
+        new_frame = _merge_many(recorders, report, base, frames, mergetypes,
+                                how, on, sets, sort, matches_required,
+                                noprint, msg)
+    except BaseException as e:
+        recorders[-1].emit(report, error=e)
+        raise
+    recorders[-1].emit(report)
+    return new_frame
+
+
+def _merge_many(recorders, report, base, frames, mergetypes, how, on, sets,
+                sort, matches_required, noprint, msg):
+    """``merge_many``, recording the statistics of each frame in a new
+    recorder appended to ``recorders`` once the one before is reported"""
+    start = time.time()
+    sets = _validate_args(None, how, sets, noprint, msg,
+                          hows=['left', 'inner'])
+
+    frames = list(frames)
+    if not frames:
+        raise ValueError('merge_many needs at least one frame to merge')
+    if isinstance(mergetypes, basestring):
+        mergetypes = [mergetypes] * len(frames)
+    if len(mergetypes) != len(frames):
+        raise ValueError('{} mergetypes given for {} frames'.format(
+            len(mergetypes), len(frames)))
+    for mergetype in mergetypes:
+        if mergetype not in ['1:1', 'm:1']:
+            raise AssertionError('mer_3', 'merge_many mergetypes need to be '
+                                          '1:1 or m:1')
+
+    if not on:
+        raise ValueError("merge_many needs the shared key columns 'on'")
+    if isinstance(on, basestring):
+        on = [on]
+    on = list(on)
+    recorder = recorders[-1]
+    recorder['left_on'], recorder['right_on'] = on, on
+    recorder.phase('validate')
+
+    # the columns of the merge so far, to check each frame against
+    merged_columns = base.iloc[:0]
+    for frame in frames:
+        _check_columns(merged_columns, frame, on, on, ('__', '__'))
+        merged_columns = pd.concat([merged_columns,
+                                    frame.iloc[:0].drop(on, axis=1)], axis=1)
+
+    # factorize the keys of every frame together, once
+    frame_keys = [pd.concat([frame[k] for frame in frames], ignore_index=True)
+                  for k in on]
+    base_codes, frame_codes, n_keys = _join.factorize_keys(
+        [base[k] for k in on], frame_keys, sort=sort)
+    frame_ends = np.cumsum([len(frame) for frame in frames])
+    frame_codes = np.split(frame_codes, frame_ends[:-1])
+    recorder.phase('keys')
+
+    base_keys = base[on]
+    rows = np.arange(len(base))
+    positions = []
+    empty_left = []
+    for i, (frame, mergetype, codes) in enumerate(zip(frames, mergetypes,
+                                                      frame_codes)):
+        if i:
+            recorder.emit(report)
+            recorder = _merge_report.MergeRecorder(
+                how=how, msg=msg, path='many', left_on=on, right_on=on,
+                left_rows=len(rows))
+            recorders.append(recorder)
+        recorder['mergetype'] = mergetype
+        recorder['right_rows'] = len(frame)
+
+        left_codes = base_codes[rows]
+        empty_left.append(not len(rows))
+        left_counts, right_counts = _join.key_counts(left_codes, codes,
+                                                     n_keys)
+        (recorder['left_keys'], recorder['right_keys'],
+         recorder['shared_keys']) = _join.distinct_keys(left_counts,
+                                                        right_counts)
+        recorder.phase('keys')
+
+        _check_unique(mergetype, left_counts, right_counts)
+
+        _check_sets(sets, mergetype, how, base_keys.iloc[rows], frame, on, on,
+                    left_codes, codes, left_counts, right_counts, '_merge',
+                    matches_required, noprint, msg)
+        recorder.phase('checks')
+
+        counts = _join.merge_counts(left_counts, right_counts, how)
+        recorder['counts'] = counts
+        if noprint==False:
+            print
+            print('Frame {} of {}'.format(i + 1, len(frames)))
+        print_merge_stats(counts, mergetype, how, on, on, matches_required,
+                          noprint, msg)
+
+        # the frame is unique on the key, so each key has at most one row
+        position = np.full(n_keys, -1, dtype=np.int64)
+        position[codes] = np.arange(len(codes))
+        positions.append(position)
+        if how == 'inner':
+            rows = rows[position[left_codes] >= 0]
+        recorder['merged_rows'] = len(rows)
+        recorder.phase('stats')
+
+    # like pandas, every merge but an unsorted left one groups rows by key
+    if sort or how != 'left':
+        rows = rows[np.argsort(base_codes[rows], kind='mergesort')]
+
+    row_codes = base_codes[rows]
+    parts = [_join._take_rows(base, rows)]
+    for frame, position, empty in zip(frames, positions, empty_left):
+        part = _join._take_rows(frame, position[row_codes])
+        if empty:
+            # like pandas, an empty left frame gives up its keys instead
+            parts = [p.drop(on, axis=1, errors='ignore') for p in parts]
+            parts.append(part)
+        else:
+            parts.append(part.drop(on, axis=1))
+    new_frame = pd.concat(parts, axis=1, copy=False)
+    recorder['merged_bytes'] = int(new_frame.memory_usage().sum())
+    recorder.phase('build')
+
+    if noprint==False:
+        print
+        print 'Rows of   base dataframe:', len(base)
+        print 'Frames merged           :', len(frames)
+        print 'Rows of merged dataframe:', len(new_frame)
+        print
+        print('merge time: (seconds)')
+        print('{:5.3f}'.format(time.time() - start))
+        print('-'*40)
+
+    return new_frame
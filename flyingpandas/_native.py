@@ -0,0 +1,361 @@
+__author__ = 'rwest'
+
+from copy import copy
+
+from _autofit import excel_width
+
+try:
+    from pandas.io.formats.excel import ExcelCell, ExcelFormatter
+except ImportError:  # pandas < 0.20
+    from pandas.core.format import ExcelCell, ExcelFormatter
+
+try:
+    from pandas.io.excel import _XlsxStyler
+except ImportError:  # pandas >= 0.25
+    from pandas.io.excel._xlsxwriter import _XlsxStyler
+
+# pandas writer engines whose style dictionaries support number formats and
+# solid fills
+NATIVE_ENGINES = ('openpyxl', 'xlsxwriter')
+
+
+def _rgb_to_hex(rgb):
+    """Convert an (r, g, b) tuple to the hex string used by pandas styles"""
+    return '{:02X}{:02X}{:02X}'.format(*rgb)
+
+
+class FormatCache(object):
+    """The engine formats of one workbook, each built once for a distinct
+    style dict rather than once per cell or per table
+
+    Style dicts are told apart by identity, which is why ``_cell_style_lookup``
+    shares them. pandas builds a new, equal, dict for every header and index
+    cell, so those are interned by value first.
+    """
+
+    def __init__(self):
+        # key -> (style dict, engine format), the style is kept alive so
+        # that its id is not reused
+        self.formats = {}
+        self.pandas_styles = {}
+
+    def intern(self, style):
+        return self.pandas_styles.setdefault(str(style), style)
+
+
+def _cell_style_lookup(spacing, column_formats, row_formats, add_color_rows,
+                       include_index, include_header, colors, styles=None):
+    """Build a function returning the pandas style dict for a worksheet cell
+
+    Mirrors ``FormatPlan.add_table``: column formats cover the data rows,
+    row formats cover the data columns and take priority over column formats,
+    and data rows alternate between the two ``colors``.
+
+    Parameters
+    ----------
+    spacing : dict of integers
+        should contain 'startrow', 'startcol', 'endrow' and 'endcol'. An
+        'endrow' of None leaves the table open ended
+    column_formats : dict
+    row_formats : dict
+    add_color_rows : boolean
+    include_index : boolean
+    include_header : boolean
+    colors : tuple of two (r, g, b) tuples
+        fill color of the even and odd data rows
+    styles : dict, optional
+        style dicts by (number format, fill), shared by every table given the
+        same dict
+
+    Returns
+    -------
+    get_style : function
+        maps a (row, col) position, indexed from 1, to a style dict or None
+    """
+    startdatarow = spacing['startrow']
+    if include_header:
+        startdatarow += 1
+
+    startdatacol = spacing['startcol']
+    if include_index:
+        startdatacol += 1
+
+    endrow = spacing['endrow']
+    if endrow is None:
+        endrow = float('inf')
+    endcol = spacing['endcol']
+
+    col_lookup = {}
+    for col_num, format in column_formats.iteritems():
+        if include_index:
+            col_num += 1
+        col_lookup[col_num] = format
+
+    row_lookup = {}
+    for row_num, format in row_formats.iteritems():
+        if include_header:
+            row_num += 1
+        row_lookup[row_num] = format
+
+    fills = [_rgb_to_hex(c) for c in colors]
+
+    # share one style dict per (number format, fill) so the writers only
+    # build each excel format once
+    if styles is None:
+        styles = {}
+
+    def get_style(row, col):
+        if row < startdatarow or row > endrow:
+            return None
+
+        in_data_cols = startdatacol <= col <= endcol
+        if in_data_cols and row in row_lookup:
+            format = row_lookup[row]
+        else:
+            format = col_lookup.get(col)
+
+        fill = None
+        if add_color_rows and in_data_cols:
+            fill = fills[(row - startdatarow) % 2]
+
+        if format is None and fill is None:
+            return None
+
+        key = (format, fill)
+        style = styles.get(key)
+        if style is None:
+            style = {}
+            if format is not None:
+                style['number_format'] = {'format_code': format}
+            if fill is not None:
+                style['fill'] = {'patternType': 'solid', 'fgColor': fill}
+            styles[key] = style
+        return style
+
+    return get_style
+
+
+def _styled_cells(cells, startrow, startcol, get_style, cache, tally):
+    """Attach formatting to pandas ``ExcelCell`` objects as they are written,
+    counting the cells and the styled cells in ``tally``"""
+    for cell in cells:
+        tally[0] += 1
+        style = get_style(startrow + cell.row + 1, startcol + cell.col + 1)
+        if style is not None:
+            cell.style = style
+            tally[1] += 1
+        elif cell.style:
+            cell.style = cache.intern(cell.style)
+            tally[1] += 1
+        yield cell
+
+
+def _row_major(cells):
+    """Reorder the column by column cells generated by pandas into rows, as
+    required by xlsxwriter's constant_memory mode
+
+    A row is written out once the next one starts, so a merged range over
+    several rows, e.g. of a MultiIndex level, would lose the cells below its
+    first row. It is written as its first cell alone instead, which holds
+    the value.
+    """
+    rows = {}
+    for cell in cells:
+        if cell.mergestart is not None and cell.mergestart != cell.row:
+            if cell.mergeend is not None and cell.mergeend != cell.col:
+                cell = ExcelCell(cell.row, cell.col, cell.val, cell.style,
+                                 cell.row, cell.mergeend)
+            else:
+                cell = ExcelCell(cell.row, cell.col, cell.val, cell.style)
+        rows.setdefault(cell.row, []).append(cell)
+    for row_num in sorted(rows):
+        for cell in rows[row_num]:
+            yield cell
+
+
+def _worksheet(pdwriter, sheet_name):
+    """The sheet ``sheet_name``, added to the workbook if it is new"""
+    if sheet_name in pdwriter.sheets:
+        return pdwriter.sheets[sheet_name]
+    if pdwriter.engine == 'xlsxwriter':
+        sheet = pdwriter.book.add_worksheet(sheet_name)
+    else:
+        sheet = pdwriter.book.create_sheet()
+        sheet.title = sheet_name
+    pdwriter.sheets[sheet_name] = sheet
+    return sheet
+
+
+def _write_xlsxwriter_cells(pdwriter, sheet, cells, startrow, startcol,
+                            cache):
+    """``pdwriter.write_cells`` for xlsxwriter, adding one format to the
+    workbook per distinct style and number format"""
+    value_with_fmt = pdwriter._value_with_fmt
+    formats = cache.formats
+    for cell in cells:
+        val, fmt = value_with_fmt(cell.val)
+        style = cell.style
+        format = None
+        if style is not None or fmt:
+            key = (id(style), fmt)
+            entry = formats.get(key)
+            if entry is None:
+                entry = (style, pdwriter.book.add_format(
+                    _XlsxStyler.convert(style, fmt)))
+                formats[key] = entry
+            format = entry[1]
+
+        if cell.mergestart is not None and cell.mergeend is not None:
+            sheet.merge_range(startrow + cell.row, startcol + cell.col,
+                              startrow + cell.mergestart,
+                              startcol + cell.mergeend, cell.val, format)
+        else:
+            sheet.write(startrow + cell.row, startcol + cell.col, val, format)
+
+
+def _openpyxl_style(xcell, style, pdwriter, cache):
+    """Style an openpyxl cell, copying the style array of the first cell
+    given the same style rather than adding each part of the style to the
+    workbook again"""
+    before = xcell._style
+    key = (id(style), None if before is None else before.tostring())
+    entry = cache.formats.get(key)
+    if entry is None:
+        for name, value in \
+                pdwriter._convert_to_style_kwargs(style).iteritems():
+            setattr(xcell, name, value)
+        entry = (style, copy(xcell._style))
+        cache.formats[key] = entry
+    else:
+        xcell._style = copy(entry[1])
+
+
+def _write_openpyxl_cells(pdwriter, sheet, cells, startrow, startcol, cache):
+    """``pdwriter.write_cells`` for openpyxl, building the style of each
+    distinct style dict once"""
+    value_with_fmt = pdwriter._value_with_fmt
+    for cell in cells:
+        row = startrow + cell.row + 1
+        col = startcol + cell.col + 1
+        xcell = sheet.cell(row=row, column=col)
+        xcell.value, fmt = value_with_fmt(cell.val)
+        if fmt:
+            xcell.number_format = fmt
+        style = cell.style
+        if style:
+            _openpyxl_style(xcell, style, pdwriter, cache)
+
+        if cell.mergestart is not None and cell.mergeend is not None:
+            endrow = startrow + cell.mergestart + 1
+            endcol = startcol + cell.mergeend + 1
+            sheet.merge_cells(start_row=row, start_column=col,
+                              end_row=endrow, end_column=endcol)
+            # like pandas, style every cell of the merged range
+            if style:
+                for merged_row in xrange(row, endrow + 1):
+                    for merged_col in xrange(col, endcol + 1):
+                        if (merged_row, merged_col) != (row, col):
+                            _openpyxl_style(
+                                sheet.cell(row=merged_row,
+                                           column=merged_col),
+                                style, pdwriter, cache)
+
+
+def write_cells(pdwriter, cells, sheet_name, startrow, startcol, cache):
+    """Write pandas ``ExcelCell`` objects like ``pdwriter.write_cells``,
+    building the engine format of each distinct style once per workbook
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+        must use one of ``NATIVE_ENGINES``
+    cells : iterable of ExcelCell
+    sheet_name : str
+    startrow : int
+    startcol : int
+    cache : FormatCache
+        of the workbook of ``pdwriter``
+    """
+    sheet = _worksheet(pdwriter, sheet_name)
+    if pdwriter.engine == 'xlsxwriter':
+        _write_xlsxwriter_cells(pdwriter, sheet, cells, startrow, startcol,
+                                cache)
+    else:
+        _write_openpyxl_cells(pdwriter, sheet, cells, startrow, startcol,
+                              cache)
+
+
+def write_formatted(pdwriter, data, get_style, sheet_name, na_rep,
+                    float_format, columns, header, index, index_label,
+                    startrow, startcol, merge_cells, inf_rep, cache,
+                    row_major=False):
+    """Write ``data`` with pandas, styling each cell in the same pass
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+        must use one of ``NATIVE_ENGINES``
+    data : pd.DataFrame
+    get_style : function
+        see ``_cell_style_lookup``
+    cache : FormatCache
+        of the workbook of ``pdwriter``
+    row_major : boolean
+        write the cells row by row rather than column by column
+
+    Returns
+    -------
+    cells, styled_cells : int
+        number of cells written, and of those given a style
+
+    For all other parameters see ``pandas.DataFrame.to_excel``
+    """
+    formatter = ExcelFormatter(data, na_rep=na_rep, cols=columns,
+                               header=header, float_format=float_format,
+                               index=index, index_label=index_label,
+                               merge_cells=merge_cells, inf_rep=inf_rep)
+
+    cells = formatter.get_formatted_cells()
+    if row_major:
+        cells = _row_major(cells)
+    tally = [0, 0]
+    cells = _styled_cells(cells, startrow, startcol, get_style, cache, tally)
+    write_cells(pdwriter, cells, sheet_name, startrow, startcol, cache)
+    return tuple(tally)
+
+
+def write_heading(pdwriter, text, sheet_name, startrow, startcol):
+    """Write a single bold cell, e.g. a title above a table
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+    text : str
+    sheet_name : str
+    startrow : int
+    startcol : int
+        position of the cell, indexed from 0
+    """
+    cell = ExcelCell(0, 0, text, {'font': {'bold': True}})
+    pdwriter.write_cells([cell], sheet_name, startrow=startrow,
+                         startcol=startcol)
+
+
+def set_column_widths(pdwriter, sheet_name, widths):
+    """Set the column widths of a sheet that has not yet been saved
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+    sheet_name : str
+    widths : dict
+        column number (from 1) to number of characters to fit
+    """
+    sheet = pdwriter.sheets[sheet_name]
+    for col_num, n_chars in widths.iteritems():
+        width = excel_width(n_chars)
+        if pdwriter.engine == 'xlsxwriter':
+            sheet.set_column(col_num - 1, col_num - 1, width)
+        else:
+            from openpyxl.utils import get_column_letter
+            sheet.column_dimensions[get_column_letter(col_num)].width = width
@@ -0,0 +1,295 @@
+__author__ = 'rwest'
+
+import multiprocessing
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import _join
+
+# partitions per worker, so that one large partition does not hold up the
+# whole pool
+PARTITIONS_PER_JOB = 4
+
+# rows hashed per task when partitioning the keys
+HASH_BLOCKSIZE = 1000000
+
+# rows in both frames below which a merge runs serially, as starting a pool
+# costs more than it saves
+PARALLEL_MIN_ROWS = 1000000
+
+_PartitionJoin = namedtuple('_PartitionJoin', [
+    'counts', 'outer_counts', 'left_unique', 'right_unique', 'left_indexer',
+    'right_indexer', 'group_sizes', 'group_ranks', 'group_keys',
+    'distinct'])
+
+# key columns of the running merge. Forked workers inherit them from the
+# parent, so only row positions and results are pickled
+_KEYS = None
+
+
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def n_workers(n_jobs):
+    """Number of processes for ``n_jobs``, where -1 means one per core. There
+    are never more processes than cores"""
+    if n_jobs is None:
+        return 1
+    cores = _cpu_count()
+    if n_jobs < 0:
+        return max(cores + 1 + n_jobs, 1)
+    return max(min(n_jobs, cores), 1)
+
+
+def use_pool(n_jobs, n_rows):
+    """Whether a merge of ``n_rows`` rows in both frames is worth running over
+    a pool, see ``PARALLEL_MIN_ROWS``"""
+    return n_workers(n_jobs) > 1 and n_rows >= PARALLEL_MIN_ROWS
+
+
+def _take_keys(side, rows, keys):
+    """Key columns of one side at ``rows``, from the forked copy of the keys
+    when none were sent with the task"""
+    if keys is None:
+        keys = _KEYS[side]
+    return [values.take(rows) for values in keys]
+
+
+def _to_global(rows, indexer):
+    """Map an indexer into a partition to row positions of the whole frame"""
+    positions = np.full(len(indexer), -1, dtype=np.int64)
+    found = indexer >= 0
+    positions[found] = rows[indexer[found]]
+    return positions
+
+
+def _hash_block(task):
+    side, start, stop, keys, n_partitions = task
+    keys = _take_keys(side, np.arange(start, stop), keys)
+    return _join.key_partitions(keys, n_partitions)
+
+
+def _join_partition(task):
+    """Check and join the rows of one partition
+
+    The merged rows come back in groups which stay together in the merged
+    frame: the rows of each left row for an unsorted left join, otherwise
+    the rows of each key. A group's rank orders it among every partition's
+    groups: the position of the left row, or of the key's first appearance
+    in the left then right frame. With ``sort`` the group's key values are
+    returned to be ranked instead.
+    """
+    (left_rows, right_rows, left_keys, right_keys, n_left, how, sort,
+     row_limit) = task
+    left_keys = _take_keys(0, left_rows, left_keys)
+    right_keys = _take_keys(1, right_rows, right_keys)
+
+    left_codes, right_codes, n_keys = _join.factorize_keys(
+        left_keys, right_keys, sort=sort)
+    left_counts, right_counts = _join.key_counts(left_codes, right_codes,
+                                                 n_keys)
+    counts = _join.merge_counts(left_counts, right_counts, how).values
+    outer_counts = _join.merge_counts(left_counts, right_counts,
+                                      'outer').values
+    result = _PartitionJoin(counts, outer_counts,
+                            not (left_counts > 1).any(),
+                            not (right_counts > 1).any(),
+                            None, None, None, None, None,
+                            _join.distinct_keys(left_counts, right_counts))
+    if row_limit is not None and counts.sum() > row_limit:
+        return result
+
+    left_indexer, right_indexer = _join.join_indexers(
+        left_codes, right_codes, n_keys, how, sort=sort)
+
+    on_left = left_indexer >= 0
+    row_codes = np.empty(len(left_indexer), dtype=np.int64)
+    row_codes[on_left] = left_codes[left_indexer[on_left]]
+    row_codes[~on_left] = right_codes[right_indexer[~on_left]]
+
+    if how == 'left' and not sort:
+        groups = left_indexer
+    else:
+        groups = row_codes
+    starts = np.flatnonzero(np.concatenate([[True],
+                                            groups[1:] != groups[:-1]]))
+    starts = starts[:len(groups)]
+    sizes = np.diff(np.concatenate([starts, [len(groups)]]))
+
+    # first appearance of each key in the partition's left then right rows
+    all_codes = np.concatenate([left_codes, right_codes])
+    first = np.full(n_keys, -1, dtype=np.int64)
+    first[all_codes[::-1]] = np.arange(len(all_codes))[::-1]
+    group_first = first[row_codes[starts]]
+
+    ranks = keys = None
+    if how == 'left' and not sort:
+        ranks = left_rows[left_indexer[starts]]
+    elif not sort:
+        n_local = len(left_rows)
+        in_left = group_first < n_local
+        ranks = np.empty(len(starts), dtype=np.int64)
+        ranks[in_left] = left_rows[group_first[in_left]]
+        ranks[~in_left] = n_left + right_rows[group_first[~in_left] - n_local]
+    else:
+        # as Series, so categoricals and tz-aware datetimes keep their dtype
+        # and sort as they do in the serial join
+        keys = [pd.concat([lk, rk], ignore_index=True).take(group_first)
+                for lk, rk in zip(left_keys, right_keys)]
+
+    return result._replace(
+        left_indexer=_to_global(left_rows, left_indexer),
+        right_indexer=_to_global(right_rows, right_indexer),
+        group_sizes=sizes, group_ranks=ranks, group_keys=keys)
+
+
+def _partition_rows(partitions, n_partitions):
+    """Row positions in each partition, in order"""
+    order = np.argsort(partitions, kind='mergesort')
+    bounds = np.searchsorted(partitions[order], np.arange(n_partitions + 1))
+    return [order[bounds[p]:bounds[p + 1]] for p in range(n_partitions)]
+
+
+def _assemble(pieces, sort):
+    """Put the groups of rows from every partition in merge order"""
+    sizes = np.concatenate([piece.group_sizes for piece in pieces])
+    if sort:
+        n_columns = len(pieces[0].group_keys)
+        group_keys = [pd.concat([piece.group_keys[c] for piece in pieces],
+                                ignore_index=True)
+                      for c in range(n_columns)]
+        ranks = _join.factorize_keys(group_keys,
+                                     [values[:0] for values in group_keys],
+                                     sort=True)[0]
+    else:
+        ranks = np.concatenate([piece.group_ranks for piece in pieces])
+
+    # ranks are distinct and bounded by the number of rows, so the groups
+    # can be ordered without sorting
+    slots = np.full(ranks.max() + 1 if len(ranks) else 0, -1, dtype=np.int64)
+    slots[ranks] = np.arange(len(ranks))
+    order = slots[slots >= 0]
+
+    starts = np.empty(len(sizes), dtype=np.int64)
+    starts[order] = np.cumsum(sizes[order]) - sizes[order]
+    source_starts = np.cumsum(sizes) - sizes
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    destination = starts[groups] + np.arange(len(groups)) - \
+        source_starts[groups]
+
+    left_indexer = np.empty(len(groups), dtype=np.int64)
+    right_indexer = np.empty(len(groups), dtype=np.int64)
+    left_indexer[destination] = np.concatenate(
+        [piece.left_indexer for piece in pieces])
+    right_indexer[destination] = np.concatenate(
+        [piece.right_indexer for piece in pieces])
+    return left_indexer, right_indexer
+
+
+def parallel_join(left_keys, right_keys, how, sort, n_jobs, row_limit=None):
+    """
+    Check and join two frames on their keys over a process pool
+
+    Both frames are hash partitioned by key and each partition is factorized
+    and joined by a worker. The indexers are identical to those of
+    ``_join.join_indexers`` on the whole frames. The pool is started for each
+    call, so that forked workers inherit the keys, see ``use_pool``.
+
+    Parameters
+    ----------
+    left_keys, right_keys : list of pd.Series
+        key columns of each frame
+    how : str
+    sort : boolean
+    n_jobs : int
+        see ``n_workers``
+    row_limit : int, optional
+        skip the join of any partition with more merged rows than this
+
+    Returns
+    -------
+    joined : _join.KeyJoin
+        ``left_indexer`` and ``right_indexer`` are None if a partition was
+        skipped
+    """
+    global _KEYS
+
+    processes = n_workers(n_jobs)
+    n_partitions = processes * PARTITIONS_PER_JOB
+    n_rows = (len(left_keys[0]), len(right_keys[0]))
+
+    if hasattr(multiprocessing, 'get_start_method'):
+        forked = multiprocessing.get_start_method() == 'fork'
+    else:
+        forked = sys.platform != 'win32'
+
+    def _sent(side, rows):
+        # without fork the workers are sent only the key rows they need
+        if forked:
+            return None
+        return _take_keys(side, rows, (left_keys, right_keys)[side])
+
+    _KEYS = (left_keys, right_keys)
+    pool = multiprocessing.Pool(processes)
+    try:
+        hash_tasks = []
+        for side in (0, 1):
+            for start in xrange(0, n_rows[side], HASH_BLOCKSIZE):
+                stop = min(start + HASH_BLOCKSIZE, n_rows[side])
+                hash_tasks.append((side, start, stop,
+                                   _sent(side, np.arange(start, stop)),
+                                   n_partitions))
+        hashed = pool.map(_hash_block, hash_tasks, chunksize=1)
+
+        partitions = []
+        for side in (0, 1):
+            side_hashes = [h for task, h in zip(hash_tasks, hashed)
+                           if task[0] == side]
+            if side_hashes:
+                side_hashes = np.concatenate(side_hashes)
+            else:
+                side_hashes = np.zeros(0, dtype=np.int64)
+            partitions.append(_partition_rows(side_hashes, n_partitions))
+
+        join_tasks = []
+        for left_rows, right_rows in zip(*partitions):
+            if not len(left_rows) and not len(right_rows):
+                continue
+            join_tasks.append((left_rows, right_rows, _sent(0, left_rows),
+                               _sent(1, right_rows), n_rows[0], how, sort,
+                               row_limit))
+        pieces = pool.map(_join_partition, join_tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        _KEYS = None
+
+    counts = pd.Series(sum(piece.counts for piece in pieces),
+                       index=_join.MERGE_SETS)
+    outer_counts = pd.Series(sum(piece.outer_counts for piece in pieces),
+                             index=_join.MERGE_SETS)
+    # every key is in a single partition, so the distinct keys add up
+    distinct = tuple(sum(piece.distinct[i] for piece in pieces)
+                     for i in range(3))
+    joined = _join.KeyJoin(None, None, counts, outer_counts,
+                           all(piece.left_unique for piece in pieces),
+                           all(piece.right_unique for piece in pieces),
+                           distinct)
+
+    if any(piece.left_indexer is None for piece in pieces):
+        return joined
+    pieces = [piece for piece in pieces if len(piece.left_indexer)]
+    if not pieces:
+        no_rows = np.zeros(0, dtype=np.int64)
+        return joined._replace(left_indexer=no_rows, right_indexer=no_rows)
+
+    left_indexer, right_indexer = _assemble(pieces, sort)
+    return joined._replace(left_indexer=left_indexer,
+                           right_indexer=right_indexer)
@@ -0,0 +1,347 @@
+__author__ = 'rwest'
+
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import numpy as np
+import pandas as pd
+
+import _join
+import _merge_report
+from _stata_merge import (print_merge_stats, _get_keys, _indicator_name,
+                          _validate_args, _check_columns, _check_unique,
+                          _sets_failed, _check_rows)
+
+# rows read from each source at a time
+PARTITION_CHUNKSIZE = 100000
+
+
+def _chunks(source, chunksize):
+    """Iterate over a DataFrame, a csv file or an iterable of DataFrames in
+    chunks of at most ``chunksize`` rows"""
+    if isinstance(source, pd.DataFrame):
+        for i in xrange(0, max(len(source), 1), chunksize):
+            yield source.iloc[i:i + chunksize]
+    elif isinstance(source, basestring):
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+
+class _SpillDirectory(object):
+    """Temporary directory of spill files, deleted by ``close`` or once it is
+    no longer referenced"""
+
+    def __init__(self, spill_dir):
+        self.path = tempfile.mkdtemp(prefix='flyingpandas_', dir=spill_dir)
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __del__(self):
+        self.close()
+
+
+class _Spill(object):
+    """One side of a merge, hash partitioned by key into pickle files
+
+    Each partition has a file of key columns, read to validate the merge,
+    and a file of whole rows, read to build it.
+    """
+
+    def __init__(self, source, keys, n_partitions, directory, name,
+                 chunksize):
+        self.keys = keys
+        self.n_partitions = n_partitions
+        self.paths = [(os.path.join(directory, '{}_keys_{}'.format(name, p)),
+                       os.path.join(directory, '{}_rows_{}'.format(name, p)))
+                      for p in range(n_partitions)]
+        self.template = None
+        self.n_rows = 0
+
+        files = {}
+        try:
+            for chunk in _chunks(source, chunksize):
+                if self.template is None:
+                    self.template = chunk.iloc[:0]
+                if not len(chunk):
+                    continue
+                self.n_rows += len(chunk)
+
+                partitions = _join.key_partitions(
+                    [chunk[k] for k in keys], n_partitions)
+                order = np.argsort(partitions, kind='mergesort')
+                bounds = np.searchsorted(partitions[order],
+                                         np.arange(n_partitions + 1))
+                for p in np.flatnonzero(np.diff(bounds)):
+                    rows = chunk.iloc[order[bounds[p]:bounds[p + 1]]]
+                    if p not in files:
+                        files[p] = [open(path, 'ab') for path in self.paths[p]]
+                    key_file, row_file = files[p]
+                    pickle.dump(rows[keys], key_file, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(rows, row_file, pickle.HIGHEST_PROTOCOL)
+        finally:
+            for spill_files in files.values():
+                for f in spill_files:
+                    f.close()
+
+        if self.template is None:
+            raise ValueError('{} source has no columns'.format(name))
+
+    def _read(self, path, template):
+        frames = []
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        frames.append(pickle.load(f))
+                    except EOFError:
+                        break
+        if not frames:
+            return template
+        return pd.concat(frames, ignore_index=True)
+
+    def keys_of(self, p):
+        """Key columns of the rows in partition ``p``"""
+        return self._read(self.paths[p][0], self.template[self.keys])
+
+    def rows_of(self, p):
+        """All rows in partition ``p``"""
+        return self._read(self.paths[p][1], self.template)
+
+
+def merge_partitioned(mergetype, left, right, how='invalid', sets=None,
+                      on=None, left_on=None, right_on=None,
+                      suffixes=('__', '__'), indicator=False,
+                      matches_required=True, noprint=False, msg='',
+                      n_partitions=16, chunksize=PARTITION_CHUNKSIZE,
+                      spill_dir=None, output_path=None, report=None):
+    """
+    ``flyingpandas.merge`` for frames larger than memory
+
+    Both sides are read in chunks and hash partitioned by key into spill
+    files, so that every key lands in a single partition. The merge is then
+    checked and built one partition at a time: only the largest partition of
+    each side has to fit in memory.
+
+    The ``mergetype`` uniqueness checks, ``sets`` and ``matches_required``
+    are enforced over every partition before any rows are returned. Rows come
+    back partition by partition rather than in ``pandas.merge`` order, and as
+    with ``pandas.read_csv`` chunks, an integer column can be float in the
+    partitions where some of its rows are missing.
+
+    Parameters
+    ----------
+    mergetype : str
+        '1:1', '1:m', 'm:1' or 'm:m', see ``flyingpandas.merge``
+    left, right : DataFrame, str or iterable of DataFrames
+        a frame, the path to a csv file, or chunks of a frame e.g. from
+        ``pandas.read_csv(path, chunksize=...)``
+    n_partitions : int, default 16
+        number of spill files per side
+    chunksize : int
+        rows to read at a time from a frame or a csv file
+    spill_dir : str, optional
+        directory for the spill files, deleted once the merge is done.
+        Defaults to the system temporary directory
+    output_path : str, optional
+        write the merged rows to this csv file instead of returning them
+
+    For all other parameters see ``flyingpandas.merge``. The ``MergeReport``
+    is sent to ``report`` once the last partition is read
+
+    Returns
+    -------
+    merged : iterator of DataFrames
+        one frame per non empty partition, numbered on from the previous
+        one. If ``output_path`` is given the number of rows written is
+        returned instead
+
+    >>> for chunk in merge_partitioned('m:1', 'transactions.csv',
+    ...                                'accounts.csv', how='left',
+    ...                                on='account_id', n_partitions=64):
+    ...     process(chunk)
+
+    """
+    recorder = _merge_report.MergeRecorder(mergetype=mergetype, how=how,
+                                           msg=msg, path='partitioned')
+    with recorder.recording_failures(report):
+        start = time.time()
+        sets = _validate_args(mergetype, how, sets, noprint, msg)
+
+        t_mergevar, drop_t_mergevar = _indicator_name(indicator)
+
+        _left_on, _right_on = _get_keys(on, left_on, right_on)
+        recorder['left_on'], recorder['right_on'] = _left_on, _right_on
+        recorder.phase('validate')
+
+        directory = _SpillDirectory(spill_dir)
+        try:
+            left_spill = _Spill(left, _left_on, n_partitions, directory.path,
+                                'left', chunksize)
+            right_spill = _Spill(right, _right_on, n_partitions,
+                                 directory.path, 'right', chunksize)
+            recorder['left_rows'] = left_spill.n_rows
+            recorder['right_rows'] = right_spill.n_rows
+            recorder.phase('partition')
+
+            _check_columns(left_spill.template, right_spill.template,
+                           _left_on, _right_on, suffixes)
+
+            counts = _validate_partitions(recorder, mergetype, how, sets,
+                                          left_spill, right_spill,
+                                          t_mergevar, matches_required,
+                                          noprint, msg)
+        except BaseException:
+            directory.close()
+            raise
+
+    merged = recorder.recorded_chunks(_merged_partitions(
+        recorder, mergetype, how, left_spill, right_spill, suffixes,
+        t_mergevar, drop_t_mergevar, counts.sum(), directory, noprint,
+        start), report)
+    if output_path is None:
+        return merged
+
+    n_rows = 0
+    for chunk in merged:
+        chunk.to_csv(output_path, mode='w' if n_rows == 0 else 'a',
+                     header=n_rows == 0, index=False)
+        n_rows += len(chunk)
+    return n_rows
+
+
+def _validate_partitions(recorder, mergetype, how, sets, left_spill,
+                         right_spill, t_mergevar, matches_required, noprint,
+                         msg, n_examples=10):
+    """Check the uniqueness of the keys and the merge sets over every
+    partition, from the key columns alone, and print the merge statistics,
+    recording them in ``recorder``
+
+    Returns
+    -------
+    counts : pd.Series
+        rows of each merge set in the merged frame
+    """
+    _left_on, _right_on = left_spill.keys, right_spill.keys
+
+    counts = pd.Series(0, index=_join.MERGE_SETS)
+    outer_counts = pd.Series(0, index=_join.MERGE_SETS)
+    distinct = np.zeros(3, dtype=np.int64)
+    examples = []
+    n_found = 0
+    for p in range(left_spill.n_partitions):
+        left_keys = left_spill.keys_of(p)
+        right_keys = right_spill.keys_of(p)
+        if not len(left_keys) and not len(right_keys):
+            continue
+
+        left_codes, right_codes, n_keys = _join.factorize_keys(
+            [left_keys[k] for k in _left_on],
+            [right_keys[k] for k in _right_on])
+        left_counts, right_counts = _join.key_counts(left_codes, right_codes,
+                                                     n_keys)
+        # every key is in a single partition, so the distinct keys add up
+        distinct += _join.distinct_keys(left_counts, right_counts)
+        recorder.phase('keys')
+
+        # and this checks the whole frame
+        _check_unique(mergetype, left_counts, right_counts)
+
+        counts += _join.merge_counts(left_counts, right_counts, how)
+        if sets:
+            partition_counts = _join.merge_counts(left_counts, right_counts,
+                                                  'outer')
+            outer_counts += partition_counts
+            if partition_counts.drop(sets).sum() > 0 and \
+                    n_found < n_examples:
+                found = _join.set_violations(
+                    left_keys, right_keys, left_codes, right_codes,
+                    left_counts, right_counts, sets, indicator=t_mergevar,
+                    n_examples=n_examples - n_found)
+                examples.append(found)
+                n_found += len(found)
+        recorder.phase('checks')
+
+    (recorder['left_keys'], recorder['right_keys'],
+     recorder['shared_keys']) = [int(n) for n in distinct]
+    if sets and outer_counts.drop(sets).sum() > 0:
+        _sets_failed(outer_counts, pd.concat(examples, ignore_index=True),
+                     mergetype, how, _left_on, _right_on, matches_required,
+                     noprint, msg)
+
+    recorder['counts'] = counts
+    print_merge_stats(counts, mergetype, how, _left_on, _right_on,
+                      matches_required, noprint, msg)
+    recorder.phase('stats')
+    return counts
+
+
+def _merged_partitions(recorder, mergetype, how, left_spill, right_spill,
+                       suffixes, t_mergevar, drop_t_mergevar, n_expected,
+                       directory, noprint, start):
+    """Build the merge one partition at a time, then run the row count
+    sanity checks over the whole merge and delete the spill files, recording
+    the build in ``recorder``"""
+    _left_on, _right_on = left_spill.keys, right_spill.keys
+
+    # like pandas, a partition with no left rows would take its key columns
+    # from the right frame, so give every partition the same columns
+    columns = None
+    if left_spill.n_rows:
+        no_rows = np.zeros(0, dtype=np.int64)
+        columns = _join.build_merged(
+            left_spill.template.reindex([0]), right_spill.template, _left_on,
+            _right_on, no_rows, no_rows, suffixes).columns
+
+    n_rows = 0
+    n_bytes = 0
+    try:
+        for p in range(left_spill.n_partitions):
+            left_frame = left_spill.rows_of(p)
+            right_frame = right_spill.rows_of(p)
+            if not len(left_frame) and how in ['left', 'inner']:
+                continue
+            if not len(right_frame) and how in ['right', 'inner']:
+                continue
+
+            left_codes, right_codes, n_keys = _join.factorize_keys(
+                [left_frame[k] for k in _left_on],
+                [right_frame[k] for k in _right_on])
+            left_indexer, right_indexer = _join.join_indexers(
+                left_codes, right_codes, n_keys, how)
+            recorder.phase('join')
+            if not len(left_indexer):
+                continue
+
+            new_frame = _join.build_merged(left_frame, right_frame, _left_on,
+                                           _right_on, left_indexer,
+                                           right_indexer, suffixes)
+            if columns is not None:
+                new_frame = new_frame[columns]
+            if not drop_t_mergevar:
+                new_frame[t_mergevar] = _join.merge_indicator(left_indexer,
+                                                              right_indexer)
+            new_frame.index = pd.RangeIndex(n_rows, n_rows + len(new_frame))
+            n_rows += len(new_frame)
+            n_bytes += int(new_frame.memory_usage().sum())
+            recorder.phase('build')
+            yield new_frame
+    finally:
+        directory.close()
+
+    recorder['merged_rows'] = n_rows
+    recorder['merged_bytes'] = n_bytes
+    assert n_rows == n_expected
+    _check_rows(mergetype, how, left_spill.n_rows, right_spill.n_rows,
+                n_rows, noprint, start)
+    recorder.phase('sanity')
@@ -0,0 +1,587 @@
+__author__ = 'rwest'
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import _join
+import _merge_report
+from _partitioned_merge import _chunks, PARTITION_CHUNKSIZE
+from _stata_merge import (print_merge_stats, _get_keys, _indicator_name,
+                          _validate_args, _check_columns, _check_unique,
+                          _check_sets, _sets_failed, _check_size,
+                          _check_rows)
+
+# number of prepared right frames kept by ``prepare_merge``
+MERGE_CACHE_SIZE = 8
+
+_CACHE = OrderedDict()
+
+
+def _as_list(keys):
+    if isinstance(keys, basestring):
+        return [keys]
+    return list(keys)
+
+
+def _repeats_keys(keys, hashes, seen):
+    """Whether a key of ``keys`` is among the keys seen before, a list of
+    (keys, hashes) pairs, comparing the keys whose hashes are equal"""
+    earlier = []
+    for seen_keys, seen_hashes in seen:
+        same = np.in1d(seen_hashes, hashes)
+        if same.any():
+            earlier.append([values[same] for values in seen_keys])
+    if not earlier:
+        return False
+    earlier = [pd.concat(columns) for columns in zip(*earlier)]
+    left_codes, right_codes, _ = _join.factorize_keys(keys, earlier)
+    return len(np.intersect1d(left_codes, right_codes)) > 0
+
+
+class PreparedMerge(object):
+    """
+    A right frame indexed on its key columns, to merge many left frames
+    against it with the checks and statistics of ``flyingpandas.merge``
+
+    The right keys are hashed, counted and grouped once. Each merge then only
+    hashes the keys of the left frame. If the right frame has changed since
+    it was indexed, the index is rebuilt on the next merge.
+
+    Parameters
+    ----------
+    right_frame : DataFrame
+    on : str or list of str
+        key columns, named the same in the left frames
+    right_on : str or list of str
+        key columns of ``right_frame``, when named differently in the left
+        frames
+    check_keys : boolean, default True
+        before each merge, compare the key columns with a copy kept when they
+        were indexed, which costs far less than hashing them again. With
+        False only the shape, columns and dtypes of the frame are checked, so
+        call ``refresh`` after changing key values
+
+    Examples
+    --------
+    >>> products = PreparedMerge(product_table, on='product_id')
+    >>> for chunk in chunks:
+    ...     merged = products.merge('m:1', chunk, how='left', noprint=True)
+
+    """
+
+    def __init__(self, right_frame, on=None, right_on=None, check_keys=True):
+        if on and right_on:
+            raise AssertionError('mer_1', "cannot specify 'on' as well as "
+                                          "'right_on'")
+        self.right_frame = right_frame
+        self.on = on
+        self._right_on = _as_list(on or right_on)
+        self.check_keys = check_keys
+        self.refresh()
+
+    def _signature(self):
+        frame = self.right_frame
+        return frame.shape, tuple(frame.columns), tuple(frame.dtypes)
+
+    def is_current(self):
+        """Whether the right frame is unchanged since it was indexed"""
+        if self._signature() != self._indexed_signature:
+            return False
+        if self.check_keys:
+            return all(self.right_frame[k].equals(values) for k, values
+                       in zip(self._right_on, self._indexed_keys))
+        return True
+
+    def refresh(self):
+        """Index the key columns of the right frame"""
+        right_keys = [self.right_frame[k] for k in self._right_on]
+
+        # codes of each key column, missing values taking the last code
+        self._uniques = []
+        self._nan_codes = []
+        col_codes = []
+        sizes = []
+        for values in right_keys:
+            codes, uniques = pd.factorize(values)
+            codes = codes.astype(np.int64)
+            n = len(uniques)
+            missing = codes == -1
+            if missing.any():
+                codes[missing] = n
+                self._nan_codes.append(n)
+                n += 1
+            else:
+                self._nan_codes.append(None)
+            self._uniques.append(pd.Index(uniques))
+            col_codes.append(codes)
+            sizes.append(n)
+
+        # combine the columns with a mixed radix, recording where the codes
+        # had to be compacted to stay within int64
+        self._sizes = sizes
+        self._steps = []
+        combined = col_codes[0]
+        size = sizes[0]
+        for codes, n in zip(col_codes[1:], sizes[1:]):
+            step = None
+            if size * n >= 2 ** 62:
+                step = pd.Index(pd.unique(combined))
+                combined = step.get_indexer(combined)
+                size = len(step)
+            self._steps.append(step)
+            combined = combined * n + codes
+            size *= n
+
+        right_codes, keys = pd.factorize(combined)
+        self._keys = pd.Index(keys)
+        self._n_keys = len(keys)
+        self._right_codes = right_codes.astype(np.int64)
+
+        # one extra empty group for left keys missing from the right frame
+        self._groups = _join.key_groups(self._right_codes, self._n_keys + 1)
+        self._right_counts = self._groups[0][:self._n_keys]
+        self._indexed_signature = self._signature()
+        if self.check_keys:
+            self._indexed_keys = [values.copy() for values in right_keys]
+
+    def _left_codes(self, left_keys):
+        """Codes of the left keys, matching the right frame's codes where the
+        key is in it and numbered on from ``self._n_keys`` otherwise"""
+        col_codes = []
+        for values, uniques, nan_code in zip(left_keys, self._uniques,
+                                             self._nan_codes):
+            codes = uniques.get_indexer(values).astype(np.int64)
+            if nan_code is not None:
+                codes[pd.isnull(values).values] = nan_code
+            col_codes.append(codes)
+
+        combined = col_codes[0]
+        unknown = combined == -1
+        for codes, n, step in zip(col_codes[1:], self._sizes[1:],
+                                  self._steps):
+            if step is not None:
+                combined = step.get_indexer(combined)
+                unknown |= combined == -1
+            combined = combined * n + codes
+            unknown |= codes == -1
+        combined[unknown] = -1
+
+        left_codes = self._keys.get_indexer(combined).astype(np.int64)
+        new = left_codes == -1
+        n_new = 0
+        if new.any():
+            new_codes, _, n_new = _join.factorize_keys(
+                [values[new] for values in left_keys],
+                [values[:0] for values in left_keys])
+            left_codes[new] = self._n_keys + new_codes
+        return left_codes, n_new
+
+    def _left_keys(self, left_on):
+        """Key columns of the left frames, as a list"""
+        if left_on is None:
+            if not self.on:
+                raise AssertionError('mer_1', "specify 'left_on' for a frame "
+                                              "prepared with 'right_on'")
+            left_on = self.on
+        return _as_list(left_on)
+
+    def _join_indexers(self, left_keys, left_codes, how, sort):
+        """Row indexers of a left or inner join, from the grouped right rows
+
+        Rows follow the order of ``_join.join_indexers``, which only depends
+        on the keys of the left frame for these joins.
+        """
+        matched_codes = np.minimum(left_codes, self._n_keys)
+        left_indexer, right_indexer = _join._expand(
+            matched_codes, None, self._n_keys + 1,
+            keep_unmatched=how == 'left', other_groups=self._groups)
+
+        if sort:
+            order_codes = _join.factorize_keys(
+                left_keys, [values[:0] for values in left_keys], sort=True)[0]
+        elif how != 'left':
+            # left keys in order of first appearance
+            order_codes = pd.factorize(left_codes)[0]
+        if sort or how != 'left':
+            order = np.argsort(order_codes[left_indexer], kind='mergesort')
+            left_indexer = left_indexer[order]
+            right_indexer = right_indexer[order]
+        return left_indexer, right_indexer
+
+    def merge(self, mergetype, left_frame, how='invalid', sets=None,
+              left_on=None, sort=False, suffixes=('__', '__'),
+              indicator=False, matches_required=True, noprint=False, msg='',
+              max_rows=None, max_bytes=None, report=None):
+        """
+        Merge ``left_frame`` with the prepared right frame
+
+        Parameters
+        ----------
+        left_on : str or list of str
+            key columns of ``left_frame``, defaults to ``on``
+
+        For all other parameters see ``flyingpandas.merge``. Left and inner
+        joins only hash the left keys; right and outer joins, which return
+        every right row anyway, hash both frames as ``flyingpandas.merge``
+        does.
+
+        Returns
+        -------
+        merged : DataFrame
+        """
+        recorder = _merge_report.MergeRecorder(
+            mergetype=mergetype, how=how, msg=msg, path='prepared',
+            left_rows=len(left_frame), right_rows=len(self.right_frame))
+        with recorder.recording(report):
+            return self._merge(recorder, mergetype, left_frame, how, sets,
+                               left_on, sort, suffixes, indicator,
+                               matches_required, noprint, msg, max_rows,
+                               max_bytes)
+
+    def _merge(self, recorder, mergetype, left_frame, how, sets, left_on,
+               sort, suffixes, indicator, matches_required, noprint, msg,
+               max_rows, max_bytes):
+        """``merge``, recording its statistics in ``recorder``"""
+        start = time.time()
+        sets = _validate_args(mergetype, how, sets, noprint, msg)
+
+        t_mergevar, drop_t_mergevar = _indicator_name(indicator)
+
+        _left_on = self._left_keys(left_on)
+        _right_on = self._right_on
+
+        right_frame = self.right_frame
+        if not self.is_current():
+            self.refresh()
+
+        _check_columns(left_frame, right_frame, _left_on, _right_on, suffixes)
+        recorder['left_on'], recorder['right_on'] = _left_on, _right_on
+        recorder.phase('validate')
+
+        left_keys = [left_frame[k] for k in _left_on]
+        left_codes, n_new = self._left_codes(left_keys)
+        right_codes = self._right_codes
+        left_counts = np.bincount(left_codes,
+                                  minlength=self._n_keys + n_new)
+        right_counts = np.concatenate([self._right_counts,
+                                       np.zeros(n_new, dtype=np.int64)])
+        (recorder['left_keys'], recorder['right_keys'],
+         recorder['shared_keys']) = _join.distinct_keys(left_counts,
+                                                        right_counts)
+        recorder.phase('keys')
+
+        _check_unique(mergetype, left_counts, right_counts)
+
+        _check_sets(sets, mergetype, how, left_frame, right_frame, _left_on,
+                    _right_on, left_codes, right_codes, left_counts,
+                    right_counts, t_mergevar, matches_required, noprint, msg)
+
+        _check_size(max_rows, max_bytes, how, left_frame, right_frame,
+                    _left_on, _right_on, left_codes, right_codes, left_counts,
+                    right_counts, noprint)
+        recorder.phase('checks')
+
+        if how in ['left', 'inner']:
+            left_indexer, right_indexer = self._join_indexers(
+                left_keys, left_codes, how, sort)
+        else:
+            sorted_left, sorted_right, n_keys = _join.factorize_keys(
+                left_keys, [right_frame[k] for k in _right_on], sort=sort)
+            left_indexer, right_indexer = _join.join_indexers(
+                sorted_left, sorted_right, n_keys, how, sort=sort)
+        recorder.phase('join')
+
+        counts = _join.merge_counts(left_counts, right_counts, how)
+        recorder['counts'] = counts
+        print_merge_stats(counts, mergetype, how, _left_on, _right_on,
+                          matches_required, noprint, msg)
+        recorder.phase('stats')
+
+        new_frame = _join.build_merged(left_frame, right_frame, _left_on,
+                                       _right_on, left_indexer, right_indexer,
+                                       suffixes)
+        if not drop_t_mergevar:
+            new_frame[t_mergevar] = _join.merge_indicator(left_indexer,
+                                                          right_indexer)
+        recorder['merged_rows'] = len(new_frame)
+        recorder['merged_bytes'] = int(new_frame.memory_usage().sum())
+        recorder.phase('build')
+
+        _check_rows(mergetype, how, len(left_frame), len(right_frame),
+                    len(new_frame), noprint, start)
+        recorder.phase('sanity')
+
+        return new_frame
+
+    def merge_chunks(self, mergetype, left_chunks, how='invalid', sets=None,
+                     left_on=None, suffixes=('__', '__'), indicator=False,
+                     matches_required=True, noprint=False, msg='',
+                     chunksize=PARTITION_CHUNKSIZE, report=None):
+        """
+        Merge a stream of left chunks with the prepared right frame, yielding
+        one merged chunk per left chunk
+
+        The checks cover the whole stream. A left key repeated in a later
+        chunk fails a '1:1' or '1:m' merge. Keys found in the right frame are
+        tracked in a bitmap and other keys by their 64 bit hash, comparing the
+        keys themselves where a hash repeats. Left rows
+        outside ``sets`` fail the chunk they are in. Right rows that no chunk
+        matched are only known at the end, so ``sets`` excluding
+        'right_only', and ``matches_required``, are checked once the stream
+        is done. For right and outer joins those right rows come in a last
+        chunk. The merge statistics are printed, and the ``MergeReport`` sent
+        to ``report``, at the end.
+
+        Parameters
+        ----------
+        left_chunks : DataFrame, str or iterable of DataFrames
+            a frame, the path to a csv file, or chunks of a frame e.g. from
+            ``pandas.read_csv(path, chunksize=...)``
+        chunksize : int
+            rows to read at a time from a frame or a csv file
+
+        For all other parameters see ``PreparedMerge.merge``
+
+        Returns
+        -------
+        merged : iterator of DataFrames
+            rows numbered on from the previous chunk
+        """
+        recorder = _merge_report.MergeRecorder(
+            mergetype=mergetype, how=how, msg=msg, path='chunks',
+            right_rows=len(self.right_frame))
+        return self._merge_chunks(recorder, report, mergetype, left_chunks,
+                                  how, sets, left_on, suffixes, indicator,
+                                  matches_required, noprint, msg, chunksize)
+
+    def _merge_chunks(self, recorder, report, mergetype, left_chunks, how,
+                      sets, left_on, suffixes, indicator, matches_required,
+                      noprint, msg, chunksize):
+        """``merge_chunks``, recording its statistics in ``recorder``. The
+        arguments are checked at once, the chunks merged as they are read"""
+        with recorder.recording_failures(report):
+            start = time.time()
+            sets = _validate_args(mergetype, how, sets, noprint, msg)
+
+            t_mergevar, drop_t_mergevar = _indicator_name(indicator)
+
+            _left_on = self._left_keys(left_on)
+
+            # the right frame must not change while the chunks are merged
+            if not self.is_current():
+                self.refresh()
+            if mergetype[-1] == '1' and (self._right_counts > 1).any():
+                raise AssertionError('mer_5', 'Right key is not unique')
+        recorder['left_on'], recorder['right_on'] = _left_on, self._right_on
+        recorder.phase('validate')
+
+        return recorder.recorded_chunks(self._merged_chunks(
+            recorder, mergetype, left_chunks, how, sets, _left_on, suffixes,
+            t_mergevar, drop_t_mergevar, matches_required, noprint, msg,
+            chunksize, start), report)
+
+    def _merged_chunks(self, recorder, mergetype, left_chunks, how, sets,
+                       _left_on, suffixes, t_mergevar, drop_t_mergevar,
+                       matches_required, noprint, msg, chunksize, start):
+        right_frame = self.right_frame
+        _right_on = self._right_on
+        n_keys = self._n_keys
+
+        # right keys matched by a chunk so far, and the left keys seen so far
+        # that are missing from the right frame, with their hashes
+        matched = np.zeros(n_keys, dtype=bool)
+        missing_seen = set()
+        missing_keys = []
+
+        # each chunk is joined on its own, right rows matching no chunk are
+        # added at the end
+        chunk_how = {'left': 'left', 'inner': 'inner', 'right': 'inner',
+                     'outer': 'left'}[how]
+        counts = pd.Series(0, index=_join.MERGE_SETS)
+        outer_counts = pd.Series(0, index=_join.MERGE_SETS)
+
+        def sets_failed(examples):
+            _sets_failed(outer_counts, examples, mergetype, how, _left_on,
+                         _right_on, matches_required, noprint, msg)
+
+        template = None
+        n_left = 0
+        n_rows = 0
+        n_bytes = 0
+        for left_frame in _chunks(left_chunks, chunksize):
+            if template is None:
+                template = left_frame.iloc[:0]
+                _check_columns(left_frame, right_frame, _left_on, _right_on,
+                               suffixes)
+            if not len(left_frame):
+                continue
+            n_left += len(left_frame)
+
+            left_keys = [left_frame[k] for k in _left_on]
+            left_codes, n_new = self._left_codes(left_keys)
+            left_counts = np.bincount(left_codes, minlength=n_keys + n_new)
+            right_counts = np.concatenate([self._right_counts,
+                                           np.zeros(n_new, dtype=np.int64)])
+            in_right = left_codes < n_keys
+            recorder.phase('keys')
+
+            if mergetype[0] == '1':
+                if (left_counts > 1).any() or \
+                        matched[left_codes[in_right]].any():
+                    raise AssertionError('mer_4', 'Left key is not unique')
+                # distinct keys can share a hash, so compare the keys
+                # themselves when a hash was seen before
+                missing = [values[~in_right] for values in left_keys]
+                hashes = _join.key_hashes(missing)
+                if not missing_seen.isdisjoint(hashes.tolist()) and \
+                        _repeats_keys(missing, hashes, missing_keys):
+                    raise AssertionError('mer_4', 'Left key is not unique')
+                missing_seen.update(hashes.tolist())
+                missing_keys.append((missing, hashes))
+            matched[left_codes[in_right]] = True
+
+            if sets:
+                outer_counts += _join.merge_counts(left_counts, right_counts,
+                                                   'left')
+                if outer_counts.drop(sets).sum() > 0:
+                    sets_failed(_join.set_violations(
+                        left_frame[_left_on], right_frame[_right_on],
+                        left_codes, self._right_codes, left_counts,
+                        right_counts, sets + ['right_only'],
+                        indicator=t_mergevar))
+            recorder.phase('checks')
+
+            left_indexer, right_indexer = self._join_indexers(
+                left_keys, left_codes, chunk_how, sort=False)
+            counts += _join.merge_counts(left_counts, right_counts, chunk_how)
+            recorder.phase('join')
+            if not len(left_indexer):
+                continue
+
+            new_frame = _join.build_merged(left_frame, right_frame, _left_on,
+                                           _right_on, left_indexer,
+                                           right_indexer, suffixes)
+            if not drop_t_mergevar:
+                new_frame[t_mergevar] = _join.merge_indicator(left_indexer,
+                                                              right_indexer)
+            new_frame.index = pd.RangeIndex(n_rows, n_rows + len(new_frame))
+            n_rows += len(new_frame)
+            n_bytes += int(new_frame.memory_usage().sum())
+            recorder.phase('build')
+            yield new_frame
+
+        if template is None:
+            raise ValueError('left source has no columns')
+        recorder['left_rows'] = n_left
+        # every key of a '1:1' or '1:m' merge is in a single left row
+        if mergetype[0] == '1':
+            recorder['left_keys'] = n_left
+        recorder['right_keys'] = n_keys
+        recorder['shared_keys'] = int(matched.sum())
+
+        unmatched = np.flatnonzero(~matched[self._right_codes])
+        if sets:
+            outer_counts['right_only'] = len(unmatched)
+            if 'right_only' not in sets and len(unmatched):
+                examples = right_frame[_right_on].iloc[unmatched[:10]].copy()
+                examples.columns = _left_on
+                examples[t_mergevar] = 'right_only'
+                sets_failed(examples.reset_index(drop=True))
+
+        if how in ['right', 'outer']:
+            counts['right_only'] = len(unmatched)
+            if len(unmatched):
+                # one row of missing values stands in for the left frame
+                left_indexer = np.full(len(unmatched), -1, dtype=np.int64)
+                new_frame = _join.build_merged(
+                    template.reindex([0]), right_frame, _left_on, _right_on,
+                    left_indexer, unmatched, suffixes)
+                if not drop_t_mergevar:
+                    new_frame[t_mergevar] = _join.merge_indicator(
+                        left_indexer, unmatched)
+                new_frame.index = pd.RangeIndex(n_rows,
+                                                n_rows + len(new_frame))
+                n_rows += len(new_frame)
+                n_bytes += int(new_frame.memory_usage().sum())
+                recorder.phase('build')
+                yield new_frame
+
+        recorder['counts'] = counts
+        recorder['merged_rows'] = n_rows
+        recorder['merged_bytes'] = n_bytes
+        print_merge_stats(counts, mergetype, how, _left_on, _right_on,
+                          matches_required, noprint, msg)
+        recorder.phase('stats')
+        _check_rows(mergetype, how, n_left, len(right_frame), n_rows, noprint,
+                    start)
+        recorder.phase('sanity')
+
+
+def prepare_merge(right_frame, on=None, right_on=None, check_keys=True):
+    """
+    Get a ``PreparedMerge`` for ``right_frame``, reusing one of the last
+    ``MERGE_CACHE_SIZE`` prepared frames when possible
+
+    Parameters
+    ----------
+    right_frame : DataFrame
+    on : str or list of str
+    right_on : str or list of str
+    check_keys : boolean
+
+    Returns
+    -------
+    prepared : PreparedMerge
+
+    >>> merged = prepare_merge(product_table, on='product_id').merge(
+    ...     'm:1', chunk, how='left')
+
+    """
+    key = (id(right_frame), tuple(_as_list(on or [])),
+           tuple(_as_list(right_on or [])), check_keys)
+    prepared = _CACHE.pop(key, None)
+    if prepared is None or prepared.right_frame is not right_frame:
+        prepared = PreparedMerge(right_frame, on=on, right_on=right_on,
+                                 check_keys=check_keys)
+    _CACHE[key] = prepared
+    while len(_CACHE) > MERGE_CACHE_SIZE:
+        _CACHE.popitem(last=False)
+    return prepared
+
+
+def clear_merge_cache():
+    """Forget every frame prepared by ``prepare_merge``"""
+    _CACHE.clear()
+
+
+def merge_chunks(mergetype, left_chunks, right_frame, how='invalid',
+                 sets=None, on=None, left_on=None, right_on=None,
+                 suffixes=('__', '__'), indicator=False,
+                 matches_required=True, noprint=False, msg='',
+                 chunksize=PARTITION_CHUNKSIZE, report=None):
+    """
+    Merge a stream of left chunks with an in memory right frame, checking
+    the merge across every chunk. See ``PreparedMerge.merge_chunks``
+
+    Returns
+    -------
+    merged : iterator of DataFrames
+
+    >>> reader = pd.read_csv('transactions.csv', chunksize=100000)
+    >>> for chunk in merge_chunks('1:1', reader, accounts, how='left',
+    ...                           on='transaction_id'):
+    ...     process(chunk)
+
+    """
+    recorder = _merge_report.MergeRecorder(
+        mergetype=mergetype, how=how, msg=msg, path='chunks',
+        right_rows=len(right_frame))
+    with recorder.recording_failures(report):
+        _left_on, _right_on = _get_keys(on, left_on, right_on)
+        prepared = prepare_merge(right_frame, right_on=_right_on)
+    return prepared._merge_chunks(recorder, report, mergetype, left_chunks,
+                                  how, sets, _left_on, suffixes, indicator,
+                                  matches_required, noprint, msg, chunksize)
@@ -0,0 +1,136 @@
+__author__ = 'rwest'
+
+from collections import namedtuple
+
+from _flyingpandas import ExcelWriter, _column_format_numbers
+
+# options of ``ExcelWriter.to_excel`` a template fixes for each table
+TABLE_OPTIONS = ('column_formats', 'row_formats', 'row_format_col',
+                 'add_color_rows', 'autofit', 'na_rep', 'float_format',
+                 'header', 'index', 'index_label', 'startrow', 'startcol',
+                 'merge_cells', 'inf_rep', 'autofit_sample',
+                 'autofit_quantile')
+
+# a table of a template, its column formats converted to column numbers in
+# the workbook
+TableLayout = namedtuple('TableLayout', ['sheet_name', 'columns',
+                                         'column_numbers', 'options'])
+
+
+def _compile_table(sheet_name, columns, options):
+    """Check the options of a table against its columns and convert its
+    column formats to column numbers, returning a ``TableLayout``"""
+    columns = list(columns)
+    options = dict(options)
+    unknown = sorted(set(options) - set(TABLE_OPTIONS))
+    if unknown:
+        raise ValueError('Unknown table options: {}'.format(
+            ', '.join(unknown)))
+
+    row_format_col = options.get('row_format_col')
+    if options.get('row_formats') and not row_format_col:
+        err_msg = 'If using row_formats, you must also specify a row' \
+                  'format column'
+        raise ValueError(err_msg)
+    if row_format_col and row_format_col not in columns:
+        err_msg = '"{}" is not a column name in dataframe' \
+                  ''.format(row_format_col)
+        raise KeyError(err_msg)
+
+    options['column_formats'] = options.get('column_formats') or {}
+    column_numbers = _column_format_numbers(
+        columns, options['column_formats'], options.get('startcol', 0) + 1)
+    return TableLayout(sheet_name, columns, column_numbers, options)
+
+
+class ReportTemplate(object):
+    """
+    A report layout compiled once, to write the same formatted workbook for
+    many sets of DataFrames
+
+    Column format names are checked against each table's columns and
+    converted to column numbers when the template is built, and the style of
+    each number format and fill is built once and shared by every workbook
+    rendered. Rendering a workbook then only checks that each DataFrame has
+    the table's columns.
+
+    Parameters
+    ----------
+    tables : list of tuples
+        one ``(sheet_name, columns, options)`` tuple per table, where
+        ``columns`` are the columns written, in order, and ``options`` are
+        passed to ``ExcelWriter.to_excel`` e.g. column_formats, row_formats,
+        index or startrow. See ``TABLE_OPTIONS``
+    writer_kwargs : dict, optional
+        passed to ``ExcelWriter`` for every workbook, e.g.
+        {'engine': 'xlsxwriter'}
+
+    Examples
+    --------
+    >>> template = ReportTemplate(
+    ...     [('Summary', ['region', 'sales', 'growth'],
+    ...       {'index': False, 'column_formats': {'sales': '$#,##0',
+    ...                                           'growth': '0.0%'}}),
+    ...      ('Detail', ['date', 'product', 'sales'], {'index': False})])
+    >>> for client, (summary, detail) in frames.iteritems():
+    ...     template.render(client + '.xlsx', [summary, detail])
+
+    """
+
+    def __init__(self, tables, writer_kwargs=None):
+        self.tables = [_compile_table(sheet_name, columns, options)
+                       for sheet_name, columns, options in tables]
+        self.writer_kwargs = dict(writer_kwargs or {})
+        # style dicts by (number format, fill), shared by every workbook, see
+        # ``styles`` in ``ExcelWriter``
+        self._styles = {}
+
+    def _check_schema(self, table_num, table, data):
+        """The columns of ``data`` written for ``table``, in order"""
+        if list(data.columns) == table.columns:
+            return data
+        missing = [c for c in table.columns if c not in data.columns]
+        if missing:
+            err_msg = 'Table {} on sheet "{}" is missing columns: {}'.format(
+                table_num, table.sheet_name,
+                ', '.join(str(c) for c in missing))
+            raise ValueError(err_msg)
+        return data.loc[:, table.columns]
+
+    def render(self, path, frames, **writer_kwargs):
+        """
+        Write one workbook, a DataFrame for each table of the template
+
+        Parameters
+        ----------
+        path : str
+        frames : list of pd.DataFrame
+            in the order of the template's tables. Columns not in the table
+            are left out
+        writer_kwargs :
+            passed to ``ExcelWriter``, on top of the template's
+            ``writer_kwargs``. With mode='a' each sheet of the template is
+            replaced the first time it is written to
+        """
+        frames = list(frames)
+        if len(frames) != len(self.tables):
+            raise ValueError('Template has {} tables, {} DataFrames were '
+                             'given'.format(len(self.tables), len(frames)))
+        frames = [self._check_schema(table_num, table, data)
+                  for table_num, (table, data)
+                  in enumerate(zip(self.tables, frames), 1)]
+
+        kwargs = dict(self.writer_kwargs, **writer_kwargs)
+        writer = ExcelWriter(path, styles=self._styles, **kwargs)
+        for table, data in zip(self.tables, frames):
+            if kwargs.get('constant_memory'):
+                # rows must be streamed in order, which only to_excel does
+                writer.to_excel(data, sheet_name=table.sheet_name,
+                                **table.options)
+                continue
+            writer._prepare_sheet(table.sheet_name, 'sheet',
+                                  table.options.get('startrow', 0),
+                                  table.options.get('startcol', 0))
+            writer._write_table(data, table.column_numbers,
+                                sheet_name=table.sheet_name, **table.options)
+        writer.close()
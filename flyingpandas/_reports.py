@@ -0,0 +1,94 @@
+__author__ = 'rwest'
+
+import multiprocessing
+import sys
+import time
+import traceback
+from collections import namedtuple
+
+from _flyingpandas import ExcelWriter
+
+ReportResult = namedtuple('ReportResult', ['path', 'seconds', 'error'])
+
+# report specs of the running batch. Forked workers inherit them from the
+# parent, so the DataFrames are shared copy-on-write rather than pickled
+_SPECS = None
+
+
+def _build_report(spec):
+    """Write one workbook, returning a ``ReportResult``"""
+    path, tables = spec[0], spec[1]
+    writer_kwargs = spec[2] if len(spec) > 2 else {}
+
+    start = time.time()
+    try:
+        writer = ExcelWriter(path, format_engine='native', **writer_kwargs)
+        for sheet_name, data, kwargs in tables:
+            writer.to_excel(data, sheet_name=sheet_name, **kwargs)
+        writer.close()
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return ReportResult(path, time.time() - start, error)
+
+
+def _build_shared_report(i):
+    return _build_report(_SPECS[i])
+
+
+def build_reports(specs, processes=None):
+    """
+    Build many formatted workbooks in parallel with the native format engine
+
+    Parameters
+    ----------
+    specs : list of tuples
+        one ``(path, tables)`` or ``(path, tables, writer_kwargs)`` tuple per
+        workbook, where ``tables`` is a list of ``(sheet_name, data, kwargs)``
+        tuples passed to ``ExcelWriter.to_excel`` and ``writer_kwargs`` are
+        passed to ``ExcelWriter``
+    processes : int, default None
+        size of the process pool, defaults to the number of cores. With 1 the
+        workbooks are built one after the other in this process
+
+    Returns
+    -------
+    results : list of ReportResult
+        ``(path, seconds, error)`` for each spec, in order. ``error`` is the
+        formatted traceback if the workbook failed, otherwise None
+
+    >>> specs = [('client_1.xlsx', [('Sheet1', df1, {'index': False})]),
+    ...          ('client_2.xlsx', [('Sheet1', df2, {'index': False})])]
+    >>> for result in build_reports(specs, processes=4):
+    ...     print(result)
+
+    """
+    global _SPECS
+
+    specs = list(specs)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(specs))
+
+    if processes <= 1:
+        return [_build_report(spec) for spec in specs]
+
+    if hasattr(multiprocessing, 'get_start_method'):
+        forked = multiprocessing.get_start_method() == 'fork'
+    else:
+        forked = sys.platform != 'win32'
+
+    _SPECS = specs
+    pool = multiprocessing.Pool(processes)
+    try:
+        if forked:
+            results = pool.map(_build_shared_report, range(len(specs)),
+                               chunksize=1)
+        else:
+            results = pool.map(_build_report, specs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        _SPECS = None
+
+    return results
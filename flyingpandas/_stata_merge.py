@@ -1,88 +1,173 @@
 import pandas as pd
+from collections import namedtuple
 from copy import deepcopy
 
 import time
 
-def print_merge_stats(df, t_mergevar, mergetype, how, _left_on, _right_on,
+import _join
+import _merge_report
+import _parallel_merge
+
+MergeEstimate = namedtuple('MergeEstimate', ['rows', 'bytes', 'counts',
+                                             'worst'])
+
+def print_merge_stats(counts, mergetype, how, _left_on, _right_on,
                       matches_required, noprint, msg):
-            m_stats = pd.DataFrame(pd.value_counts(df[t_mergevar]),
+            m_stats = pd.DataFrame(counts.sort_values(ascending=False),
                                    columns=['Count'])
             if noprint == False:
                 print('Merge Statistics' + ' (' + how + '  ' + mergetype + ')')
                 print('On: ' + str(_left_on) + '/' + str(_right_on))
                 print(m_stats)
 
-            if (m_stats.loc['both', 'Count'][0] == 0) & matches_required:
+            if (m_stats.loc['both', 'Count'] == 0) & matches_required:
                 raise AssertionError('mer_9', 'Intersection of left Frame and '
                                               'right Frame is empty')
 
-def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
-          on=None, left_on=None, right_on=None, left_index=False,
-          right_index=False, sort=False, suffixes=('__', '__'),
-          copy=True, indicator=False, matches_required=True, noprint=False,
-          msg=''):
+def _get_keys(on, left_on, right_on):
+    """Resolve the key columns of each frame from the pandas.merge style
+    ``on``, ``left_on`` and ``right_on`` arguments, as lists"""
+    if ((on and left_on ) or (on and right_on)):
+        raise AssertionError('mer_1', "cannot specify 'on' as well as "
+                                      "'left_on' or as well as 'right_on'")
+    if on:
+        _left_on = on
+        _right_on = on
+    if left_on:
+        _left_on = left_on
+
+    if right_on:
+        _right_on = right_on
+
+    # if variables are str, convert to lists
+    if type(_left_on) == str:
+        _left_on = [_left_on]
+
+    # if variables are str, convert to lists
+    if type(_right_on) == str:
+        _right_on = [_right_on]
+
+    return list(_left_on), list(_right_on)
 
+def _validate_args(mergetype, how, sets, noprint, msg, hows=None):
+    """Print the heading of a merge and check the arguments every merge
+    function shares. ``hows`` are the joins supported, by default left,
+    right, inner and outer, and a ``mergetype`` of None is checked by the
+    caller. Returns ``sets`` as a list, None if not given"""
+    if noprint==False:
+        print
+        print('-'*40)
+        if msg:
+            print(msg)
 
+    if how not in (hows or ['left', 'right', 'inner', 'outer']):
+        raise AssertionError('mer_8', 'Invalid input for -how-')
+    if mergetype is not None and mergetype not in ['1:1', '1:m', 'm:1',
+                                                   'm:m']:
+        raise AssertionError('mer_3', 'mergetype needs to be '
+                                      '1:1, 1:m, m:1, or m:m')
+    if not sets:
+        return None
+    sets = [sets] if isinstance(sets, basestring) else list(sets)
+    for set in sets:
+        if set not in ['left_only', 'right_only', 'both']:
+            raise AssertionError('mer_6', 'Sets must only contain '
+                                          '"left_only", "right_only" or '
+                                          '"both" as inputs')
+    return sets
+
+def estimate_merge_size(left_frame, right_frame, how='inner', on=None,
+                        left_on=None, right_on=None, n_worst=10):
     """
-    This is a wrapper around pandas.merge with some extra functionality
+    Compute the exact size of a merge from the key columns alone, without
+    building it
 
     Parameters
     ----------
-    mergetype : str
-        '1:1', '1:m', 'm:1' or 'm:m'
-        This variable describes the expectation of uniqueness in the key
-        variable used in the merge.
-        Examples:
-        * if you expect both 'left_on' and right_on' to contain zero
-        duplicates when you are merging two dataframes, then you would specify
-        '1:1'.
-        * if you were expecting 'left_on' to contain zero duplicates but
-        'right_on' to contain some duplicates, you would specify '1:m'
-        * if you were expecting 'right_on' to contain zero duplicates but
-        'left_on' to contain some duplicates, you would specify 'm:1'
-        * If you expected duplicates in both keys, you would specify 'm:m'.
-         Using this option will give the standard result you would receive from
-         using pandas.merge direct
-    left : DataFrame
+    left_frame : DataFrame
+    right_frame : DataFrame
+    how : str
+        'left', 'right', 'inner' or 'outer'
+    on, left_on, right_on :
         same as pandas.merge
-    right : DataFrame
-        same as pandas.merge
-    sets :  Optional[str or list of str]
-        sets describe the expected set of values to be returned in the variable
-        _merge in the merged dataframe.
-        e.g.    *  'both'
-                * ['left_only', 'both']
-    matches_required: Optional [Bool]; default=True
-        merge will exit if there are no observations which came from both
-        the left and right DateFrame
-    noprint: Optional [Bool]; Default=False
-        suppress standard output from merge
-    msg: Optional [str]
-        print message at the top of merge result summary
-        the --msg-- option works even with noprint==True
-
-
-    For all other ``pandas.merge`` parameters see the ``pandas.merge`` docstring
+    n_worst : int, default 10
+        number of keys to list in ``worst``
 
     Returns
     -------
-    merged : DataFrame
-        if ``mergevar`` is specified then ``merged`` will include the variable
-         ``mergevar``
+    estimate : MergeEstimate
+        ``rows`` : number of rows in the merged frame
+        ``bytes`` : approximate memory of the merged frame, counting each
+        python object as a pointer
+        ``counts`` : number of rows in each of 'left_only', 'right_only' and
+        'both'
+        ``worst`` : DataFrame of the keys contributing the most rows, with
+        their number of rows in each frame and in the merged frame
 
     """
+    if how not in ['left', 'right', 'inner', 'outer']:
+        raise AssertionError('mer_8', 'Invalid input for -how-')
+    _left_on, _right_on = _get_keys(on, left_on, right_on)
 
+    left_codes, right_codes, n_keys = _join.factorize_keys(
+        [left_frame[k] for k in _left_on], [right_frame[k] for k in _right_on])
+    left_counts, right_counts = _join.key_counts(left_codes, right_codes,
+                                                 n_keys)
+    return _estimate(left_frame, right_frame, _left_on, _right_on,
+                     left_codes, right_codes, left_counts, right_counts, how,
+                     n_worst)
 
-    if noprint==False:
-        print
-        print('-'*40)
-    if msg:
-        print(msg)
-    __start = time.time()
+def compact_keys(frames, on):
+    """
+    Convert the key columns of several dataframes to compact types, to be
+    merged many times
 
-    if how not in ['left', 'right', 'inner', 'outer']:
-        raise AssertionError('mer_8', 'Invalid input for -how-')
+    Object (e.g. string) keys become categoricals sharing one dictionary
+    across every dataframe, so merging them compares integer codes rather
+    than hashing python objects, and integer keys are downcast to the
+    smallest integer type that holds them in every dataframe. The key values
+    are unchanged; convert a categorical key back with ``.astype(object)``.
+    Object keys with missing values are left as they are, as pandas.merge
+    with ``sort=True`` would order their missing keys differently.
+
+    Parameters
+    ----------
+    frames : list of DataFrames
+    on : str or list of str
+        key columns, named the same in every dataframe
+
+    Returns
+    -------
+    frames : list of DataFrames
+        shallow copies of ``frames`` with the key columns replaced
+
+    >>> customers, orders, payments = compact_keys(
+    ...     [customers, orders, payments], on='customer_id')
 
+    """
+    if isinstance(on, basestring):
+        on = [on]
+    frames = [frame.copy(deep=False) for frame in frames]
+    for k in on:
+        columns = _join.compact_columns([frame[k] for frame in frames])
+        for frame, values in zip(frames, columns):
+            frame[k] = values
+    return frames
+
+def _estimate(left_frame, right_frame, _left_on, _right_on, left_codes,
+              right_codes, left_counts, right_counts, how, n_worst):
+    counts = _join.merge_counts(left_counts, right_counts, how)
+    rows = int(counts.sum())
+    row_bytes = _join.merged_row_bytes(left_frame, right_frame, _left_on,
+                                       _right_on)
+    worst = _join.worst_keys(left_frame[_left_on], right_frame[_right_on],
+                             left_codes, right_codes, left_counts,
+                             right_counts, how, n_worst)
+    return MergeEstimate(rows, rows * row_bytes, counts, worst)
+
+def _indicator_name(indicator):
+    """Name of the merge indicator column, and whether to drop it from the
+    result"""
     if not indicator:
         drop_t_mergevar = True
         t_mergevar = '_merge'
@@ -92,28 +177,9 @@ def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
             t_mergevar = indicator
         else:
             t_mergevar = '_merge'
+    return t_mergevar, drop_t_mergevar
 
-    if ((on and left_on ) or (on and right_on)):
-        raise AssertionError('mer_1', "cannot specify 'on' as well as "
-                                      "'left_on' or as well as 'right_on'")
-    if on:
-        _left_on = on
-        _right_on = on
-    if left_on:
-        _left_on = left_on
-
-    if right_on:
-        _right_on = right_on
-
-    # if variables are str, convert to lists
-    if type(_left_on) == str:
-        _left_on = [_left_on]
-
-    # if variables are str, convert to lists
-    if type(_right_on) == str:
-        _right_on = [_right_on]
-
-
+def _check_columns(left_frame, right_frame, _left_on, _right_on, suffixes):
     # if no suffixes specified, make sure there aren't columns with the same
     # names (excluding the key variables, of course)
     if suffixes == ('__', '__'):
@@ -130,6 +196,11 @@ def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
     for a, b in zip(_left_on, _right_on):
         lt = left_frame[a].dtypes
         rt = right_frame[b].dtypes
+        # a categorical key is compared by the type of its categories
+        if pd.api.types.is_categorical_dtype(lt):
+            lt = lt.categories.dtype
+        if pd.api.types.is_categorical_dtype(rt):
+            rt = rt.categories.dtype
         if (lt != 'object') & (lt != 'datetime64[ns]'):
             lt = 'numeric'
         if (rt != 'object') & (rt != 'datetime64[ns]'):
@@ -139,82 +210,98 @@ def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
                     '; Column -' + b + '- in Right dataframe is ' + str(rt)
             raise AssertionError('mer_2', err_msg)
 
-    if mergetype not in ['1:1', '1:m', 'm:1', 'm:m']:
-        raise AssertionError('mer_3', 'mergetype needs to be '
-                                      '1:1, 1:m, m:1, or m:m')
-
+def _check_unique(mergetype, left_counts, right_counts):
     # Check for uniqueness of data by key variable
     if mergetype[0] == '1':
-        if sum(left_frame[_left_on].duplicated()) > 0:
+        if (left_counts > 1).any():
             raise AssertionError('mer_4', 'Left key is not unique')
     if mergetype[-1] == '1':
-        if sum(right_frame[_right_on].duplicated()) > 0:
+        if (right_counts > 1).any():
             raise AssertionError('mer_5', 'Right key is not unique')
 
-
-
+def _check_sets(sets, mergetype, how, left_frame, right_frame, _left_on,
+                _right_on, left_codes, right_codes, left_counts, right_counts,
+                t_mergevar, matches_required, noprint, msg):
     if sets:
-        new_frame = pd.merge(left_frame, right_frame, how='outer', on=on,
-                             left_on=left_on, right_on=right_on,
-                             left_index=left_index, right_index=right_index,
-                             sort=sort, suffixes=suffixes, copy=copy,
-                             indicator=t_mergevar)
-
-        if type(sets) == 'str':
-            sets = [sets]
-        for set in sets:
-            if set not in ['left_only', 'right_only', 'both']:
-                raise AssertionError('mer_6', 'Sets must only contain '
-                                              '"left_only", "right_only" or '
-                                              '"both" as inputs')
-
-        n_problems = (~new_frame[t_mergevar].isin(sets)).sum()
+        # check the sets on the keys alone, so no outer merge is needed
+        outer_counts = _join.merge_counts(left_counts, right_counts, 'outer')
+        n_problems = outer_counts.drop(sets).sum()
         if n_problems > 0:
-            print('-'*100)
-            print_merge_stats(new_frame, t_mergevar, mergetype, how, _left_on,
-                              _right_on, matches_required, noprint, msg)
-            print
-            print('Examples of cases violating -sets- condition')
-            print(new_frame.loc[~new_frame[t_mergevar].isin(sets)].head(10))
-            raise AssertionError('mer_7', 'Not all observations from '
-                                          'specified sets')
-        else:
-            # restrict rows based on --how--
-            if how == 'left':
-                set = ['left_only', 'both']
-                new_frame = new_frame.loc[new_frame[t_mergevar].isin(set)]
-            elif how == 'right':
-                set = ['right_only', 'both']
-                new_frame = new_frame.loc[new_frame[t_mergevar].isin(set)]
-            elif how == 'inner':
-                set = ['both']
-                new_frame = new_frame.loc[new_frame[t_mergevar].isin(set)]
-            elif how == 'outer':
-                print
-                # do nothing
-            else:
-                raise AssertionError('mer_8', 'Invalid input for -how-')
-
-            print_merge_stats(new_frame, t_mergevar, mergetype, how, _left_on,
-                              _right_on, matches_required, noprint, msg)
-
-    else:
-        # no check on the sets, do not necessarily do an outer merge
-        new_frame = pd.merge(left_frame, right_frame, how=how, on=on,
-                             left_on=left_on, right_on=right_on,
-                             left_index=left_index, right_index=right_index,
-                             sort=sort, suffixes=suffixes, copy=copy,
-                             indicator=t_mergevar)
-
-        print_merge_stats(new_frame, t_mergevar, mergetype, how, _left_on,
-                          _right_on, matches_required, noprint, msg)
+            _sets_failed(outer_counts, _join.set_violations(
+                left_frame[_left_on], right_frame[_right_on], left_codes,
+                right_codes, left_counts, right_counts, sets,
+                indicator=t_mergevar), mergetype, how, _left_on, _right_on,
+                matches_required, noprint, msg)
+
+def _sets_failed(outer_counts, examples, mergetype, how, _left_on, _right_on,
+                 matches_required, noprint, msg):
+    """Raise mer_7 with the ``examples`` of keys outside the expected sets,
+    printing them and the merge statistics unless ``noprint``"""
+    if noprint==False:
+        print('-'*100)
+    print_merge_stats(outer_counts, mergetype, how, _left_on, _right_on,
+                      matches_required, noprint, msg)
+    if noprint==False:
+        print
+        print('Examples of cases violating -sets- condition')
+        print(examples)
+    raise AssertionError('mer_7', 'Not all observations from specified sets',
+                         examples)
+
+def _check_size(max_rows, max_bytes, how, left_frame, right_frame, _left_on,
+                _right_on, left_codes, right_codes, left_counts, right_counts,
+                noprint):
+    # guard against blowing up memory, using the exact size of the result
+    if max_rows is not None or max_bytes is not None:
+        estimate = _estimate(left_frame, right_frame, _left_on, _right_on,
+                             left_codes, right_codes, left_counts,
+                             right_counts, how, n_worst=10)
+        too_many_rows = max_rows is not None and estimate.rows > max_rows
+        too_many_bytes = max_bytes is not None and estimate.bytes > max_bytes
+        if too_many_rows or too_many_bytes:
+            if noprint==False:
+                print('-'*100)
+                print('Keys contributing the most rows to the merge')
+                print(estimate.worst)
+            err_msg = 'Merged dataframe would have {} rows (~{} bytes), ' \
+                      'limits are {} rows and {} bytes'.format(
+                          estimate.rows, estimate.bytes, max_rows, max_bytes)
+            raise AssertionError('mer_11', err_msg, estimate.worst)
+
+def _row_limit(max_rows, max_bytes, left_frame, right_frame, _left_on,
+               _right_on):
+    """Most rows the merged dataframe may have under ``max_rows`` and
+    ``max_bytes``, None if unlimited"""
+    limits = []
+    if max_rows is not None:
+        limits.append(max_rows)
+    if max_bytes is not None:
+        row_bytes = _join.merged_row_bytes(left_frame, right_frame, _left_on,
+                                           _right_on)
+        limits.append(max_bytes // max(row_bytes, 1))
+    if limits:
+        return min(limits)
+    return None
+
+def _join_checks_pass(joined, mergetype, sets, row_limit):
+    """Whether a parallel or sorted join passes every check of the hashed
+    merge"""
+    if joined.left_indexer is None:
+        return False
+    if mergetype[0] == '1' and not joined.left_unique:
+        return False
+    if mergetype[-1] == '1' and not joined.right_unique:
+        return False
+    if sets:
+        if joined.outer_counts.drop(sets).sum() > 0:
+            return False
+    if row_limit is not None and joined.counts.sum() > row_limit:
+        return False
+    return True
 
+def _check_rows(mergetype, how, l, r, n, noprint, start):
     #----------------------------------------------------
     # Some sanity checks based on number of observations
-    l = len(left_frame)
-    r = len(right_frame)
-    n = len(new_frame)
-
     if how == 'left':
         if mergetype in ['m:1', '1:1']:
             assert n == l
@@ -246,8 +333,6 @@ def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
         elif mergetype == 'm:m':
             assert n <= l*r
 
-    if drop_t_mergevar:
-        new_frame = new_frame.drop(axis=1, labels=t_mergevar)
     if noprint==False:
         print
         print 'Rows of   left dataframe:', l
@@ -255,7 +340,314 @@ def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
         print 'Rows of merged dataframe:', n
         print
         print('merge time: (seconds)')
-        print('{:5.3f}'.format(time.time() - __start))
+        print('{:5.3f}'.format(time.time() - start))
         print('-'*40)
 
+def merge(mergetype, left_frame, right_frame, how='invalid', sets=None,
+          on=None, left_on=None, right_on=None, left_index=False,
+          right_index=False, sort=False, suffixes=('__', '__'),
+          copy=True, indicator=False, matches_required=True, noprint=False,
+          msg='', max_rows=None, max_bytes=None, n_jobs=None,
+          presorted=None, compact=False, report=None,
+          audit_only=False):
+
+
+    """
+    This is a wrapper around pandas.merge with some extra functionality
+
+    Parameters
+    ----------
+    mergetype : str
+        '1:1', '1:m', 'm:1' or 'm:m'
+        This variable describes the expectation of uniqueness in the key
+        variable used in the merge.
+        Examples:
+        * if you expect both 'left_on' and right_on' to contain zero
+        duplicates when you are merging two dataframes, then you would specify
+        '1:1'.
+        * if you were expecting 'left_on' to contain zero duplicates but
+        'right_on' to contain some duplicates, you would specify '1:m'
+        * if you were expecting 'right_on' to contain zero duplicates but
+        'left_on' to contain some duplicates, you would specify 'm:1'
+        * If you expected duplicates in both keys, you would specify 'm:m'.
+         Using this option will give the standard result you would receive from
+         using pandas.merge direct
+    left : DataFrame
+        same as pandas.merge
+    right : DataFrame
+        same as pandas.merge
+    how : str
+        'left', 'right', 'inner' or 'outer' as pandas.merge, or
+        * 'semi': the rows of the left dataframe with a key in the right
+          dataframe, each once and with the left columns only
+        * 'anti': the rows of the left dataframe with no key in the right
+          dataframe
+        Semi and anti joins run every check from the key columns alone and
+        never build a merged dataframe. Their merge statistics count rows of
+        the left dataframe with ('both') and without ('left_only') a match,
+        and rows of the right dataframe without one ('right_only')
+    sets :  Optional[str or list of str]
+        sets describe the expected set of values to be returned in the variable
+        _merge in the merged dataframe.
+        e.g.    *  'both'
+                * ['left_only', 'both']
+    matches_required: Optional [Bool]; default=True
+        merge will exit if there are no observations which came from both
+        the left and right DateFrame
+    noprint: Optional [Bool]; Default=False
+        suppress standard output from merge
+    msg: Optional [str]
+        print message at the top of merge result summary, and recorded in
+        the ``MergeReport``
+    max_rows: Optional [int]
+        merge will exit before joining if the merged dataframe would have
+        more rows than this, printing the keys responsible for the most rows.
+        See ``estimate_merge_size``
+    max_bytes: Optional [int]
+        as ``max_rows``, for the approximate memory of the merged dataframe
+    n_jobs: Optional [int]
+        check and join the keys over this many processes, -1 for one per
+        core. Both dataframes are hash partitioned by key, and only the key
+        columns go to the workers (shared rather than copied where processes
+        are forked). The result is identical to the serial merge. At most one
+        process runs per core, and merges of fewer than a million rows in
+        both dataframes run serially, as starting the pool costs more
+    presorted: Optional [Bool]; Default=None
+        where both dataframes are joined on a single key column sorted
+        ascending without missing values, join them with a merge-join:
+        binary searches of the sorted keys rather than hashing, and
+        duplicates found by comparing neighbouring keys. By default the keys
+        are checked for this and the merge-join used where it applies, True
+        requires it and False never uses it. The result is identical either
+        way
+    compact: Optional [Bool]; Default=False
+        check and join on compact copies of the key columns, see
+        ``compact_keys``. The merged dataframe keeps the original key
+        columns. This pays off with ``n_jobs``, where the workers hash the
+        compact keys; to merge the same keys many times, call
+        ``compact_keys`` once on the dataframes instead
+    report: Optional [callable]
+        called with the ``MergeReport`` of the merge: counts, distinct keys,
+        and the time and memory of each phase, see ``add_merge_hook``. It is
+        also called if the merge fails, before the error is raised
+    audit_only: Optional [Bool]; Default=False
+        run every check and print the merge statistics from the key columns
+        alone, without building the merged dataframe, to check referential
+        integrity. Returns a boolean mask of the rows of the left dataframe
+        instead: the rows kept by a semi or anti join, or for any other
+        ``how`` the rows whose key is in the right dataframe
+
+
+    left_index, right_index: Optional [Bool]; Default=False
+        not supported, raise an AssertionError (mer_13) if True. Reset the
+        index and merge on the columns instead
+    copy: Optional [Bool]; Default=True
+        accepted for compatibility with pandas.merge. The merged dataframe
+        is always built from copies of the rows, so it never shares data with
+        the input dataframes
+
+
+    For all other ``pandas.merge`` parameters see the ``pandas.merge`` docstring
+
+    Returns
+    -------
+    merged : DataFrame
+        if ``mergevar`` is specified then ``merged`` will include the variable
+         ``mergevar``. With ``audit_only``, a boolean Series indexed like
+         ``left``
+
+    """
+    recorder = _merge_report.MergeRecorder(
+        mergetype=mergetype, how=how, msg=msg, left_rows=len(left_frame),
+        right_rows=len(right_frame))
+    with recorder.recording(report):
+        return _merge(recorder, mergetype, left_frame, right_frame, how,
+                      sets, on, left_on, right_on, left_index, right_index,
+                      sort, suffixes, indicator, matches_required, noprint,
+                      msg, max_rows, max_bytes, n_jobs, presorted,
+                      compact, audit_only)
+
+def _merge(recorder, mergetype, left_frame, right_frame, how, sets, on,
+           left_on, right_on, left_index, right_index, sort, suffixes,
+           indicator, matches_required, noprint, msg, max_rows, max_bytes,
+           n_jobs, presorted, compact, audit_only):
+    """``merge``, recording its statistics in ``recorder``"""
+    __start = time.time()
+    sets = _validate_args(mergetype, how, sets, noprint, msg,
+                          hows=['left', 'right', 'inner', 'outer', 'semi',
+                                'anti'])
+    if left_index or right_index:
+        raise AssertionError('mer_13', 'left_index and right_index are not '
+                                       'supported, merge on columns instead, '
+                                       'e.g. after reset_index()')
+    keys_only = audit_only or how in ['semi', 'anti']
+
+    t_mergevar, drop_t_mergevar = _indicator_name(indicator)
+
+    _left_on, _right_on = _get_keys(on, left_on, right_on)
+
+    # no right columns are brought over without a merged dataframe, so only
+    # the key types are checked
+    _check_columns(left_frame, right_frame, _left_on, _right_on,
+                   None if keys_only else suffixes)
+    recorder['left_on'], recorder['right_on'] = _left_on, _right_on
+    recorder.phase('validate')
+
+    left_keys = [left_frame[k] for k in _left_on]
+    right_keys = [right_frame[k] for k in _right_on]
+    if compact:
+        compacted = [_join.compact_columns([lk, rk], sort=sort)
+                     for lk, rk in zip(left_keys, right_keys)]
+        left_keys = [lk for lk, rk in compacted]
+        right_keys = [rk for lk, rk in compacted]
+
+    if keys_only:
+        return _merge_keys_only(recorder, mergetype, how, left_frame,
+                                right_frame, _left_on, _right_on, left_keys,
+                                right_keys, sets, t_mergevar,
+                                matches_required, noprint, msg, audit_only,
+                                __start)
+
+    joined = None
+    if presorted is False:
+        use_sorted = False
+    else:
+        use_sorted = _join.sorted_keys(left_keys) and \
+            _join.sorted_keys(right_keys)
+        if presorted and not use_sorted:
+            raise AssertionError('mer_12', 'presorted requires a single key '
+                                           'column sorted ascending without '
+                                           'missing values in both '
+                                           'dataframes')
+
+    recorder.phase('keys')
+
+    if use_sorted:
+        recorder['path'] = 'sorted'
+        row_limit = _row_limit(max_rows, max_bytes, left_frame, right_frame,
+                               _left_on, _right_on)
+        joined = _join.sorted_join(left_keys[0].values, right_keys[0].values,
+                                   how, sort, row_limit)
+    elif _parallel_merge.use_pool(n_jobs,
+                                  len(left_frame) + len(right_frame)):
+        recorder['path'] = 'parallel'
+        row_limit = _row_limit(max_rows, max_bytes, left_frame, right_frame,
+                               _left_on, _right_on)
+        joined = _parallel_merge.parallel_join(left_keys, right_keys, how,
+                                               sort, n_jobs, row_limit)
+    if joined is not None:
+        recorder.phase('join')
+        if not _join_checks_pass(joined, mergetype, sets, row_limit):
+            # redo the merge on hashed keys to report the failure in full
+            joined = None
+
+    if joined is None:
+        recorder['path'] = 'hash'
+        # factorize the keys of both frames once, every check, the join
+        # itself and the merge statistics work from these integer codes
+        left_codes, right_codes, n_keys = _join.factorize_keys(
+            left_keys, right_keys, sort=sort)
+        left_counts, right_counts = _join.key_counts(left_codes, right_codes,
+                                                     n_keys)
+        distinct = _join.distinct_keys(left_counts, right_counts)
+        recorder.phase('keys')
+
+        _check_unique(mergetype, left_counts, right_counts)
+
+        _check_sets(sets, mergetype, how, left_frame, right_frame, _left_on,
+                    _right_on, left_codes, right_codes, left_counts,
+                    right_counts, t_mergevar, matches_required, noprint, msg)
+
+        _check_size(max_rows, max_bytes, how, left_frame, right_frame,
+                    _left_on, _right_on, left_codes, right_codes, left_counts,
+                    right_counts, noprint)
+        recorder.phase('checks')
+
+        left_indexer, right_indexer = _join.join_indexers(
+            left_codes, right_codes, n_keys, how, sort=sort)
+
+        counts = _join.merge_counts(left_counts, right_counts, how)
+        recorder.phase('join')
+    else:
+        left_indexer = joined.left_indexer
+        right_indexer = joined.right_indexer
+        counts = joined.counts
+        distinct = joined.distinct
+    recorder['counts'] = counts
+    (recorder['left_keys'], recorder['right_keys'],
+     recorder['shared_keys']) = distinct
+    print_merge_stats(counts, mergetype, how, _left_on, _right_on,
+                      matches_required, noprint, msg)
+    recorder.phase('stats')
+
+    new_frame = _join.build_merged(left_frame, right_frame, _left_on,
+                                   _right_on, left_indexer, right_indexer,
+                                   suffixes)
+    if not drop_t_mergevar:
+        new_frame[t_mergevar] = _join.merge_indicator(left_indexer,
+                                                      right_indexer)
+    recorder['merged_rows'] = len(new_frame)
+    recorder['merged_bytes'] = int(new_frame.memory_usage().sum())
+    recorder.phase('build')
+
+    _check_rows(mergetype, how, len(left_frame), len(right_frame),
+                len(new_frame), noprint, __start)
+    recorder.phase('sanity')
+
     return new_frame
+
+def _merge_keys_only(recorder, mergetype, how, left_frame, right_frame,
+                     _left_on, _right_on, left_keys, right_keys, sets,
+                     t_mergevar, matches_required, noprint, msg, audit_only,
+                     start):
+    """The checks and statistics of ``merge`` from the key columns alone,
+    for a semi or anti join or ``audit_only``. Returns the left rows kept, or
+    with ``audit_only`` a boolean mask of them"""
+    recorder['path'] = 'hash'
+    left_codes, right_codes, n_keys = _join.factorize_keys(left_keys,
+                                                           right_keys)
+    left_counts, right_counts = _join.key_counts(left_codes, right_codes,
+                                                 n_keys)
+    (recorder['left_keys'], recorder['right_keys'],
+     recorder['shared_keys']) = _join.distinct_keys(left_counts, right_counts)
+    recorder.phase('keys')
+
+    _check_unique(mergetype, left_counts, right_counts)
+
+    _check_sets(sets, mergetype, how, left_frame, right_frame, _left_on,
+                _right_on, left_codes, right_codes, left_counts,
+                right_counts, t_mergevar, matches_required, noprint, msg)
+    recorder.phase('checks')
+
+    if how in ['semi', 'anti']:
+        counts = _join.audit_counts(left_counts, right_counts)
+    else:
+        counts = _join.merge_counts(left_counts, right_counts, how)
+    recorder['counts'] = counts
+    print_merge_stats(counts, mergetype, how, _left_on, _right_on,
+                      matches_required, noprint, msg)
+    recorder.phase('stats')
+
+    keep = right_counts[left_codes] > 0
+    if how == 'anti':
+        keep = ~keep
+    if how in ['semi', 'anti']:
+        n_rows = int(keep.sum())
+    else:
+        # rows the merged dataframe would have
+        n_rows = int(counts.sum())
+
+    if audit_only:
+        result = pd.Series(keep, index=left_frame.index)
+        recorder['merged_bytes'] = int(result.memory_usage())
+    else:
+        result = left_frame[keep]
+        recorder['merged_bytes'] = int(result.memory_usage().sum())
+    recorder['merged_rows'] = n_rows
+    recorder.phase('build')
+
+    _check_rows(mergetype, how, len(left_frame), len(right_frame), n_rows,
+                noprint, start)
+    recorder.phase('sanity')
+
+    return result
@@ -0,0 +1,106 @@
+__author__ = 'rwest'
+
+# Updating the sheets of an existing workbook in place, for an ExcelWriter
+# opened with mode='a'. pandas opens the workbook with openpyxl, which reads
+# it into its own model and writes the whole workbook out again on save. The
+# cell values, styles, merged cells and sheet order of the sheets not written
+# to come through, but whatever openpyxl does not read is lost from every
+# sheet: charts, images, pivot table caches and the like.
+
+
+def register_sheets(pdwriter):
+    """Let pandas write into the existing sheets of a workbook opened with
+    mode='a', rather than adding a new sheet beside each of them
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+        openpyxl writer opened with mode='a'
+    """
+    for sheet in pdwriter.book.worksheets:
+        pdwriter.sheets[sheet.title] = sheet
+
+
+def replace_sheet(pdwriter, sheet_name):
+    """Swap an existing sheet for an empty one with the same name, in the same
+    position in the workbook
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+    sheet_name : str
+    """
+    book = pdwriter.book
+    old = pdwriter.sheets[sheet_name]
+    index = book.index(old)
+    book.remove(old)
+    pdwriter.sheets[sheet_name] = book.create_sheet(sheet_name, index)
+
+
+def _used_cells(sheet):
+    """Positions, indexed from 1, of the cells holding a value or a style"""
+    return set(position for position, cell in sheet._cells.iteritems()
+               if cell.value is not None or cell.has_style)
+
+
+def block_extent(sheet, startrow, startcol):
+    """Find the table block with its upper left cell at (startrow, startcol)
+
+    Like excel's current region, the block grows down and to the right for as
+    long as the next row or column has a used cell alongside the block, so it
+    ends at an empty row and an empty column.
+
+    Parameters
+    ----------
+    sheet : openpyxl Worksheet
+    startrow : int
+    startcol : int
+        upper left cell of the block, indexed from 1
+
+    Returns
+    -------
+    endrow, endcol : int
+        lower right cell of the block, indexed from 1
+    """
+    used = _used_cells(sheet)
+    endrow, endcol = startrow, startcol
+    grown = True
+    while grown:
+        grown = False
+        if any((endrow + 1, col) in used
+               for col in xrange(startcol, endcol + 2)):
+            endrow += 1
+            grown = True
+        if any((row, endcol + 1) in used
+               for row in xrange(startrow, endrow + 2)):
+            endcol += 1
+            grown = True
+    return endrow, endcol
+
+
+def clear_block(pdwriter, sheet_name, startrow, startcol):
+    """Remove the values, formats and merged cells of the table block at
+    (startrow, startcol) of an existing sheet, leaving the rest of the sheet
+    as it is
+
+    Parameters
+    ----------
+    pdwriter : pd.ExcelWriter
+    sheet_name : str
+    startrow : int
+    startcol : int
+        upper left cell of the block, indexed from 0
+    """
+    sheet = pdwriter.sheets[sheet_name]
+    startrow += 1
+    startcol += 1
+    endrow, endcol = block_extent(sheet, startrow, startcol)
+
+    for merged in list(sheet.merged_cells.ranges):
+        if merged.min_row <= endrow and merged.max_row >= startrow and \
+                merged.min_col <= endcol and merged.max_col >= startcol:
+            sheet.unmerge_cells(merged.coord)
+
+    for row, col in list(sheet._cells):
+        if startrow <= row <= endrow and startcol <= col <= endcol:
+            del sheet._cells[(row, col)]
@@ -0,0 +1,205 @@
+__author__ = 'rwest'
+
+import os
+import time
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+import _merge_report
+
+TableReport = namedtuple('TableReport', [
+    'sheet_name', 'startrow', 'startcol', 'rows', 'columns', 'cells',
+    'styled_cells', 'formats', 'seconds', 'phases', 'memory'])
+
+# functions called with the WriterStats of every ExcelWriter closed
+_HOOKS = []
+
+
+def add_writer_hook(hook):
+    """
+    Call ``hook`` with the ``WriterStats`` of every ``ExcelWriter`` when it
+    is closed, e.g. to send report build statistics to a metrics system
+
+    >>> stats = []
+    >>> add_writer_hook(stats.append)
+
+    """
+    _HOOKS.append(hook)
+
+
+def remove_writer_hook(hook):
+    """Stop calling a hook added by ``add_writer_hook``"""
+    _HOOKS.remove(hook)
+
+
+class TableRecorder(_merge_report.Recorder):
+    """Collects the statistics of one table as it is written"""
+
+    report_type = TableReport
+
+
+def _add_phases(total, phases):
+    for name, seconds in phases.iteritems():
+        total[name] = total.get(name, 0) + seconds
+
+
+class WriterStats(object):
+    """
+    Statistics of an ``ExcelWriter``, updated as each table is written and
+    when the writer is closed. See ``ExcelWriter.stats``
+
+    Attributes
+    ----------
+    path, engine, format_engine :
+        of the writer
+    tables : list of TableReport
+        one per table written, in order: its position, rows and columns,
+        cells written, cells given a format, new excel formats built, and
+        the seconds and peak memory growth of each phase: 'prepare' (sheet
+        updates, column and row format lookups), 'write' (pandas cells,
+        formats and the engine's writes) and 'autofit'
+    close_phases : OrderedDict
+        seconds spent closing: 'widths', 'save' and, with xlwings, 'format'
+    format_calls : int
+        formatting calls made into Excel by the xlwings format engine
+    file_size : int
+        bytes of the saved file, None until closed
+    seconds : float
+        from opening the writer until it was closed
+    error : tuple
+        arguments of the error raised by ``close``, otherwise None
+    """
+
+    def __init__(self, path, engine, format_engine):
+        self.path = path
+        self.engine = engine
+        self.format_engine = format_engine
+        self.tables = []
+        self.close_phases = OrderedDict()
+        self.format_calls = 0
+        self.file_size = None
+        self.seconds = None
+        self.error = None
+        self._start = time.time()
+
+    @property
+    def cells(self):
+        return sum(table.cells for table in self.tables)
+
+    @property
+    def styled_cells(self):
+        return sum(table.styled_cells or 0 for table in self.tables)
+
+    @property
+    def formats(self):
+        return sum(table.formats or 0 for table in self.tables)
+
+    @property
+    def phases(self):
+        """Seconds spent in each phase, over every table and closing"""
+        total = OrderedDict()
+        for table in self.tables:
+            _add_phases(total, table.phases)
+        _add_phases(total, self.close_phases)
+        return total
+
+    def summary(self):
+        """One row per table: its statistics and the seconds of each phase
+
+        Returns
+        -------
+        summary : pd.DataFrame
+        """
+        rows = []
+        for table in self.tables:
+            row = OrderedDict((field, getattr(table, field))
+                              for field in TableReport._fields
+                              if field not in ['phases', 'memory'])
+            row.update(table.phases)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def finish(self, error=None):
+        """Record the end of ``ExcelWriter.close``"""
+        self.seconds = time.time() - self._start
+        self.error = error
+        if isinstance(self.path, basestring) and os.path.exists(self.path):
+            self.file_size = os.path.getsize(self.path)
+
+    def emit(self, hook=None):
+        """Send the stats to ``hook`` and every hook added with
+        ``add_writer_hook``"""
+        hooks = list(_HOOKS)
+        if hook is not None:
+            hooks.append(hook)
+        for hook in hooks:
+            hook(self)
+
+
+class Profile(object):
+    """The statistics collected by ``profile``
+
+    Attributes
+    ----------
+    writers : list of WriterStats
+        of every ExcelWriter closed
+    merges : list of MergeReport
+        of every flyingpandas.merge run
+    seconds : float
+        time spent in the block
+    """
+
+    def __init__(self):
+        self.writers = []
+        self.merges = []
+        self.seconds = None
+
+    def tables(self):
+        """One row per table of every workbook, slowest first, see
+        ``WriterStats.summary``
+
+        Returns
+        -------
+        tables : pd.DataFrame
+        """
+        summaries = []
+        for stats in self.writers:
+            summary = stats.summary()
+            summary.insert(0, 'path', stats.path)
+            summaries.append(summary)
+        if not summaries:
+            return pd.DataFrame()
+        tables = pd.concat(summaries, ignore_index=True, sort=False)
+        return tables.sort_values('seconds', ascending=False)
+
+
+@contextmanager
+def profile():
+    """
+    Collect the statistics of every ExcelWriter closed and every merge run
+    in this process during a block, e.g. a whole report build. Workbooks
+    built by ``build_reports`` in other processes are not included
+
+    >>> with profile() as build:
+    ...     merged = merge('m:1', sales, regions, how='left', on='region')
+    ...     writer = ExcelWriter('report.xlsx')
+    ...     writer.to_excel(merged, sheet_name='Sales')
+    ...     writer.close()
+    >>> build.tables()
+    >>> sum(report.seconds for report in build.merges)
+
+    """
+    result = Profile()
+    writer_hook = result.writers.append
+    merge_hook = result.merges.append
+    start = time.time()
+    add_writer_hook(writer_hook)
+    _merge_report.add_merge_hook(merge_hook)
+    try:
+        yield result
+    finally:
+        remove_writer_hook(writer_hook)
+        _merge_report.remove_merge_hook(merge_hook)
+        result.seconds = time.time() - start
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+from flyingpandas import _autofit
+
+
+class ColumnWidthsTest(unittest.TestCase):
+
+    def test_numbers_and_text(self):
+        data = pd.DataFrame({'name': ['a', 'abcdef'], 'value': [1.0, 1234.5]},
+                            columns=['name', 'value'])
+        widths = _autofit.column_widths(data, index=False)
+        self.assertEqual(widths, {0: 6, 1: 6})
+
+    def test_column_format(self):
+        data = pd.DataFrame({'value': [1234567.0]})
+        widths = _autofit.column_widths(data, index=False,
+                                        column_formats={'value': '$#,##0'})
+        self.assertEqual(widths, {0: 10})
+
+    def test_categorical(self):
+        data = pd.DataFrame({'c': pd.Categorical(['aa', 'bbbbbbb', None]),
+                             'n': pd.Categorical([1.5, 22.25, 3.0])},
+                            columns=['c', 'n'])
+        widths = _autofit.column_widths(data, index=False)
+        self.assertEqual(widths, {0: 7, 1: 5})
+
+    def test_tz_aware_datetime(self):
+        data = pd.DataFrame({'when': pd.date_range('2020-01-01', periods=3,
+                                                   tz='US/Eastern')})
+        widths = _autofit.column_widths(data, index=False)
+        self.assertEqual(widths,
+                         {0: len(_autofit.DEFAULT_DATETIME_FORMAT)})
+
+
+class AutofitWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_categorical_and_tz(self):
+        data = pd.DataFrame({'c': pd.Categorical(['aa', 'bbbb', None]),
+                             'when': pd.date_range('2020-01-01', periods=3,
+                                                   tz='US/Eastern')},
+                            columns=['c', 'when'])
+        path = os.path.join(self.directory, 'autofit.xlsx')
+        writer = flyingpandas.ExcelWriter(path, engine='openpyxl')
+        writer.to_excel(data, index=False)
+        writer.close()
+
+        sheet = openpyxl.load_workbook(path)['Sheet1']
+        self.assertEqual(sheet['A3'].value, 'bbbb')
+        self.assertEqual(sheet.column_dimensions['A'].width,
+                         _autofit.excel_width(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
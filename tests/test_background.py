@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+from flyingpandas import _background
+
+
+class BackgroundWriterTest(unittest.TestCase):
+    """Tables written on the background thread give the same workbook"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        random = np.random.RandomState(0)
+        self.frames = [
+            pd.DataFrame({'name': ['a', 'b', 'c'] * 10,
+                          'value': random.rand(30)},
+                         columns=['name', 'value']),
+            pd.DataFrame({'when': pd.date_range('2020-01-01', periods=5),
+                          'count': np.arange(5)},
+                         columns=['when', 'count']),
+        ]
+        self.options = [
+            {'sheet_name': 'First', 'add_color_rows': True,
+             'column_formats': {'value': '0.00%'}},
+            {'sheet_name': 'First', 'startrow': 35, 'index': False},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def cells(self, path):
+        book = openpyxl.load_workbook(path)
+        return dict((sheet.title,
+                     [[(cell.value, cell.number_format, cell.fill.fgColor.rgb)
+                       for cell in row] for row in sheet.iter_rows()])
+                    for sheet in book.worksheets)
+
+    def write(self, name, **kwargs):
+        writer = flyingpandas.ExcelWriter(self.path(name), **kwargs)
+        for data, options in zip(self.frames, self.options):
+            writer.to_excel(data, **options)
+        return writer
+
+    def test_same_as_foreground(self):
+        for engine in ['openpyxl', 'xlsxwriter']:
+            self.write('foreground.xlsx', engine=engine).close()
+            self.write('background.xlsx', engine=engine, background=True,
+                       queue_size=1).close()
+            self.assertEqual(self.cells(self.path('background.xlsx')),
+                             self.cells(self.path('foreground.xlsx')))
+
+    def test_tables_are_copied(self):
+        self.write('foreground.xlsx').close()
+        writer = self.write('background.xlsx', background=True)
+        # changes made once to_excel has returned are not written
+        self.frames[0]['value'] = -1.0
+        self.options[0]['column_formats']['value'] = '0'
+        writer.close()
+        self.assertEqual(self.cells(self.path('background.xlsx')),
+                         self.cells(self.path('foreground.xlsx')))
+
+    def test_error_raised_by_close(self):
+        writer = flyingpandas.ExcelWriter(self.path('error.xlsx'),
+                                          background=True)
+        writer.to_excel(self.frames[0], sheet_name='First',
+                        row_formats={'a': '0.0'}, row_format_col='missing')
+        with self.assertRaises(KeyError):
+            writer.close()
+        self.assertIsNotNone(writer.stats.error)
+
+    def test_aclose(self):
+        writer = self.write('aclose.xlsx', background=True)
+        finished = threading.Event()
+        future = writer.aclose()
+        future.add_done_callback(lambda future: finished.set())
+        self.assertIsNone(future.result(timeout=60))
+        self.assertTrue(future.done())
+        self.assertTrue(finished.wait(60))
+        self.assertIsNone(future.exception())
+        self.assertIn('First', self.cells(self.path('aclose.xlsx')))
+
+    def test_aclose_error(self):
+        writer = flyingpandas.ExcelWriter(self.path('error.xlsx'),
+                                          background=True)
+        writer.to_excel(self.frames[0], sheet_name='First',
+                        row_formats={'a': '0.0'}, row_format_col='missing')
+        future = writer.aclose()
+        self.assertIsInstance(future.exception(timeout=60), KeyError)
+        with self.assertRaises(KeyError):
+            future.result()
+
+    def test_requires_native_format_engine(self):
+        with self.assertRaises(ValueError):
+            flyingpandas.ExcelWriter(self.path('xlwings.xlsx'),
+                                     format_engine='xlwings', background=True)
+
+
+class WorkerTest(unittest.TestCase):
+
+    def test_runs_in_order_and_stops_at_first_error(self):
+        calls = []
+
+        def fail():
+            raise ValueError('failed')
+
+        worker = _background.Worker(queue_size=1)
+        worker.submit(calls.append, 1)
+        worker.submit(fail)
+        with self.assertRaises(ValueError):
+            # raised by a later submit or by join
+            worker.submit(calls.append, 2)
+            worker.join()
+        with self.assertRaises(ValueError):
+            worker.join()
+        self.assertEqual(calls, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
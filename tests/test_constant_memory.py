@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+
+
+class ConstantMemoryTest(unittest.TestCase):
+    """Tables streamed row by row hold the same values as when written
+    whole"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stream.xlsx')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def values(self, sheet_name='Sheet1'):
+        sheet = openpyxl.load_workbook(self.path)[sheet_name]
+        return [[cell.value for cell in row] for row in sheet.iter_rows()]
+
+    def test_multiindex(self):
+        index = pd.MultiIndex.from_tuples([('a', 1), ('a', 2), ('b', 1),
+                                           ('b', 2)])
+        data = pd.DataFrame({'v': [1, 2, 3, 4]}, index=index)
+        for merge_cells in [True, False]:
+            writer = flyingpandas.ExcelWriter(self.path,
+                                              constant_memory=True)
+            writer.to_excel(data, merge_cells=merge_cells)
+            writer.close()
+            # a merged level is only written in the first row of its range
+            a, b = (None, None) if merge_cells else ('a', 'b')
+            self.assertEqual(self.values()[1:], [['a', 1, 1], [a, 2, 2],
+                                                 ['b', 1, 3], [b, 2, 4]])
+
+    def test_multiindex_columns(self):
+        columns = pd.MultiIndex.from_tuples([('x', 'a'), ('x', 'b'),
+                                             ('y', 'c')])
+        data = pd.DataFrame([[1, 2, 3], [4, 5, 6]], columns=columns)
+        writer = flyingpandas.ExcelWriter(self.path, constant_memory=True)
+        writer.to_excel(data)
+        writer.close()
+        sheet = openpyxl.load_workbook(self.path)['Sheet1']
+        self.assertEqual([str(cells) for cells in sheet.merged_cells.ranges],
+                         ['B1:C1'])
+        self.assertEqual(self.values()[3:], [[0, 1, 2, 3], [1, 4, 5, 6]])
+
+    def test_tables_top_to_bottom(self):
+        data = pd.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]})
+        writer = flyingpandas.ExcelWriter(self.path, constant_memory=True)
+        writer.to_excel(data, index=False)
+        for startrow, startcol in [(0, 4), (2, 0), (3, 0)]:
+            with self.assertRaises(ValueError):
+                writer.to_excel(data, index=False, startrow=startrow,
+                                startcol=startcol)
+        writer.to_excel(data, index=False, startrow=5)
+        writer.to_excel(data, sheet_name='Other', index=False, startrow=1)
+        writer.close()
+        self.assertEqual(self.values(),
+                         [['a', 'b'], [1, 4], [2, 5], [3, 6], [None, None],
+                          ['a', 'b'], [1, 4], [2, 5], [3, 6]])
+        self.assertEqual(self.values('Other')[1:],
+                         [['a', 'b'], [1, 4], [2, 5], [3, 6]])
+
+    def test_grouped(self):
+        data = pd.DataFrame({'g': ['x', 'x', 'y'], 'v': [1, 2, 3]})
+        writer = flyingpandas.ExcelWriter(self.path, constant_memory=True)
+        nextrow = writer.to_excel_grouped(data, by='g', headings=True,
+                                          index=False)
+        with self.assertRaises(ValueError):
+            writer.to_excel_grouped(data, by='g', startrow=nextrow - 2,
+                                    index=False)
+        writer.close()
+        self.assertEqual(self.values(),
+                         [['x'], ['v'], [1], [2], [None], ['y'], ['v'],
+                          [3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+import flyingpandas
+from flyingpandas import _flyingpandas
+from flyingpandas._format_plan import FormatPlan, FormatRange
+
+
+class StubXlwings(object):
+    """Records the ranges formatted through xlwings instead of Excel"""
+
+    def __init__(self, conditional_formats=True):
+        self.calls = []
+        self.conditions = []
+        self.conditional_formats = conditional_formats
+        self.saved = False
+
+    def Range(self, sheet_name, first, last):
+        return StubRange(self, sheet_name, first, last)
+
+    def Workbook(self, path):
+        return StubWorkbook(self)
+
+
+class StubWorkbook(object):
+
+    def __init__(self, xlwings):
+        self.xlwings = xlwings
+
+    def save(self):
+        self.xlwings.saved = True
+
+    def close(self):
+        pass
+
+
+class StubRange(object):
+
+    def __init__(self, xlwings, sheet_name, first, last):
+        self.__dict__['xlwings'] = xlwings
+        self.__dict__['address'] = (sheet_name, first, last)
+        if xlwings.conditional_formats:
+            self.__dict__['api'] = StubApi(xlwings, self.address)
+        else:
+            self.__dict__['api'] = object()
+
+    def __setattr__(self, name, value):
+        self.xlwings.calls.append((name, self.address, value))
+
+
+class StubApi(object):
+
+    def __init__(self, xlwings, address):
+        self.FormatConditions = self
+        self.xlwings = xlwings
+        self.address = address
+
+    def Add(self, Type, Formula1):
+        condition = StubCondition()
+        self.xlwings.conditions.append((self.address, Formula1, condition))
+        return condition
+
+
+class StubCondition(object):
+
+    def __init__(self):
+        self.Interior = self
+        self.Color = None
+
+
+class FormatPlanTest(unittest.TestCase):
+
+    def test_coalesced_ranges(self):
+        plan = FormatPlan()
+        spacing = {'startrow': 1, 'startcol': 1, 'endrow': 5, 'endcol': 4}
+        plan.add_table('Sheet1', spacing, {1: '0.0', 2: '0.0', 3: '0%'},
+                       {2: '$0', 3: '$0', 4: '0.00'}, True, True, True,
+                       ((1, 2, 3), (4, 5, 6)))
+        # with the header and index the data starts at row 2 and column 2
+        self.assertEqual(plan.ranges, [
+            FormatRange('number_format', 'Sheet1', 2, 2, 5, 3, '0.0'),
+            FormatRange('number_format', 'Sheet1', 2, 4, 5, 4, '0%'),
+            FormatRange('number_format', 'Sheet1', 3, 2, 4, 4, '$0'),
+            FormatRange('number_format', 'Sheet1', 5, 2, 5, 4, '0.00'),
+            FormatRange('banding', 'Sheet1', 2, 2, 5, 4,
+                        ((1, 2, 3), (4, 5, 6)))])
+
+    def test_apply(self):
+        plan = FormatPlan()
+        plan.ranges = [
+            FormatRange('number_format', 'Sheet1', 2, 1, 9, 2, '0.0'),
+            FormatRange('banding', 'Sheet1', 2, 1, 9, 3,
+                        ((255, 0, 0), (255, 255, 255))),
+        ]
+        plan.add_column_widths('Sheet1', {1: 10, 2: 10, 3: 4})
+        xlwings = StubXlwings()
+        plan.apply(xlwings)
+        self.assertEqual([(name, address) for name, address, _
+                          in xlwings.calls],
+                         [('number_format', ('Sheet1', (2, 1), (9, 2))),
+                          ('color', ('Sheet1', (2, 1), (9, 3))),
+                          ('column_width', ('Sheet1', (1, 1), (1, 2))),
+                          ('column_width', ('Sheet1', (1, 3), (1, 3)))])
+        # one conditional format rule colors the even rows
+        (address, formula, condition), = xlwings.conditions
+        self.assertEqual(formula, '=MOD(ROW()-2,2)=0')
+        self.assertEqual(condition.Color, 255)
+        self.assertEqual(plan.calls, 5)
+
+    def test_banding_without_conditional_formats(self):
+        plan = FormatPlan()
+        plan.ranges = [FormatRange('banding', 'Sheet1', 2, 1, 6, 3,
+                                   ((255, 0, 0), (255, 255, 255)))]
+        xlwings = StubXlwings(conditional_formats=False)
+        plan.apply(xlwings)
+        self.assertEqual([address for name, address, _ in xlwings.calls],
+                         [('Sheet1', (2, 1), (6, 3)),
+                          ('Sheet1', (2, 1), (2, 3)),
+                          ('Sheet1', (4, 1), (4, 3)),
+                          ('Sheet1', (6, 1), (6, 3))])
+        self.assertEqual(plan.calls, 4)
+
+
+class FormatCallsTest(unittest.TestCase):
+    """``format_calls`` counts the calls into Excel made by close()"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.xlwings = StubXlwings()
+        self.import_xlwings = _flyingpandas._import_xlwings
+        _flyingpandas._import_xlwings = lambda: self.xlwings
+
+    def tearDown(self):
+        _flyingpandas._import_xlwings = self.import_xlwings
+        shutil.rmtree(self.directory)
+
+    def test_format_calls(self):
+        data = pd.DataFrame({'a': [1.0, 2.0, 3.0, 4.0], 'b': [1.0] * 4,
+                             'c': [0.5] * 4}, columns=['a', 'b', 'c'])
+        writer = flyingpandas.ExcelWriter(
+            os.path.join(self.directory, 'xlwings.xlsx'),
+            format_engine='xlwings')
+        writer.to_excel(data, index=False, autofit=False,
+                        column_formats={'a': '0.0', 'b': '0.0', 'c': '0%'})
+        self.assertEqual(writer.format_calls, 0)
+        writer.close()
+        self.assertTrue(self.xlwings.saved)
+        # a and b share one range, c has its own, and the banding takes one
+        # fill and one conditional format rule
+        self.assertEqual([(name, address) for name, address, _
+                          in self.xlwings.calls],
+                         [('number_format', ('Sheet1', (2, 1), (5, 2))),
+                          ('number_format', ('Sheet1', (2, 3), (5, 3))),
+                          ('color', ('Sheet1', (2, 1), (5, 3)))])
+        self.assertEqual(len(self.xlwings.conditions), 1)
+        self.assertEqual(writer.format_calls, 4)
+        self.assertEqual(writer.stats.format_calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
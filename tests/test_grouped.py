@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+
+BLUE, WHITE = 'DCE6F1', 'FFFFFF'
+
+
+class GroupedWriteTest(unittest.TestCase):
+    """Each group is written as its own table, read back with openpyxl"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'grouped.xlsx')
+        self.data = pd.DataFrame({'cat': ['b', 'a', 'b', 'a', 'b'],
+                                  'cost': [1.5, 2.5, 3.5, 4.5, 5.5],
+                                  'n': [1, 2, 3, 4, 5]},
+                                 columns=['cat', 'cost', 'n'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, engine='xlsxwriter', **kwargs):
+        writer = flyingpandas.ExcelWriter(self.path, engine=engine)
+        nextrow = writer.to_excel_grouped(self.data, by='cat', index=False,
+                                          **kwargs)
+        writer.close()
+        return nextrow
+
+    def sheet(self):
+        return openpyxl.load_workbook(self.path)['Sheet1']
+
+    def values(self):
+        return [[cell.value for cell in row]
+                for row in self.sheet().iter_rows()]
+
+    def test_blocks_and_headings(self):
+        for engine in ['openpyxl', 'xlsxwriter']:
+            nextrow = self.write(engine, gap=2, headings='Category: {}',
+                                 startrow=1, startcol=1,
+                                 column_formats={'cost': '$0.00'})
+            self.assertEqual(nextrow, 14)
+            self.assertEqual(self.values(), [
+                [None, None, None],
+                [None, 'Category: a', None],
+                [None, 'cost', 'n'],
+                [None, 2.5, 2],
+                [None, 4.5, 4],
+                [None, None, None],
+                [None, None, None],
+                [None, 'Category: b', None],
+                [None, 'cost', 'n'],
+                [None, 1.5, 1],
+                [None, 3.5, 3],
+                [None, 5.5, 5]])
+            sheet = self.sheet()
+            self.assertTrue(sheet['B2'].font.b)
+            self.assertTrue(sheet['B8'].font.b)
+            # every block gets the column formats, and its banding starts
+            # again on its first row
+            for row, fill in [(4, BLUE), (5, WHITE), (10, BLUE),
+                              (11, WHITE), (12, BLUE)]:
+                self.assertEqual(sheet.cell(row=row, column=2).number_format,
+                                 '$0.00')
+                self.assertEqual(sheet.cell(row=row, column=3).number_format,
+                                 'General')
+                for col in [2, 3]:
+                    self.assertEqual(
+                        sheet.cell(row=row, column=col).fill.fgColor.rgb[2:],
+                        fill)
+
+    def test_order_and_by_columns(self):
+        nextrow = self.write(sort=False, drop_by=False, gap=0, header=False,
+                             headings=lambda key: key.upper())
+        self.assertEqual(nextrow, 7)
+        self.assertEqual(self.values(), [
+            ['B', None, None], ['b', 1.5, 1], ['b', 3.5, 3], ['b', 5.5, 5],
+            ['A', None, None], ['a', 2.5, 2], ['a', 4.5, 4]])
+
+    def test_same_as_to_excel(self):
+        """Each block holds what to_excel writes for the group"""
+        self.write(gap=1)
+        grouped = self.values()
+        writer = flyingpandas.ExcelWriter(self.path)
+        startrow = 0
+        for key, group in self.data.groupby('cat'):
+            group = group.drop('cat', axis=1)
+            writer.to_excel(group, index=False, startrow=startrow)
+            startrow += len(group) + 2
+        writer.close()
+        self.assertEqual(grouped, self.values())
+
+
+if __name__ == '__main__':
+    unittest.main()
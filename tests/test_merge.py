@@ -0,0 +1,826 @@
+import contextlib
+import sys
+import unittest
+import warnings
+from StringIO import StringIO
+
+import numpy as np
+import pandas as pd
+
+import flyingpandas
+from flyingpandas import _join, _parallel_merge
+
+HOWS = ['left', 'right', 'inner', 'outer']
+
+
+def pandas_merge(left, right, how, on, sort=False):
+    return pd.merge(left, right, how=how, on=on, sort=sort,
+                    suffixes=('_x', '_y'))
+
+
+def flying_merge(left, right, how, on, sort=False, **kwargs):
+    return flyingpandas.merge('m:m', left, right, how=how, on=on, sort=sort,
+                              suffixes=('_x', '_y'), noprint=True,
+                              matches_required=False, **kwargs)
+
+
+def prepared_merge(left, right, how, on, sort=False):
+    prepared = flyingpandas.PreparedMerge(right, on=on)
+    return prepared.merge('m:m', left, how=how, sort=sort,
+                          suffixes=('_x', '_y'), noprint=True,
+                          matches_required=False)
+
+
+def assert_same_merge(testcase, left, right, how, on, sort=False,
+                      merge=flying_merge):
+    expected = pandas_merge(left, right, how, on, sort)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        result = merge(left, right, how, on, sort)
+    try:
+        pd.testing.assert_frame_equal(result.reset_index(drop=True),
+                                      expected.reset_index(drop=True))
+    except AssertionError as e:
+        testcase.fail('{} how={} sort={}: {}'.format(merge.__name__, how,
+                                                     sort, e))
+
+
+class KeyDtypeTest(unittest.TestCase):
+    """Key columns of different dtypes are cast as pandas.merge casts them"""
+
+    def check(self, left_keys, right_keys):
+        left = pd.DataFrame({'k': left_keys, 'x': np.arange(len(left_keys))})
+        right = pd.DataFrame({'k': right_keys,
+                              'y': np.arange(len(right_keys))})
+        for merge in [flying_merge, prepared_merge]:
+            for how in HOWS:
+                assert_same_merge(self, left, right, how, 'k', merge=merge)
+
+    def test_categoricals_with_different_categories(self):
+        self.check(pd.Categorical(['a', 'b', 'c']), pd.Categorical(['a', 'd']))
+
+    def test_outer_keeps_right_only_categorical_keys(self):
+        left = pd.DataFrame({'k': pd.Categorical(['a', 'b', 'c'])})
+        right = pd.DataFrame({'k': pd.Categorical(['a', 'd'])})
+        merged = flying_merge(left, right, 'outer', 'k')
+        self.assertEqual(merged['k'].tolist(), ['a', 'b', 'c', 'd'])
+
+    def test_categorical_and_object(self):
+        self.check(pd.Categorical(['a', 'b', 'c']),
+                   np.array(['a', 'd'], dtype=object))
+
+    def test_shared_categories(self):
+        categories = ['a', 'b', 'c', 'd']
+        self.check(pd.Categorical(['a', 'b', 'c'], categories=categories),
+                   pd.Categorical(['a', 'd'], categories=categories))
+
+    def test_int_and_float(self):
+        self.check(np.array([1, 2, 3]), np.array([1.0, 4.0]))
+
+    def test_large_int_and_float(self):
+        # pandas compares them exactly, not as float64
+        self.check(np.array([2 ** 60 + 1, 2 ** 60, 1]),
+                   np.array([2.0 ** 60, 1.0]))
+
+    def test_tz_aware(self):
+        self.check(pd.date_range('2020-01-01', periods=3, tz='US/Eastern'),
+                   pd.date_range('2020-01-02', periods=3, tz='US/Eastern'))
+
+    def test_compact_integer_keys(self):
+        for low, high, dtype in [(0, 100, np.int8), (-128, 127, np.int8),
+                                 (0, 128, np.int16), (-129, 0, np.int16),
+                                 (0, 2 ** 31, np.int64)]:
+            left = pd.DataFrame({'k': np.array([low, high], dtype=np.int64)})
+            right = pd.DataFrame({'k': np.array([high], dtype=np.uint64)})
+            left, right = flyingpandas.compact_keys([left, right], on='k')
+            self.assertEqual((left['k'].dtype, right['k'].dtype),
+                             (dtype, dtype))
+            self.assertEqual(left['k'].tolist(), [low, high])
+        left = pd.DataFrame({'k': np.array([0, 50, 100], dtype=np.uint8),
+                             'x': np.arange(3)})
+        right = pd.DataFrame({'k': [100, 3], 'y': np.arange(2)})
+        for how in HOWS:
+            assert_same_merge(self, left, right, how, 'k',
+                              merge=compacted_merge)
+
+
+
+@contextlib.contextmanager
+def forced_pool():
+    """Merge with ``n_jobs`` over a pool, however small the frames and
+    however few the cores"""
+    min_rows = _parallel_merge.PARALLEL_MIN_ROWS
+    cpu_count = _parallel_merge._cpu_count
+    _parallel_merge.PARALLEL_MIN_ROWS = 0
+    _parallel_merge._cpu_count = lambda: 4
+    try:
+        yield
+    finally:
+        _parallel_merge.PARALLEL_MIN_ROWS = min_rows
+        _parallel_merge._cpu_count = cpu_count
+
+
+def parallel_merge(left, right, how, on, sort=False):
+    with forced_pool():
+        return flying_merge(left, right, how, on, sort, n_jobs=2)
+
+
+def compacted_merge(left, right, how, on, sort=False):
+    return flying_merge(left, right, how, on, sort, compact=True)
+
+
+class MissingKeyOrderTest(unittest.TestCase):
+    """With sort=True pandas.merge sorts NaT and missing categorical keys
+    first, and other missing keys last"""
+
+    def check(self, left_keys, right_keys):
+        left = pd.DataFrame({'k': left_keys, 'j': [1, 1, 2, 2],
+                             'x': np.arange(4)})
+        right = pd.DataFrame({'k': right_keys, 'j': [1, 2, 1, 1],
+                              'y': np.arange(4)})
+        for merge in [flying_merge, prepared_merge, parallel_merge,
+                      compacted_merge]:
+            for how in HOWS:
+                for sort in [False, True]:
+                    assert_same_merge(self, left, right, how, 'k', sort,
+                                      merge=merge)
+                    assert_same_merge(self, left, right, how, ['k', 'j'],
+                                      sort, merge=merge)
+
+    def test_datetime(self):
+        self.check(pd.to_datetime(['2020-03-01', None, '2020-01-01', None]),
+                   pd.to_datetime(['2020-01-01', None, '2020-02-01',
+                                   '2020-03-01']))
+
+    def test_tz_aware(self):
+        self.check(pd.to_datetime(['2020-03-01', None, '2020-01-01', None])
+                   .tz_localize('US/Eastern'),
+                   pd.to_datetime(['2020-01-01', None, '2020-02-01',
+                                   '2020-03-01']).tz_localize('US/Eastern'))
+
+    def test_timedelta(self):
+        self.check(pd.to_timedelta(['3s', None, '1s', None]),
+                   pd.to_timedelta(['1s', None, '2s', '3s']))
+
+    def test_float(self):
+        self.check([3.0, np.nan, 1.0, np.nan], [1.0, np.nan, 2.0, 3.0])
+
+    def test_object(self):
+        self.check(['c', None, 'a', None], ['a', None, 'b', 'c'])
+
+    def test_shared_categories(self):
+        categories = ['c', 'b', 'a']
+        self.check(pd.Categorical(['c', None, 'a', None],
+                                  categories=categories),
+                   pd.Categorical(['a', None, 'b', 'c'],
+                                  categories=categories))
+
+
+class KeyHashesTest(unittest.TestCase):
+    """Keys that merge matches hash equal whatever their dtype"""
+
+    def hashes(self, values):
+        return _join.key_hashes([pd.Series(values)]).tolist()
+
+    def test_numbers(self):
+        ints = self.hashes(np.array([1, 0, -1, 2 ** 60]))
+        self.assertEqual(self.hashes(np.array([1.0, -0.0, -1.0, 2.0 ** 60])),
+                         ints)
+        self.assertEqual(self.hashes(np.array([True, 0, -1.0, 2 ** 60],
+                                              dtype=object)), ints)
+        self.assertEqual(self.hashes(pd.Categorical([1, 0, -1, 2 ** 60])),
+                         ints)
+
+    def test_large_ints_are_exact(self):
+        hashes = self.hashes(np.array([2 ** 60, 2 ** 60 + 1]))
+        self.assertNotEqual(hashes[0], hashes[1])
+
+    def test_missing(self):
+        missing = self.hashes(np.array([np.nan]))
+        self.assertEqual(self.hashes(np.array([None, 'a'], dtype=object))[:1],
+                         missing)
+        self.assertEqual(self.hashes(pd.Categorical([None, 'a']))[:1],
+                         missing)
+
+    def test_strings(self):
+        self.assertEqual(self.hashes(pd.Categorical(['a', 'b'])),
+                         self.hashes(np.array(['a', 'b'], dtype=object)))
+
+
+class MergeChunksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.prepared = flyingpandas.PreparedMerge(
+            pd.DataFrame({'k': [1, 2], 'y': [1, 2]}), on='k')
+
+    def merge_chunks(self, chunks, **kwargs):
+        return pd.concat(self.prepared.merge_chunks(
+            '1:1', chunks, how='left', noprint=True, matches_required=False,
+            **kwargs))
+
+    def test_large_int_keys_are_unique(self):
+        chunks = [pd.DataFrame({'k': [2 ** 60], 'x': [0]}),
+                  pd.DataFrame({'k': [2 ** 60 + 1], 'x': [1]})]
+        merged = self.merge_chunks(chunks)
+        self.assertEqual(merged['k'].tolist(), [2 ** 60, 2 ** 60 + 1])
+        with self.assertRaises(AssertionError):
+            self.merge_chunks(chunks + chunks[:1])
+
+    def test_sets_as_tuple(self):
+        chunks = [pd.DataFrame({'k': [1, 3], 'x': [0, 1]})]
+        merged = self.merge_chunks(chunks,
+                                   sets=('both', 'left_only', 'right_only'))
+        self.assertEqual(len(merged), 2)
+        # the left only key fails its chunk
+        with self.assertRaises(AssertionError) as raised:
+            self.merge_chunks(chunks, sets=('both', 'right_only'))
+        self.assertEqual(raised.exception.args[0], 'mer_7')
+
+
+class ParallelJoinTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        # object keys mixing integers and floats, which merge matches
+        self.left = pd.DataFrame({
+            'k': np.array([1, 2.0, 'a', None, 3] * 4, dtype=object),
+            'x': random.rand(20)})
+        self.right = pd.DataFrame({
+            'k': np.array([1.0, 2, 'a', None, 4], dtype=object),
+            'y': np.arange(5)})
+
+    def test_same_as_serial(self):
+        for how in HOWS:
+            for sort in [False, True]:
+                assert_same_merge(self, self.left, self.right, how, 'k',
+                                  sort, merge=parallel_merge)
+                serial = flying_merge(self.left, self.right, how, 'k', sort)
+                parallel = parallel_merge(self.left, self.right, how, 'k',
+                                          sort)
+                pd.testing.assert_frame_equal(parallel, serial)
+
+    def test_checks(self):
+        for mergetype, error in [('m:1', 'mer_5'), ('1:m', 'mer_4')]:
+            for n_jobs in [None, 2]:
+                with forced_pool():
+                    with self.assertRaises(AssertionError) as raised:
+                        flyingpandas.merge(mergetype, self.left, self.left,
+                                           how='inner', on='k', noprint=True,
+                                           suffixes=('_x', '_y'),
+                                           n_jobs=n_jobs)
+                self.assertEqual(raised.exception.args[0], error)
+
+    def test_path(self):
+        reports = []
+        for n_jobs in [2, -1]:
+            flyingpandas.merge('m:1', self.left, self.right, how='left',
+                               on='k', noprint=True, n_jobs=n_jobs,
+                               report=reports.append)
+            with forced_pool():
+                flyingpandas.merge('m:1', self.left, self.right, how='left',
+                                   on='k', noprint=True, n_jobs=n_jobs,
+                                   report=reports.append)
+        self.assertEqual([report.path for report in reports],
+                         ['hash', 'parallel'] * 2)
+
+    def test_one_process_per_core(self):
+        cpu_count = _parallel_merge._cpu_count
+        _parallel_merge._cpu_count = lambda: 1
+        try:
+            self.assertEqual(_parallel_merge.n_workers(8), 1)
+            self.assertEqual(_parallel_merge.n_workers(-1), 1)
+            self.assertFalse(_parallel_merge.use_pool(8, 10 ** 9))
+        finally:
+            _parallel_merge._cpu_count = cpu_count
+
+
+class JoinTest(unittest.TestCase):
+    """Rows, their order and the merged columns equal those of pandas.merge"""
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.left = pd.DataFrame({'k': random.randint(0, 20, 60),
+                                  'j': random.choice(['a', 'b'], 60),
+                                  'v': np.arange(60)})
+        self.right = pd.DataFrame({'k': random.randint(10, 30, 40),
+                                   'j': random.choice(['a', 'b'], 40),
+                                   'v': np.arange(40.0)})
+
+    def test_many_to_many(self):
+        for how in HOWS:
+            for sort in [False, True]:
+                assert_same_merge(self, self.left, self.right, how, 'k', sort)
+                assert_same_merge(self, self.left, self.right, how,
+                                  ['k', 'j'], sort)
+
+    def test_left_on_right_on(self):
+        right = self.right.rename(columns={'k': 'rk'})
+        for how in HOWS:
+            result = flyingpandas.merge('m:m', self.left, right, how=how,
+                                        left_on='k', right_on='rk',
+                                        suffixes=('_x', '_y'), noprint=True,
+                                        matches_required=False)
+            expected = pd.merge(self.left, right, how=how, left_on='k',
+                                right_on='rk', suffixes=('_x', '_y'))
+            pd.testing.assert_frame_equal(result.reset_index(drop=True),
+                                          expected.reset_index(drop=True))
+
+    def test_index_join_not_supported(self):
+        for index in [{'left_index': True}, {'right_index': True}]:
+            with self.assertRaises(AssertionError) as raised:
+                flyingpandas.merge('m:m', self.left, self.right, how='inner',
+                                   on='k', noprint=True, **index)
+            self.assertEqual(raised.exception.args[0], 'mer_13')
+
+
+class MergeReportTest(unittest.TestCase):
+    """Every merge function reports to the merge hooks, also on failure"""
+
+    def setUp(self):
+        self.left = pd.DataFrame({'k': [1, 2, 3, 3], 'x': np.arange(4)})
+        self.right = pd.DataFrame({'k': [1, 2, 4], 'y': np.arange(3)})
+
+    def profiled(self, merge):
+        with flyingpandas.profile() as build:
+            try:
+                merge()
+            except AssertionError:
+                pass
+        return build.merges
+
+    def test_paths(self):
+        left, right = self.left, self.right
+        prepared = flyingpandas.PreparedMerge(right, on='k')
+        merges = [
+            lambda: prepared.merge('m:1', left, how='left', noprint=True),
+            lambda: list(prepared.merge_chunks('m:1', [left[:2], left[2:]],
+                                               how='left', noprint=True)),
+            lambda: list(flyingpandas.merge_chunks('m:1', [left], right,
+                                                   how='left', on='k',
+                                                   noprint=True)),
+            lambda: list(flyingpandas.merge_partitioned(
+                'm:1', left, right, how='left', on='k', noprint=True,
+                n_partitions=3)),
+        ]
+        for merge, path in zip(merges, ['prepared', 'chunks', 'chunks',
+                                        'partitioned']):
+            reports = self.profiled(merge)
+            self.assertEqual([report.path for report in reports], [path])
+            report = reports[0]
+            self.assertIsNone(report.error)
+            self.assertEqual((report.left_rows, report.right_rows,
+                              report.merged_rows), (4, 3, 4))
+            self.assertEqual((report.right_keys, report.shared_keys), (3, 2))
+            self.assertEqual(report.counts['both'], 2)
+            self.assertGreater(report.merged_bytes, 0)
+
+    def test_merge_many(self):
+        other = self.right.rename(columns={'y': 'z'})
+        reports = self.profiled(lambda: flyingpandas.merge_many(
+            self.left, [self.right, other], how='inner', on='k',
+            noprint=True))
+        self.assertEqual([report.path for report in reports], ['many'] * 2)
+        self.assertEqual([report.merged_rows for report in reports], [2, 2])
+        self.assertEqual(reports[1].left_rows, 2)
+        self.assertIsNone(reports[0].merged_bytes)
+        self.assertGreater(reports[1].merged_bytes, 0)
+
+    def test_failures(self):
+        left, right = self.left, self.right
+        merges = [
+            lambda: flyingpandas.merge('m:1', left, right, how='left',
+                                       on='k', left_index=True, noprint=True),
+            lambda: flyingpandas.merge('1:1', left, right, how='left',
+                                       on='k', noprint=True),
+            lambda: flyingpandas.PreparedMerge(right, on='k').merge(
+                '1:1', left, how='left', noprint=True),
+            lambda: list(flyingpandas.merge_chunks('1:1', [left], right,
+                                                   how='left', on='k',
+                                                   noprint=True)),
+            lambda: list(flyingpandas.merge_partitioned(
+                '1:1', left, right, how='left', on='k', noprint=True)),
+            lambda: flyingpandas.merge_many(left, [right, right], on='k',
+                                            noprint=True),
+        ]
+        errors = ['mer_13', 'mer_4', 'mer_4', 'mer_4', 'mer_4',
+                  'mer_10']
+        for merge, error in zip(merges, errors):
+            reports = self.profiled(merge)
+            self.assertEqual(len(reports), 1)
+            self.assertEqual(reports[0].error[0], error)
+
+    def test_unread_chunks(self):
+        with flyingpandas.profile() as build:
+            chunks = flyingpandas.merge_partitioned(
+                'm:1', self.left, self.right, how='left', on='k',
+                noprint=True, n_partitions=3)
+            next(chunks)
+            chunks.close()
+        self.assertEqual(build.merges[0].error[0], 'GeneratorExit')
+
+    def test_sets_as_tuple(self):
+        sets = ('both', 'left_only', 'right_only')
+        merged = flyingpandas.merge('m:1', self.left, self.right, how='left',
+                                    on='k', sets=sets, noprint=True)
+        self.assertEqual(len(merged), 4)
+        merged = flyingpandas.merge_many(self.left, [self.right], on='k',
+                                         sets=sets, noprint=True)
+        self.assertEqual(len(merged), 4)
+        for sets, error in [(('both', 'left_only'), 'mer_7'),
+                            (('both', 'neither'), 'mer_6')]:
+            with self.assertRaises(AssertionError) as raised:
+                flyingpandas.merge('m:1', self.left, self.right, how='left',
+                                   on='k', sets=sets, noprint=True)
+            self.assertEqual(raised.exception.args[0], error)
+
+
+
+class AuditTest(unittest.TestCase):
+    """Semi and anti joins and audit_only agree with pandas.merge"""
+
+    def setUp(self):
+        random = np.random.RandomState(2)
+        index = random.permutation(60) * 10
+        self.left = pd.DataFrame({'k': random.randint(0, 20, 60).astype(float),
+                                  'j': random.choice(['a', 'b'], 60),
+                                  'v': np.arange(60)}, index=index)
+        self.left.loc[index[:3], 'k'] = np.nan
+        self.right = pd.DataFrame({'k': random.randint(10, 30, 40),
+                                   'j': random.choice(['a', 'b'], 40),
+                                   'w': np.arange(40.0)})
+        self.right.loc[:1, 'k'] = np.nan
+
+    def matched(self, on):
+        """Whether each left row has a key in the right frame, by pandas"""
+        keys = self.right[on].drop_duplicates()
+        merged = pd.merge(self.left, keys, how='left', on=on, indicator=True)
+        return (merged['_merge'] == 'both').values
+
+    def audit(self, how, on, **kwargs):
+        return flyingpandas.merge('m:m', self.left, self.right, how=how,
+                                  on=on, noprint=True, suffixes=('_x', '_y'),
+                                  matches_required=False, **kwargs)
+
+    def test_semi_and_anti(self):
+        for on in ['k', ['k', 'j']]:
+            matched = self.matched(on)
+            pd.testing.assert_frame_equal(self.audit('semi', on),
+                                          self.left[matched])
+            pd.testing.assert_frame_equal(self.audit('anti', on),
+                                          self.left[~matched])
+
+    def test_audit_only(self):
+        for on in ['k', ['k', 'j']]:
+            matched = self.matched(on)
+            for how in HOWS + ['semi', 'anti']:
+                reports = []
+                mask = self.audit(how, on, audit_only=True,
+                                  report=reports.append)
+                expected = ~matched if how == 'anti' else matched
+                pd.testing.assert_series_equal(
+                    mask, pd.Series(expected, index=self.left.index))
+                if how in HOWS:
+                    merged = pd.merge(self.left, self.right, how=how, on=on,
+                                      indicator=True)
+                    counts = merged['_merge'].value_counts()
+                    self.assertEqual(reports[0].merged_rows, len(merged))
+                    for merge_set in _join.MERGE_SETS:
+                        self.assertEqual(reports[0].counts[merge_set],
+                                         counts[merge_set])
+
+    def test_checks(self):
+        for how in ['semi', 'anti']:
+            for audit_only in [False, True]:
+                for mergetype, error in [('1:m', 'mer_4'), ('m:1', 'mer_5')]:
+                    with self.assertRaises(AssertionError) as raised:
+                        flyingpandas.merge(mergetype, self.left, self.right,
+                                           how=how, on='k', noprint=True,
+                                           audit_only=audit_only)
+                    self.assertEqual(raised.exception.args[0], error)
+                with self.assertRaises(AssertionError) as raised:
+                    self.audit(how, ['k', 'j'], sets='both',
+                               audit_only=audit_only)
+                self.assertEqual(raised.exception.args[0], 'mer_7')
+
+
+
+@contextlib.contextmanager
+def captured_stdout():
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        yield sys.stdout
+    finally:
+        sys.stdout = stdout
+
+
+class NoprintTest(unittest.TestCase):
+    """With noprint nothing is printed, even by a failed check"""
+
+    def setUp(self):
+        self.left = pd.DataFrame({'k': [1, 2, 3, 3], 'x': np.arange(4)})
+        self.right = pd.DataFrame({'k': [1, 2, 4], 'y': np.arange(3)})
+
+    def merges(self, **kwargs):
+        left, right = self.left, self.right
+        kwargs = dict(kwargs, noprint=True, msg='message')
+        prepared = flyingpandas.PreparedMerge(right, on='k')
+        return [
+            lambda: flyingpandas.merge('m:1', left, right, how='left',
+                                       on='k', **kwargs),
+            lambda: prepared.merge('m:1', left, how='left', **kwargs),
+            lambda: list(prepared.merge_chunks('m:1', [left[:2], left[2:]],
+                                               how='left', **kwargs)),
+            lambda: list(flyingpandas.merge_partitioned(
+                'm:1', left, right, how='left', on='k', n_partitions=3,
+                **kwargs)),
+            lambda: flyingpandas.merge_many(left, [right], on='k', **kwargs),
+        ]
+
+    def test_success(self):
+        for merge in self.merges():
+            with captured_stdout() as stdout:
+                merge()
+            self.assertEqual(stdout.getvalue(), '')
+
+    def test_sets_failed(self):
+        for merge in self.merges(sets=['both', 'left_only']):
+            with captured_stdout() as stdout:
+                with flyingpandas.profile() as build:
+                    with self.assertRaises(AssertionError) as raised:
+                        merge()
+            self.assertEqual(stdout.getvalue(), '')
+            error = raised.exception.args
+            self.assertEqual(error[0], 'mer_7')
+            # the key 4 is only in the right frame
+            self.assertEqual(error[2]['k'].tolist(), [4])
+            self.assertEqual(build.merges[-1].error[0], 'mer_7')
+
+    def test_size_failed(self):
+        for merge in self.merges(max_rows=3)[:2]:
+            with captured_stdout() as stdout:
+                with self.assertRaises(AssertionError) as raised:
+                    merge()
+            self.assertEqual(stdout.getvalue(), '')
+            self.assertEqual(raised.exception.args[0], 'mer_11')
+            worst = raised.exception.args[2]
+            self.assertEqual(worst['k'].tolist()[0], 3)
+
+
+
+class EstimateTest(unittest.TestCase):
+    """estimate_merge_size and max_rows agree with the merge pandas builds"""
+
+    def setUp(self):
+        random = np.random.RandomState(4)
+        self.left = pd.DataFrame({'k': random.randint(0, 20, 60),
+                                  'j': random.choice(['a', 'b'], 60),
+                                  'v': np.arange(60)})
+        self.right = pd.DataFrame({'rk': random.randint(10, 30, 40),
+                                   'j': random.choice(['a', 'b'], 40),
+                                   'w': np.arange(40.0)})
+
+    def test_exact(self):
+        for how in HOWS:
+            for left_on, right_on in [(['k'], ['rk']),
+                                      (['k', 'j'], ['rk', 'j'])]:
+                estimate = flyingpandas.estimate_merge_size(
+                    self.left, self.right, how=how, left_on=left_on,
+                    right_on=right_on, n_worst=1000)
+                merged = pd.merge(self.left, self.right, how=how,
+                                  left_on=left_on, right_on=right_on,
+                                  indicator=True)
+                self.assertEqual(estimate.rows, len(merged))
+                counts = merged['_merge'].value_counts()
+                for merge_set in _join.MERGE_SETS:
+                    self.assertEqual(estimate.counts[merge_set],
+                                     counts[merge_set])
+                self.assertEqual(estimate.bytes,
+                                 merged.drop('_merge', axis=1)
+                                 .memory_usage(index=False).sum())
+                # every key is listed, the most rows first
+                worst = estimate.worst
+                self.assertEqual(worst['merged_rows'].sum(), len(merged))
+                self.assertEqual(worst['merged_rows'].tolist(),
+                                 sorted(worst['merged_rows'], reverse=True))
+
+    def test_worst(self):
+        estimate = flyingpandas.estimate_merge_size(
+            self.left, self.right.rename(columns={'rk': 'k'}), how='inner',
+            on='k', n_worst=3)
+        self.assertEqual(len(estimate.worst), 3)
+        merged = pd.merge(self.left, self.right, left_on='k', right_on='rk')
+        self.assertEqual(estimate.worst['merged_rows'].iloc[0],
+                         merged['k'].value_counts().max())
+
+    def test_invalid_how(self):
+        with self.assertRaises(AssertionError) as raised:
+            flyingpandas.estimate_merge_size(self.left, self.right,
+                                             how='semi', left_on='k',
+                                             right_on='rk')
+        self.assertEqual(raised.exception.args[0], 'mer_8')
+
+    def test_max_rows(self):
+        for how in HOWS:
+            n_rows = len(pd.merge(self.left, self.right, how=how,
+                                  left_on='k', right_on='rk'))
+            for presorted in [None, False]:
+                merged = flyingpandas.merge(
+                    'm:m', self.left, self.right, how=how, left_on='k',
+                    right_on='rk', noprint=True, matches_required=False,
+                    suffixes=('_x', '_y'), max_rows=n_rows,
+                    presorted=presorted)
+                self.assertEqual(len(merged), n_rows)
+                with self.assertRaises(AssertionError) as raised:
+                    flyingpandas.merge(
+                        'm:m', self.left, self.right, how=how, left_on='k',
+                        right_on='rk', noprint=True, matches_required=False,
+                        suffixes=('_x', '_y'), max_rows=n_rows - 1,
+                        presorted=presorted)
+                self.assertEqual(raised.exception.args[0], 'mer_11')
+
+    def test_max_bytes(self):
+        with self.assertRaises(AssertionError) as raised:
+            flyingpandas.merge('m:m', self.left, self.right, how='inner',
+                               left_on='k', right_on='rk', noprint=True,
+                               suffixes=('_x', '_y'), max_bytes=100)
+        self.assertEqual(raised.exception.args[0], 'mer_11')
+
+
+
+class SortedJoinTest(unittest.TestCase):
+    """The merge-join of sorted keys agrees with pandas.merge, and is only
+    used where the keys are sorted"""
+
+    def setUp(self):
+        random = np.random.RandomState(5)
+        self.keys = [
+            (np.sort(random.randint(0, 20, 50)),
+             np.sort(random.randint(10, 30, 30)).astype(float)),
+            (np.sort(random.choice(list('abcdefgh'), 50)).astype(object),
+             np.sort(random.choice(list('efghijkl'), 30)).astype(object)),
+            (pd.to_datetime('2020-01-01') +
+             pd.to_timedelta(np.sort(random.randint(0, 20, 50)), unit='D'),
+             pd.to_datetime('2020-01-11') +
+             pd.to_timedelta(np.sort(random.randint(0, 20, 30)), unit='D')),
+        ]
+
+    def frames(self, left_keys, right_keys):
+        return (pd.DataFrame({'k': left_keys, 'x': np.arange(len(left_keys))}),
+                pd.DataFrame({'k': right_keys,
+                              'y': np.arange(len(right_keys))}))
+
+    def merged(self, left, right, how, sort, presorted):
+        reports = []
+        merge = lambda left, right, how, on, sort: flying_merge(
+            left, right, how, on, sort, presorted=presorted,
+            report=reports.append)
+        assert_same_merge(self, left, right, how, 'k', sort, merge=merge)
+        return reports[-1].path
+
+    def test_sorted(self):
+        for left_keys, right_keys in self.keys:
+            left, right = self.frames(left_keys, right_keys)
+            for how in HOWS:
+                for sort in [False, True]:
+                    for presorted, path in [(None, 'sorted'),
+                                            (True, 'sorted'),
+                                            (False, 'hash')]:
+                        self.assertEqual(self.merged(left, right, how, sort,
+                                                     presorted), path)
+
+    def test_unsorted(self):
+        for left_keys, right_keys in self.keys:
+            left, right = self.frames(left_keys, right_keys)
+            # shuffle one frame at a time
+            for left, right in [(left.sample(frac=1, random_state=0), right),
+                                (left, right.sample(frac=1, random_state=0))]:
+                for how in HOWS:
+                    self.assertEqual(self.merged(left, right, how, False,
+                                                 None), 'hash')
+                    with self.assertRaises(AssertionError) as raised:
+                        flying_merge(left, right, how, 'k', presorted=True)
+                    self.assertEqual(raised.exception.args[0], 'mer_12')
+
+    def test_presorted_needs_one_key_without_missing(self):
+        left, right = self.frames(*self.keys[0])
+        left['j'] = right['j'] = 1
+        missing = right.copy()
+        missing.loc[len(missing) - 1, 'k'] = np.nan
+        for right, on in [(right, ['k', 'j']), (missing, 'k')]:
+            with self.assertRaises(AssertionError) as raised:
+                flying_merge(left, right, 'inner', on, presorted=True)
+            self.assertEqual(raised.exception.args[0], 'mer_12')
+
+    def test_checks(self):
+        left, right = self.frames(*self.keys[0])
+        for mergetype, error in [('1:m', 'mer_4'), ('m:1', 'mer_5')]:
+            with self.assertRaises(AssertionError) as raised:
+                flyingpandas.merge(mergetype, left, right, how='inner',
+                                   on='k', noprint=True, presorted=True,
+                                   suffixes=('_x', '_y'))
+            self.assertEqual(raised.exception.args[0], error)
+
+
+class PreparedMergeCacheTest(unittest.TestCase):
+    """prepare_merge reuses a preparation of the same right frame, and a
+    preparation notices when its right frame changes"""
+
+    def setUp(self):
+        flyingpandas.clear_merge_cache()
+        self.left = pd.DataFrame({'k': [1, 2, 3, 4, 5], 'x': range(5)})
+        self.right = pd.DataFrame({'k': [2, 3, 6], 'y': [20., 30., 60.]})
+
+    def tearDown(self):
+        flyingpandas.clear_merge_cache()
+
+    def merged(self, prepared, how='left'):
+        return prepared.merge('m:m', self.left, how=how,
+                              suffixes=('_x', '_y'), noprint=True,
+                              matches_required=False)
+
+    def assert_current_merge(self, prepared):
+        for how in HOWS:
+            pd.testing.assert_frame_equal(
+                self.merged(prepared, how),
+                pandas_merge(self.left, prepared.right_frame, how, 'k'),
+                check_dtype=False)
+
+    def test_reused(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        self.assertIs(flyingpandas.prepare_merge(self.right, on='k'),
+                      prepared)
+        self.assertIs(flyingpandas.prepare_merge(self.right, on=['k']),
+                      prepared)
+        self.assertIsNot(flyingpandas.prepare_merge(self.right.copy(),
+                                                    on='k'), prepared)
+        self.assertIsNot(flyingpandas.prepare_merge(self.right, on='k',
+                                                    check_keys=False),
+                         prepared)
+
+    def test_reuse_skips_refresh(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        refreshes = []
+        prepared.refresh = lambda: refreshes.append(1)
+        self.merged(prepared)
+        self.merged(flyingpandas.prepare_merge(self.right, on='k'))
+        self.assertEqual(refreshes, [])
+
+    def test_clear_merge_cache(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        flyingpandas.clear_merge_cache()
+        self.assertIsNot(flyingpandas.prepare_merge(self.right, on='k'),
+                         prepared)
+
+    def test_evicts_least_recently_used(self):
+        size = flyingpandas._prepared_merge.MERGE_CACHE_SIZE
+        frames = [self.right.copy() for _ in range(size + 1)]
+        prepared = [flyingpandas.prepare_merge(frame, on='k')
+                    for frame in frames[:size]]
+        # using the first frame again makes the second the oldest
+        flyingpandas.prepare_merge(frames[0], on='k')
+        flyingpandas.prepare_merge(frames[size], on='k')
+        self.assertIs(flyingpandas.prepare_merge(frames[0], on='k'),
+                      prepared[0])
+        self.assertIsNot(flyingpandas.prepare_merge(frames[1], on='k'),
+                         prepared[1])
+
+    def test_key_values_changed(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        self.assert_current_merge(prepared)
+        self.right.loc[0, 'k'] = 5
+        self.assertFalse(prepared.is_current())
+        self.assertIs(flyingpandas.prepare_merge(self.right, on='k'),
+                      prepared)
+        self.assert_current_merge(prepared)
+        self.assertTrue(prepared.is_current())
+
+    def test_rows_and_dtypes_changed(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        self.merged(prepared)
+        self.right.loc[len(self.right)] = [4, 40.]
+        self.assertFalse(prepared.is_current())
+        self.assert_current_merge(prepared)
+        self.right['y'] = self.right['y'].astype(int)
+        self.assertFalse(prepared.is_current())
+        self.assert_current_merge(prepared)
+
+    def test_other_columns_changed(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k')
+        self.merged(prepared)
+        self.right.loc[0, 'y'] = -1.
+        self.assertTrue(prepared.is_current())
+        self.assert_current_merge(prepared)
+
+    def test_without_check_keys(self):
+        prepared = flyingpandas.prepare_merge(self.right, on='k',
+                                              check_keys=False)
+        self.right.loc[0, 'k'] = 5
+        # in-place key changes go unnoticed until refresh
+        self.assertTrue(prepared.is_current())
+        prepared.refresh()
+        self.assert_current_merge(prepared)
+
+
+if __name__ == '__main__':
+    unittest.main()
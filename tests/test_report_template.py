@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+
+TABLES = [
+    ('Summary', ['region', 'sales', 'growth'],
+     {'index': False, 'add_color_rows': True,
+      'column_formats': {'sales': '$#,##0', 'growth': '0.0%'}}),
+    ('Detail', ['product', 'sales'], {'index': False, 'startrow': 2}),
+]
+
+
+class ReportTemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.summary = pd.DataFrame({'region': ['east', 'west'],
+                                     'sales': [1200.0, 3400.0],
+                                     'growth': [0.05, -0.1],
+                                     'unused': [1, 2]})
+        self.detail = pd.DataFrame({'product': ['a', 'b', 'c'],
+                                    'sales': [1.0, 2.0, 3.0]},
+                                   columns=['product', 'sales'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def cells(self, path):
+        book = openpyxl.load_workbook(path)
+        return dict((sheet.title,
+                     [[(cell.value, cell.number_format, cell.fill.fgColor.rgb)
+                       for cell in row] for row in sheet.iter_rows()])
+                    for sheet in book.worksheets)
+
+    def test_same_as_writer(self):
+        for engine in ['openpyxl', 'xlsxwriter']:
+            template = flyingpandas.ReportTemplate(
+                TABLES, writer_kwargs={'engine': engine})
+            template.render(self.path('template.xlsx'),
+                            [self.summary, self.detail])
+
+            writer = flyingpandas.ExcelWriter(self.path('writer.xlsx'),
+                                              engine=engine)
+            for (sheet_name, columns, options), data in zip(
+                    TABLES, [self.summary, self.detail]):
+                writer.to_excel(data[columns], sheet_name=sheet_name,
+                                **options)
+            writer.close()
+
+            self.assertEqual(self.cells(self.path('template.xlsx')),
+                             self.cells(self.path('writer.xlsx')))
+
+    def test_constant_memory(self):
+        template = flyingpandas.ReportTemplate(
+            TABLES, writer_kwargs={'constant_memory': True})
+        template.render(self.path('template.xlsx'),
+                        [self.summary, self.detail])
+        cells = self.cells(self.path('template.xlsx'))
+        self.assertEqual([[value for value, _, _ in row]
+                          for row in cells['Summary']],
+                         [['region', 'sales', 'growth'],
+                          ['east', 1200, 0.05], ['west', 3400, -0.1]])
+        self.assertEqual([[value for value, _, _ in row]
+                          for row in cells['Detail']][2:],
+                         [['product', 'sales'], ['a', 1], ['b', 2],
+                          ['c', 3]])
+        self.assertEqual(cells['Summary'][1][1][1], '$#,##0')
+
+    def test_styles_shared(self):
+        template = flyingpandas.ReportTemplate(TABLES)
+        template.render(self.path('first.xlsx'), [self.summary, self.detail])
+        styles = dict(template._styles)
+        self.assertTrue(styles)
+        template.render(self.path('second.xlsx'),
+                        [self.summary, self.detail])
+        self.assertEqual(template._styles, styles)
+        self.assertEqual(self.cells(self.path('first.xlsx')),
+                         self.cells(self.path('second.xlsx')))
+
+    def test_missing_columns(self):
+        template = flyingpandas.ReportTemplate(TABLES)
+        with self.assertRaises(ValueError):
+            template.render(self.path('bad.xlsx'),
+                            [self.summary.drop('growth', axis=1),
+                             self.detail])
+
+
+if __name__ == '__main__':
+    unittest.main()
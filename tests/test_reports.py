@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+
+
+class BuildReportsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data = pd.DataFrame({'name': ['a', 'b'], 'value': [1.5, 2.5]},
+                                 columns=['name', 'value'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def spec(self, path, **writer_kwargs):
+        tables = [('Data', self.data,
+                   {'index': False, 'column_formats': {'value': '0.0'}})]
+        return (path, tables, writer_kwargs)
+
+    def values(self, path):
+        sheet = openpyxl.load_workbook(path)['Data']
+        return [[cell.value for cell in row] for row in sheet.iter_rows()]
+
+    def test_results(self):
+        for processes in [1, 2]:
+            paths = [self.path('report_{}.xlsx'.format(i)) for i in range(3)]
+            specs = [self.spec(paths[0]),
+                     self.spec(paths[1], engine='openpyxl'),
+                     (paths[2], [('Data', self.data, {'index': False})])]
+            results = flyingpandas.build_reports(specs, processes=processes)
+            self.assertEqual([result.path for result in results], paths)
+            for result in results:
+                self.assertIsNone(result.error)
+                self.assertGreater(result.seconds, 0)
+                self.assertEqual(self.values(result.path),
+                                 [['name', 'value'], ['a', 1.5],
+                                  ['b', 2.5]])
+            sheet = openpyxl.load_workbook(paths[0])['Data']
+            self.assertEqual(sheet['B2'].number_format, '0.0')
+
+    def test_bad_path(self):
+        bad = os.path.join(self.directory, 'missing', 'report.xlsx')
+        for processes in [1, 2]:
+            good = self.path('good_{}.xlsx'.format(processes))
+            results = flyingpandas.build_reports(
+                [self.spec(bad), self.spec(good)], processes=processes)
+            self.assertEqual([result.path for result in results],
+                             [bad, good])
+            # the failed workbook's traceback is returned, not raised
+            self.assertIn('Error', results[0].error)
+            self.assertIn('missing', results[0].error)
+            self.assertFalse(os.path.exists(bad))
+            self.assertIsNone(results[1].error)
+            self.assertEqual(len(self.values(good)), 3)
+
+    def test_failed_table(self):
+        specs = [self.spec(self.path('first.xlsx')),
+                 (self.path('bad.xlsx'),
+                  [('Data', self.data, {'row_formats': {'a': '0'},
+                                        'row_format_col': 'missing'})]),
+                 self.spec(self.path('last.xlsx'))]
+        results = flyingpandas.build_reports(specs, processes=2)
+        self.assertEqual([result.error is None for result in results],
+                         [True, False, True])
+        self.assertIn('KeyError', results[1].error)
+        self.assertTrue(os.path.exists(self.path('last.xlsx')))
+
+    def test_no_specs(self):
+        self.assertEqual(flyingpandas.build_reports([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import flyingpandas
+from flyingpandas import _flyingpandas, _format_plan
+
+ROW_FORMATS = {'revenue': '$#,##0', 'margin': '0.0%', 'units': '0'}
+
+
+class RowFormatNumbersTest(unittest.TestCase):
+
+    def test_repeated_labels(self):
+        labels = pd.Series(['revenue', 'margin', 'other', 'revenue',
+                            'revenue', None, 'margin'])
+        row_formats, matched = _flyingpandas._row_format_numbers(
+            labels, ROW_FORMATS, 5)
+        self.assertEqual(row_formats, {5: '$#,##0', 6: '0.0%', 8: '$#,##0',
+                                       9: '$#,##0', 11: '0.0%'})
+        self.assertEqual(matched, set(['revenue', 'margin']))
+
+    def test_same_as_loop(self):
+        random = np.random.RandomState(3)
+        names = ['row{}'.format(i) for i in range(200)]
+        labels = pd.Series(random.choice(names, 2000))
+        formats = dict((name, '0.{}'.format('0' * (i % 4)))
+                       for i, name in enumerate(names[::3]))
+        row_formats, matched = _flyingpandas._row_format_numbers(
+            labels, formats, 1)
+        expected = {}
+        for row_num, label in enumerate(labels, 1):
+            if label in formats:
+                expected[row_num] = formats[label]
+        self.assertEqual(row_formats, expected)
+        self.assertEqual(matched, set(labels) & set(formats))
+
+    def test_runs(self):
+        self.assertEqual(_format_plan._runs({3: 'a', 4: 'a', 5: 'b', 7: 'b',
+                                             8: 'b', 2: 'a'}),
+                         [(2, 4, 'a'), (5, 5, 'b'), (7, 8, 'b')])
+
+
+class RowFormatWriteTest(unittest.TestCase):
+    """Every row with a formatted label gets the format in the workbook"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rows.xlsx')
+        labels = ['revenue', 'revenue', 'margin', 'units', 'other',
+                  'revenue', 'margin', 'margin', 'other', 'units']
+        self.data = pd.DataFrame({'label': labels,
+                                  'value': np.arange(10) * 1.5,
+                                  'count': np.arange(10)},
+                                 columns=['label', 'value', 'count'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def formats(self, startrow, startcol):
+        """Number format of each data cell of the table, by row"""
+        sheet = openpyxl.load_workbook(self.path)['Sheet1']
+        rows = sheet.iter_rows(min_row=startrow + 2,
+                               max_row=startrow + 1 + len(self.data),
+                               min_col=startcol + 2, max_col=startcol + 3)
+        return [[cell.number_format for cell in row] for row in rows]
+
+    def test_repeated_labels(self):
+        expected = [[ROW_FORMATS.get(label, 'General')] * 2
+                    for label in self.data['label']]
+        for kwargs in [{'engine': 'openpyxl'}, {'engine': 'xlsxwriter'},
+                       {'constant_memory': True}]:
+            for chunked in [False, True]:
+                writer = flyingpandas.ExcelWriter(self.path, **kwargs)
+                data = self.data
+                if chunked:
+                    data = iter([self.data[:4], self.data[4:]])
+                writer.to_excel(data, index=False, startrow=2, startcol=1,
+                                row_formats=ROW_FORMATS,
+                                row_format_col='label')
+                writer.close()
+                self.assertEqual(self.formats(2, 1), expected,
+                                 '{} chunked={}'.format(kwargs, chunked))
+
+    def test_unused_row_names(self):
+        writer = flyingpandas.ExcelWriter(self.path)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            writer.to_excel(self.data, row_format_col='label',
+                            row_formats=dict(ROW_FORMATS, missing='0.00'))
+        writer.close()
+        messages = [str(warning.message) for warning in caught]
+        self.assertEqual(len(messages), 1)
+        self.assertIn('"missing"', messages[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Font
+
+import flyingpandas
+
+
+class UpdateTest(unittest.TestCase):
+    """Round trips of an existing workbook through ExcelWriter(mode='a')"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'update.xlsx')
+        book = openpyxl.Workbook()
+        kept = book.active
+        kept.title = 'Kept'
+        kept['A1'] = 'title'
+        kept['A1'].font = Font(bold=True)
+        kept.merge_cells('A1:C1')
+        kept['A2'] = 1.5
+        tables = book.create_sheet('Tables')
+        for row in [['a', 'b', None, 'x'], [1, 2, None, 9], [3, 4, None, 9],
+                    [None, None, None, None], ['note', None, None, None]]:
+            tables.append(row)
+        book.create_sheet('Last')['B2'] = 'last'
+        book.save(self.path)
+        self.data = pd.DataFrame({'a': [10, 20, 30], 'b': [40, 50, 60]},
+                                 columns=['a', 'b'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def update(self, **kwargs):
+        writer = flyingpandas.ExcelWriter(self.path, mode='a')
+        writer.to_excel(self.data, sheet_name='Tables', index=False, **kwargs)
+        writer.close()
+        return openpyxl.load_workbook(self.path)
+
+    def values(self, sheet):
+        return [[cell.value for cell in row] for row in sheet.iter_rows()]
+
+    def test_other_sheets_kept(self):
+        book = self.update()
+        self.assertEqual(book.sheetnames, ['Kept', 'Tables', 'Last'])
+        kept = book['Kept']
+        self.assertEqual(kept['A1'].value, 'title')
+        self.assertTrue(kept['A1'].font.b)
+        self.assertEqual([str(cells) for cells in kept.merged_cells.ranges],
+                         ['A1:C1'])
+        self.assertEqual(kept['A2'].value, 1.5)
+        self.assertEqual(book['Last']['B2'].value, 'last')
+
+    def test_replace_sheet(self):
+        book = self.update()
+        self.assertEqual(self.values(book['Tables']),
+                         [['a', 'b'], [10, 40], [20, 50], [30, 60]])
+
+    def test_replace_block(self):
+        book = self.update(replace='block')
+        self.assertEqual(self.values(book['Tables']),
+                         [['a', 'b', None, 'x'], [10, 40, None, 9],
+                          [20, 50, None, 9], [30, 60, None, None],
+                          ['note', None, None, None]])
+
+    def test_write_over(self):
+        book = self.update(replace=None, startrow=5)
+        values = self.values(book['Tables'])
+        self.assertEqual(values[:5], [['a', 'b', None, 'x'],
+                                      [1, 2, None, 9], [3, 4, None, 9],
+                                      [None] * 4, ['note', None, None, None]])
+        self.assertEqual([row[:2] for row in values[5:]],
+                         [['a', 'b'], [10, 40], [20, 50], [30, 60]])
+
+    def test_new_sheet(self):
+        writer = flyingpandas.ExcelWriter(self.path, mode='a')
+        writer.to_excel(self.data, sheet_name='New', index=False)
+        writer.close()
+        book = openpyxl.load_workbook(self.path)
+        self.assertEqual(book.sheetnames, ['Kept', 'Tables', 'Last', 'New'])
+        self.assertEqual(self.values(book['Tables'])[1], [1, 2, None, 9])
+
+    def test_requires_openpyxl(self):
+        with self.assertRaises(ValueError):
+            flyingpandas.ExcelWriter(self.path, mode='a', engine='xlsxwriter')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+import flyingpandas
+
+
+class WriterStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stats.xlsx')
+        self.data = pd.DataFrame({'name': ['a', 'b', 'c'],
+                                  'value': [1.0, 2.0, 3.0]},
+                                 columns=['name', 'value'])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, **kwargs):
+        writer = flyingpandas.ExcelWriter(self.path, **kwargs)
+        writer.to_excel(self.data, sheet_name='Sheet', index=False,
+                        column_formats={'value': '0.0'})
+        writer.to_excel(self.data, sheet_name='Sheet', startrow=6,
+                        add_color_rows=True)
+        writer.close()
+        return writer
+
+    def test_tables(self):
+        for kwargs in [{'engine': 'openpyxl'}, {'engine': 'xlsxwriter'},
+                       {'constant_memory': True}, {'background': True}]:
+            stats = self.write(**kwargs).stats
+            first, second = stats.tables
+            self.assertEqual((first.sheet_name, first.startrow,
+                              first.rows, first.columns), ('Sheet', 0, 3, 2))
+            self.assertEqual(second.startrow, 6)
+            # the values and header, then with the index as well
+            self.assertEqual(first.cells, 3 * 2 + 2)
+            self.assertEqual(second.cells, 3 * 3 + 2)
+            self.assertEqual(stats.cells, first.cells + second.cells)
+            self.assertEqual(stats.formats, first.formats + second.formats)
+            self.assertGreater(first.formats, 0)
+            for table in stats.tables:
+                self.assertEqual(list(table.phases),
+                                 ['prepare', 'write', 'autofit'])
+                self.assertGreaterEqual(table.seconds,
+                                        sum(table.phases.values()) - 1e-6)
+
+            self.assertEqual(list(stats.close_phases), ['widths', 'save'])
+            self.assertEqual(list(stats.phases), ['prepare', 'write',
+                                                  'autofit', 'widths',
+                                                  'save'])
+            self.assertEqual(stats.file_size, os.path.getsize(self.path))
+            self.assertGreaterEqual(stats.seconds,
+                                    sum(stats.phases.values()) - 1e-6)
+            self.assertIsNone(stats.error)
+
+    def test_summary(self):
+        summary = self.write().stats.summary()
+        self.assertEqual(len(summary), 2)
+        self.assertEqual(summary['cells'].tolist(), [8, 11])
+        for column in ['sheet_name', 'rows', 'seconds', 'prepare', 'write',
+                       'autofit']:
+            self.assertIn(column, summary.columns)
+
+    def test_hooks(self):
+        reported, hooked = [], []
+        flyingpandas.add_writer_hook(hooked.append)
+        try:
+            writer = self.write(report=reported.append)
+        finally:
+            flyingpandas.remove_writer_hook(hooked.append)
+        self.assertEqual(reported, [writer.stats])
+        self.assertEqual(hooked, [writer.stats])
+        self.write()
+        self.assertEqual(len(hooked), 1)
+
+    def test_failed_close(self):
+        reported = []
+        writer = flyingpandas.ExcelWriter(self.path, background=True,
+                                          report=reported.append)
+        writer.to_excel(self.data, sheet_name='Sheet',
+                        row_formats={'a': '0.0'}, row_format_col='missing')
+        with self.assertRaises(KeyError):
+            writer.close()
+        self.assertEqual(reported, [writer.stats])
+        self.assertIsNotNone(writer.stats.error)
+
+    def test_profile(self):
+        right = pd.DataFrame({'name': ['a', 'b'], 'group': [1, 2]})
+        with flyingpandas.profile() as build:
+            merged = flyingpandas.merge('m:1', self.data, right, how='left',
+                                        on='name', noprint=True)
+            writer = flyingpandas.ExcelWriter(self.path)
+            writer.to_excel(merged, sheet_name='Merged')
+            writer.to_excel(self.data, sheet_name='Data')
+            writer.close()
+        # merges and writers after the block are not collected
+        flyingpandas.merge('m:1', self.data, right, how='left', on='name',
+                           noprint=True)
+        self.assertEqual([report.merged_rows for report in build.merges],
+                         [3])
+        self.assertEqual(build.writers, [writer.stats])
+        tables = build.tables()
+        self.assertEqual(sorted(tables['sheet_name']), ['Data', 'Merged'])
+        self.assertEqual(set(tables['path']), set([self.path]))
+        self.assertEqual(tables['seconds'].tolist(),
+                         sorted(tables['seconds'], reverse=True))
+        self.assertGreater(build.seconds, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()